@@ -0,0 +1,82 @@
+# api/battle_api.py
+import asyncio
+from fastapi import Request, HTTPException
+from fastapi.responses import JSONResponse
+from battle import LINE_SIZE
+from battle.replay import render_replay
+from services.battle_service import BattleServiceBusy, run_battle
+from services.leaderboard import LEADERBOARD_SIZE, TOP_SIZE
+from database import UserDatabase
+
+# Пределы параметров магов, присланных клиентом
+MAX_WIZARD_HP = 100000
+MAX_WIZARD_DAMAGE = 10000
+
+def _parse_lineup(wizards):
+    """
+    Линия магов из JSON: не больше LINE_SIZE словарей с hp, damage и
+    необязательным spell - id заклинания с эффектом (null - пустая ячейка).
+    """
+    if not isinstance(wizards, list) or len(wizards) > LINE_SIZE:
+        raise HTTPException(status_code=400, detail=f"Lineup must be a list of up to {LINE_SIZE} wizards")
+    lineup = []
+    for wizard in wizards:
+        if wizard is None:
+            lineup.append(None)
+            continue
+        try:
+            hp, damage = int(wizard["hp"]), int(wizard["damage"])
+        except (TypeError, KeyError, ValueError):
+            raise HTTPException(status_code=400, detail="Each wizard needs numeric hp and damage")
+        if not (0 <= hp <= MAX_WIZARD_HP and 0 <= damage <= MAX_WIZARD_DAMAGE):
+            raise HTTPException(status_code=400, detail="Wizard hp or damage out of range")
+        spell = wizard.get("spell")
+        if spell is not None and not (isinstance(spell, str) and len(spell) <= 64):
+            raise HTTPException(status_code=400, detail="Wizard spell must be a spell id")
+        lineup.append({"hp": hp, "damage": damage, "name": str(wizard.get("name") or "")[:32], "spell": spell})
+    return lineup
+
+async def api_battle_simulate(request: Request):
+    """
+    Endpoint для пробного боя 5 на 5 (веб-симулятор).
+    Ожидает JSON с линиями a и b, необязательными seed и language.
+    Бой проводится в пуле процессов, ответ - итог, запись и текст боя.
+    """
+    try:
+        data = await request.json()
+        lineup_a = _parse_lineup(data.get("a"))
+        lineup_b = _parse_lineup(data.get("b"))
+        seed = data.get("seed")
+        if seed is not None and not isinstance(seed, int):
+            raise HTTPException(status_code=400, detail="seed must be an integer")
+
+        result, replay = await run_battle(lineup_a, lineup_b, seed=seed)
+        return JSONResponse(content={
+            "winner": result.winner,
+            "rounds": result.rounds,
+            "hp": list(result.hp),
+            "replay": replay,
+            "log": render_replay(replay, data.get("language")),
+        })
+
+    except HTTPException:
+        raise
+    except BattleServiceBusy:
+        raise HTTPException(status_code=503, detail="Battle queue is full, try again later")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Battle timed out")
+    except Exception as e:
+        print(f"❌ Ошибка в /api/battle/simulate: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+async def api_leaderboard(request: Request):
+    """
+    Endpoint таблицы лидеров арены для веб-приложения.
+    Необязательный параметр limit (до LEADERBOARD_SIZE); читается готовый документ leaderboard/.
+    """
+    try:
+        limit = int(request.query_params.get("limit", TOP_SIZE))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="limit must be an integer")
+    limit = min(max(limit, 1), LEADERBOARD_SIZE)
+    return JSONResponse(content={"entries": await UserDatabase.get_leaderboard(limit)})
@@ -3,6 +3,7 @@ from fastapi import Request, HTTPException
 from fastapi.responses import JSONResponse
 from database import UserDatabase
 from building_manager import BuildingManager
+from buildings_config import BUILDINGS_DATA, CUMULATIVE_TIMES, DAY_SECONDS, LEVEL_EFFECTS, LEVEL_TIMES
 
 async def api_build(request: Request):
     """
@@ -31,4 +32,21 @@ async def api_build(request: Request):
         raise
     except Exception as e:
         print(f"❌ Ошибка в /api/build: {e}")
-        raise HTTPException(status_code=500, detail="Internal server error")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+# Таблицы прогрессии не меняются во время работы - ответ собирается один раз
+_PROGRESSION = {
+    building_id: {
+        "level_time": [days * DAY_SECONDS for days in LEVEL_TIMES[building_id]],
+        "cumulative_time": [days * DAY_SECONDS for days in CUMULATIVE_TIMES[building_id]],
+        "effects": [dict(values) for values in LEVEL_EFFECTS[building_id]],
+    }
+    for building_id in BUILDINGS_DATA
+}
+
+async def api_building_progression():
+    """
+    Endpoint с таблицами прогрессии зданий для Web App.
+    Время в секундах, индекс в списках - уровень здания.
+    """
+    return JSONResponse(content=_PROGRESSION)
\ No newline at end of file
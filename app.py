@@ -12,10 +12,18 @@ from aiogram.filters import Command
 
 # Импорты обработчиков
 from handlers.user_handlers import cmd_start, select_faction
-from handlers.building_handlers import cmd_buildings, cmd_build, cmd_upgrade
+from handlers.building_handlers import cmd_buildings, cmd_build, cmd_upgrade, cmd_collect
 from handlers.wizard_handlers import cmd_profile, cmd_wizards, cmd_spells, cmd_research, cmd_cancel_research, cmd_hire_wizard
 from handlers.city_handler import open_city
-from api.building_api import api_build
+from handlers.battle_handlers import cmd_battles, cmd_replay
+from handlers.arena_handlers import cmd_arena, cmd_arena_leave, cmd_top
+from api.building_api import api_build, api_building_progression
+from api.battle_api import api_battle_simulate, api_leaderboard
+from database import shutdown_executor, start_cache_listener, user_cache, write_behind, flush_pending_writes, timer_scheduler, rating_results
+from buildings_config import BUILDINGS_DATA
+from sweep_timers import TimerSweeper
+from services.battle_service import battle_service
+from services.matchmaking import matchmaker
 
 # Получаем абсолютный путь к корневой директории проекта
 BASE_DIR = Path(__file__).resolve().parent
@@ -29,6 +37,35 @@ def create_app(dp: Dispatcher, bot: Bot) -> FastAPI:
         # Код до запуска сервера
         print("🚀 FastAPI сервер готов.")
 
+        # Инвалидация кэша пользователей по изменениям из других процессов
+        if os.environ.get("USER_CACHE_LISTEN") == "1":
+            start_cache_listener()
+
+        # Завершение таймеров построек/исследований точно в срок
+        timer_scheduler.start()
+
+        # Пул процессов для боёв (иначе он создаётся при первом бое)
+        battle_service.start()
+
+        # Разбор очереди арены (иначе он запускается при первом /arena)
+        matchmaker.start()
+
+        # Периодический проход по индексу timers/ - для игроков, которые не заходят
+        sweep_task = None
+        sweep_interval = float(os.environ.get("TIMER_SWEEP_INTERVAL", "0"))
+        if sweep_interval > 0:
+            async def notify_timer_done(user_id, field, timer):
+                if field == "construction":
+                    building = BUILDINGS_DATA.get(timer.get("building_id"), {})
+                    text = f"🏗️ {building.get('name', 'Здание')}: работы завершены (уровень {timer.get('target_level')})."
+                else:
+                    text = "🔬 Исследование завершено! Подробнее: /research"
+                await bot.send_message(user_id, text)
+
+            sweep_task = asyncio.create_task(
+                TimerSweeper(notify=notify_timer_done).run_forever(sweep_interval)
+            )
+
         # Определяем, запущены ли мы на Render
         is_render = os.environ.get('RENDER') is not None
         # Определяем, будем ли мы использовать webhook
@@ -57,6 +94,20 @@ def create_app(dp: Dispatcher, bot: Bot) -> FastAPI:
                 pass
             print("🛑 Telegram бот остановлен.")
 
+        if sweep_task:
+            sweep_task.cancel()
+            try:
+                await sweep_task
+            except asyncio.CancelledError:
+                pass
+
+        # Отправляем отложенные изменения, затем освобождаем пул потоков
+        await matchmaker.stop()
+        await battle_service.stop()
+        await timer_scheduler.stop()
+        await flush_pending_writes()
+        shutdown_executor()
+
     app = FastAPI(lifespan=lifespan)
 
     # --- Регистрация обработчиков команд ---
@@ -68,6 +119,7 @@ def create_app(dp: Dispatcher, bot: Bot) -> FastAPI:
     dp.message.register(cmd_buildings, Command("buildings"))
     dp.message.register(cmd_build, Command("build"))
     dp.message.register(cmd_upgrade, Command("upgrade"))
+    dp.message.register(cmd_collect, Command("collect"))
 
     # Wizard handlers
     dp.message.register(cmd_profile, Command("profile"))
@@ -80,6 +132,13 @@ def create_app(dp: Dispatcher, bot: Bot) -> FastAPI:
     # City handler
     dp.message.register(open_city, Command("city"))
 
+    # Battle handlers
+    dp.message.register(cmd_battles, Command("battles"))
+    dp.message.register(cmd_replay, Command("replay"))
+    dp.message.register(cmd_arena, Command("arena"))
+    dp.message.register(cmd_arena_leave, Command("arena_leave"))
+    dp.message.register(cmd_top, Command("top"))
+
     # --- Настройка CORS ---
     # Исправлены origins (убраны лишние пробелы)
     origins = [
@@ -116,8 +175,35 @@ def create_app(dp: Dispatcher, bot: Bot) -> FastAPI:
     async def test_api():
         return {"message": "FastAPI API работает!"}
 
+    @app.get("/api/metrics/cache")
+    async def cache_metrics():
+        return user_cache.stats()
+
+    @app.get("/api/metrics/writes")
+    async def write_metrics():
+        return write_behind.stats()
+
+    @app.get("/api/metrics/timers")
+    async def timer_metrics():
+        return timer_scheduler.stats()
+
+    @app.get("/api/metrics/battles")
+    async def battle_metrics():
+        return battle_service.stats()
+
+    @app.get("/api/metrics/matchmaking")
+    async def matchmaking_metrics():
+        return matchmaker.stats()
+
+    @app.get("/api/metrics/ratings")
+    async def rating_metrics():
+        return rating_results.stats()
+
     # Подключение API endpoint для постройки
     app.post("/api/build")(api_build)
+    app.get("/api/buildings/progression")(api_building_progression)
+    app.post("/api/battle/simulate")(api_battle_simulate)
+    app.get("/api/leaderboard")(api_leaderboard)
 
     # --- Настройка статических файлов ---
     # Абсолютные пути для работы на Render
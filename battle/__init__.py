@@ -0,0 +1,22 @@
+# battle/__init__.py
+"""
+Серверный движок боя "Линия Сражения" (правила из web/battle_test_5v5.js).
+
+Пакетная симуляция на NumPy для баланса - в battle.batch (импортируется отдельно).
+"""
+
+from battle.engine import (
+    LINE_SIZE,
+    MAX_ROUNDS,
+    PHASES,
+    SIDE_A,
+    SIDE_B,
+    Battle,
+    BattleResult,
+    find_target,
+    lineup_arrays,
+    lineup_spells,
+    run_battle,
+)
+from battle.effects import EFFECT_TYPES, SPELL_EFFECTS, EffectTable, SpellEffect
+from battle.targeting import TargetingTables, targeting_tables
@@ -0,0 +1,173 @@
+# battle/batch.py
+"""
+Пакетная симуляция боёв 5 на 5 на NumPy - для баланса заклинаний и построек.
+
+Правила те же, что в battle.engine, но N боёв продвигаются одновременно:
+каждая атака каждой фазы - несколько векторных операций над всеми боями.
+Живые маги обеих сторон хранятся одним числом-состоянием (бит = ячейка:
+0..4 - сторона A, 5..9 - сторона B), поэтому выбор атакующего, цели и
+состояние после убийства - выборки из таблиц по состоянию, построенных
+из таблиц скалярного движка (battle.targeting). Бои считаются кусками по
+CHUNK_SIZE, чтобы рабочие массивы помещались в кэш процессора.
+
+Почти в каждом раунде кто-то погибает, поэтому бой нельзя считать
+раундами целиком: цена - около 11 векторных операций на атаку, на одном
+ядре это 0.8-1 млн боёв/с, в 40-50 раз быстрее скалярного движка с
+таблицами целей. Куски независимы и считаются в workers потоках: NumPy
+отпускает GIL внутри векторных операций, под GIL остаётся около 13%
+времени (вызовы из Python), поэтому по оценке 100x против скалярного
+движка набирается с 3-4 ядер. Замер - python -m battle.benchmark --batch
+(--workers 1 - одно ядро).
+
+Пример:
+    winners, rounds, hp = simulate_batch(hp_a, damage_a, hp_b, damage_b)
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from battle.engine import _PHASE_ATTACKERS, _TARGET, LINE_SIZE, MAX_ROUNDS, PHASES, SIDE_A, SIDE_B
+
+# Значение winners для ничьей
+DRAW = -1
+
+# Боёв в одном проходе
+CHUNK_SIZE = 4096
+
+# Потоков по умолчанию - по числу ядер
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "0")) or os.cpu_count() or 1
+
+_SIDE_MASK = (1 << LINE_SIZE) - 1
+_STATES = 1 << (2 * LINE_SIZE)
+
+# Ширина строки рабочих массивов: ячейки A, ячейки B и пустая ячейка с нулевым уроном
+_WIDTH = 2 * LINE_SIZE + 1
+_NULL_CELL = 2 * LINE_SIZE
+
+
+def _side_masks(state):
+    return state & _SIDE_MASK, state >> LINE_SIZE
+
+
+def _attack_tables():
+    """
+    Таблицы каждой атаки каждой фазы по состоянию боя: (ячейка атакующего,
+    ячейка цели, состояние после убийства цели).
+
+    В законченном бою атака безвредна: атакует пустая ячейка с нулевым
+    уроном, а состояние не меняется.
+    """
+    tables = []
+    for (side, _, attackers), phase_attackers in zip(PHASES, _PHASE_ATTACKERS):
+        defender = 1 - side
+        for i in range(attackers):
+            attacker_cells = np.full(_STATES, _NULL_CELL, dtype=np.int64)
+            target_cells = np.zeros(_STATES, dtype=np.int64)
+            killed_states = np.arange(_STATES, dtype=np.int64)
+            for state in range(_STATES):
+                masks = _side_masks(state)
+                attacker_mask, defender_mask = masks[side], masks[defender]
+                if not attacker_mask or not defender_mask:
+                    continue
+                slot = phase_attackers[attacker_mask][i]
+                target_cell = defender * LINE_SIZE + _TARGET[defender_mask * LINE_SIZE + slot]
+                attacker_cells[state] = side * LINE_SIZE + slot
+                target_cells[state] = target_cell
+                killed_states[state] = state & ~(1 << target_cell)
+            tables.append((attacker_cells, target_cells, killed_states))
+    return tuple(tables)
+
+
+_ATTACK_TABLES = _attack_tables()
+_FINISHED = np.array([not (a and b) for a, b in map(_side_masks, range(_STATES))])
+
+
+def _simulate_chunk(hp, damage, states, ended, max_rounds):
+    """
+    Довести до конца бои куска (массивы изменяются на месте).
+
+    Раунд окончания проверяется после раунда: закончившийся бой дальше не
+    меняется. Когда закончилась половина боёв рабочего набора, он сжимается
+    до идущих - иначе хвост самых долгих боёв куска считался бы целиком.
+    """
+    ids = None  # None - рабочий набор совпадает с куском
+    work_hp, work_damage, work_states, work_ended = hp, damage, states, ended
+    for round_number in range(1, max_rounds + 1):
+        flat_hp = work_hp.reshape(-1)
+        flat_damage = work_damage.reshape(-1)
+        row = np.arange(0, flat_hp.size, _WIDTH)
+        state = work_states
+        for attacker_cells, target_cells, killed_states in _ATTACK_TABLES:
+            cells = row + target_cells.take(state)
+            new_hp = flat_hp.take(cells) - flat_damage.take(row + attacker_cells.take(state))
+            flat_hp[cells] = new_hp
+            state = np.where(new_hp <= 0, killed_states.take(state), state)
+        work_states[:] = state
+        np.copyto(work_ended, round_number, where=_FINISHED.take(state) & (work_ended == 0))
+
+        live = work_ended == 0
+        live_count = np.count_nonzero(live)
+        if live_count * 2 <= len(live):
+            if ids is not None:
+                hp[ids], states[ids], ended[ids] = work_hp, work_states, work_ended
+            if not live_count:
+                return
+            ids = np.flatnonzero(live) if ids is None else ids[live]
+            work_hp, work_damage, work_states, work_ended = hp[ids], damage[ids], states[ids], ended[ids]
+    if ids is not None:
+        hp[ids], states[ids], ended[ids] = work_hp, work_states, work_ended
+
+
+def simulate_batch(hp_a, damage_a, hp_b, damage_b, max_rounds=MAX_ROUNDS, workers=BATCH_WORKERS):
+    """
+    Провести N боёв; аргументы - массивы (N, LINE_SIZE), сторона A - инициатор.
+
+    Куски по CHUNK_SIZE боёв делятся между workers потоками.
+
+    Возвращает (winners, rounds, hp):
+    - winners (N,) - SIDE_A, SIDE_B или DRAW;
+    - rounds (N,) - раунд, в котором закончился бой (max_rounds для ничьих по пределу);
+    - hp (N, 2 * LINE_SIZE) - оставшееся HP ячеек A, затем B (мёртвые - 0).
+    """
+    hp_a, damage_a, hp_b, damage_b = (np.asarray(values) for values in (hp_a, damage_a, hp_b, damage_b))
+    shapes = {values.shape for values in (hp_a, damage_a, hp_b, damage_b)}
+    if len(shapes) != 1 or hp_a.ndim != 2 or hp_a.shape[1] != LINE_SIZE:
+        raise ValueError(f"❌ Ожидаются массивы формы (N, {LINE_SIZE})")
+    count = len(hp_a)
+    winners = np.empty(count, dtype=np.int64)
+    rounds = np.empty(count, dtype=np.int64)
+    result_hp = np.empty((count, 2 * LINE_SIZE), dtype=np.int64)
+
+    def run_chunk(start):
+        chunk = slice(start, start + CHUNK_SIZE)
+        size = len(hp_a[chunk])
+        hp = np.zeros((size, _WIDTH), dtype=np.int64)
+        damage = np.zeros((size, _WIDTH), dtype=np.int64)
+        hp[:, :LINE_SIZE], hp[:, LINE_SIZE:_NULL_CELL] = hp_a[chunk], hp_b[chunk]
+        damage[:, :LINE_SIZE], damage[:, LINE_SIZE:_NULL_CELL] = damage_a[chunk], damage_b[chunk]
+        states = np.zeros(size, dtype=np.int64)
+        for cell in range(2 * LINE_SIZE):
+            states |= (hp[:, cell] > 0).astype(np.int64) << cell
+        # Раунд окончания боя; 0 - бой ещё идёт, -1 - закончен до начала
+        ended = np.where(_FINISHED.take(states), -1, 0)
+        if not ended.all():
+            _simulate_chunk(hp, damage, states, ended, max_rounds)
+
+        alive_a, alive_b = (states & _SIDE_MASK) > 0, (states >> LINE_SIZE) > 0
+        winners[chunk] = np.where(alive_a & ~alive_b, SIDE_A, np.where(alive_b & ~alive_a, SIDE_B, DRAW))
+        # Бои, закончившиеся до начала, - 0 раундов; ничьи по пределу - max_rounds
+        rounds[chunk] = np.where(ended > 0, ended, np.where(ended < 0, 0, max_rounds))
+        np.maximum(hp[:, :_NULL_CELL], 0, out=result_hp[chunk])
+
+    starts = range(0, count, CHUNK_SIZE)
+    workers = min(workers, len(starts))
+    if workers > 1:
+        # Куски пишут в непересекающиеся срезы результатов
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(run_chunk, starts))
+    else:
+        for start in starts:
+            run_chunk(start)
+    return winners, rounds, result_hp
@@ -0,0 +1,157 @@
+# battle/benchmark.py
+"""
+Замер скорости движка боя: боёв в секунду.
+
+Пример:
+    python -m battle.benchmark --battles 100000 --seed 42
+    python -m battle.benchmark --batch --battles 1000000   # пакетный режим (NumPy)
+    python -m battle.benchmark --batch --workers 1         # пакетный режим на одном ядре
+    python -m battle.benchmark --effects --battles 100000  # маги с эффектами заклинаний
+
+Линии генерируются из сида, поэтому повторный запуск проводит те же бои
+и выдаёт ту же статистику побед. В пакетном режиме те же линии
+(первые --scalar-battles) прогоняются и скалярным движком: результаты
+сверяются, а скорости сравниваются.
+"""
+
+import argparse
+import random
+import time
+
+from battle.effects import SPELL_EFFECTS
+from battle.engine import LINE_SIZE, SIDE_A, SIDE_B, Battle
+
+
+def random_lineups(count, seed=0, hp_range=(60, 140), damage_range=(10, 40)):
+    """count пар линий [(hp_a, damage_a, hp_b, damage_b), ...] из сида seed."""
+    rng = random.Random(seed)
+
+    def line(value_range):
+        return [rng.randint(*value_range) for _ in range(LINE_SIZE)]
+
+    return [
+        (line(hp_range), line(damage_range), line(hp_range), line(damage_range))
+        for _ in range(count)
+    ]
+
+
+def random_spells(count, seed=0):
+    """count списков заклинаний на 2 * LINE_SIZE ячеек: у каждого мага заклинание с эффектом."""
+    rng = random.Random(seed)
+    spell_ids = sorted(SPELL_EFFECTS)
+    return [[rng.choice(spell_ids) for _ in range(2 * LINE_SIZE)] for _ in range(count)]
+
+
+def benchmark(battles=100_000, seed=0, effects=False):
+    """
+    Провести battles боёв на одном Battle; вернуть статистику и скорость.
+
+    effects - у всех магов заклинания с эффектами (худший случай для таблицы эффектов).
+    """
+    lineups = random_lineups(battles, seed)
+    spells = random_spells(battles, seed) if effects else [None] * battles
+    battle = Battle(*lineups[0], seed=seed)
+    wins = {SIDE_A: 0, SIDE_B: 0, None: 0}
+    rounds = 0
+    started = time.perf_counter()
+    for index, lineup in enumerate(lineups):
+        battle.reset(*lineup, seed=seed + index, spells=spells[index])
+        result = battle.run()
+        wins[result.winner] += 1
+        rounds += result.rounds
+    elapsed = time.perf_counter() - started
+    return {
+        "battles": battles,
+        "seconds": elapsed,
+        "battles_per_second": battles / elapsed if elapsed else float("inf"),
+        "wins_a": wins[SIDE_A],
+        "wins_b": wins[SIDE_B],
+        "draws": wins[None],
+        "avg_rounds": rounds / battles if battles else 0,
+    }
+
+
+def benchmark_batch(battles=1_000_000, seed=0, scalar_battles=20_000,
+                    hp_range=(60, 140), damage_range=(10, 40), workers=None):
+    """
+    Пакетный режим на battles боях и сравнение со скалярным движком на их части.
+
+    workers - потоков пакетного режима (None - BATCH_WORKERS, по числу ядер).
+    """
+    import numpy as np
+
+    from battle.batch import BATCH_WORKERS, DRAW, simulate_batch
+
+    workers = workers or BATCH_WORKERS
+
+    rng = np.random.default_rng(seed)
+    shape = (battles, LINE_SIZE)
+    hp_a, hp_b = (rng.integers(hp_range[0], hp_range[1] + 1, shape) for _ in range(2))
+    damage_a, damage_b = (rng.integers(damage_range[0], damage_range[1] + 1, shape) for _ in range(2))
+
+    started = time.perf_counter()
+    winners, rounds, hp = simulate_batch(hp_a, damage_a, hp_b, damage_b, workers=workers)
+    elapsed = time.perf_counter() - started
+
+    scalar_battles = min(scalar_battles, battles)
+    battle = Battle(*([0] * LINE_SIZE,) * 4)
+    mismatches = 0
+    scalar_started = time.perf_counter()
+    for index in range(scalar_battles):
+        battle.reset(hp_a[index].tolist(), damage_a[index].tolist(),
+                     hp_b[index].tolist(), damage_b[index].tolist())
+        result = battle.run()
+        winner = DRAW if result.winner is None else result.winner
+        if (winner, result.rounds, result.hp) != (winners[index], rounds[index], tuple(hp[index].tolist())):
+            mismatches += 1
+    scalar_elapsed = time.perf_counter() - scalar_started
+
+    batch_speed = battles / elapsed if elapsed else float("inf")
+    scalar_speed = scalar_battles / scalar_elapsed if scalar_elapsed else float("inf")
+    return {
+        "battles": battles,
+        "workers": workers,
+        "seconds": elapsed,
+        "battles_per_second": batch_speed,
+        "scalar_battles_per_second": scalar_speed,
+        "speedup": batch_speed / scalar_speed if scalar_speed else float("inf"),
+        "mismatches": mismatches,
+        "checked": scalar_battles,
+        "wins_a": int((winners == SIDE_A).sum()),
+        "wins_b": int((winners == SIDE_B).sum()),
+        "draws": int((winners == DRAW).sum()),
+        "avg_rounds": float(rounds.mean()) if battles else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер скорости движка боя 5 на 5")
+    parser.add_argument("--battles", type=int, default=100_000, help="Число боёв")
+    parser.add_argument("--seed", type=int, default=0, help="Сид генерации линий")
+    parser.add_argument("--batch", action="store_true", help="Пакетный режим на NumPy")
+    parser.add_argument("--effects", action="store_true", help="Маги с эффектами заклинаний")
+    parser.add_argument("--scalar-battles", type=int, default=20_000,
+                        help="Боёв для сверки со скалярным движком в пакетном режиме")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Потоков пакетного режима (по умолчанию - по числу ядер)")
+    args = parser.parse_args()
+
+    if args.batch:
+        stats = benchmark_batch(args.battles, args.seed, args.scalar_battles, workers=args.workers)
+        print(f"⚔️ Пакетно, потоков {stats['workers']}: {stats['battles']} боёв за {stats['seconds']:.2f} с "
+              f"({stats['battles_per_second']:.0f} боёв/с, "
+              f"в {stats['speedup']:.0f} раз быстрее скалярного движка)")
+        print(f"🔍 Сверено со скалярным движком: {stats['checked']}, расхождений: {stats['mismatches']}")
+        print(f"📊 Победы A: {stats['wins_a']}, победы B: {stats['wins_b']}, ничьи: {stats['draws']}, "
+              f"раундов в среднем: {stats['avg_rounds']:.2f}")
+        return
+
+    stats = benchmark(args.battles, args.seed, args.effects)
+    print(f"⚔️ Боёв: {stats['battles']} за {stats['seconds']:.2f} с "
+          f"({stats['battles_per_second']:.0f} боёв/с)")
+    print(f"📊 Победы A: {stats['wins_a']}, победы B: {stats['wins_b']}, ничьи: {stats['draws']}, "
+          f"раундов в среднем: {stats['avg_rounds']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
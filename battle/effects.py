@@ -0,0 +1,158 @@
+# battle/effects.py
+"""
+Эффекты заклинаний в бою: горение, заморозка, оглушение, отбрасывание,
+замедление, ослепление, снижение меткости и защиты, вампиризм.
+
+Параметры берутся из "battle_effect" заклинаний spells_config.py. Активные
+эффекты боя хранятся не объектами у магов, а параллельными списками
+EffectTable: kind, cell, turns, magnitude - по элементу на эффект. Раунд
+обрабатывается проходами по этим спискам:
+- в конце раунда - урон горения, уменьшение длительности и удаление
+  истёкших эффектов и эффектов погибших магов одной сборкой списков;
+- после этого - сводка на следующий раунд: маска магов, пропускающих
+  атаку, и по ячейкам - снижение урона, шанс промаха, шанс пропуска из-за
+  замедления, рост получаемого урона.
+Внутри раунда атака читает только сводку, поэтому цена атаки не зависит
+от числа эффектов.
+
+Эффект, наложенный в раунде, действует turns следующих раундов (горение
+наносит урон в конце каждого из них); эффекты одного вида складываются:
+горение - суммой урона, остальные - по сильнейшему.
+"""
+
+from spells_config import SPELLS_BY_ID
+
+# Виды эффектов
+BURN, FREEZE, STUN, KNOCKBACK, SLOW, BLIND, ACCURACY, DEFENSE_DOWN = range(8)
+EFFECT_TYPES = ("burn", "freeze", "stun", "knockback", "slow", "blind", "accuracy", "defense_down")
+
+# Виды, при которых маг пропускает атаку
+SKIP_KINDS = frozenset((FREEZE, STUN, KNOCKBACK))
+
+# Вампиризм - не эффект на цели, а свойство удара (в EffectTable не хранится)
+LIFESTEAL = "lifesteal"
+
+
+class SpellEffect:
+    """Эффект удара заклинания: вид (индекс EFFECT_TYPES или LIFESTEAL), раунды, сила, шанс."""
+
+    __slots__ = ("kind", "turns", "power", "chance")
+
+    def __init__(self, kind, turns=1, power=0.0, chance=1.0):
+        self.kind = kind
+        self.turns = turns
+        self.power = power
+        self.chance = chance
+
+    def __repr__(self):
+        kind = self.kind if self.kind == LIFESTEAL else EFFECT_TYPES[self.kind]
+        return f"SpellEffect({kind}, turns={self.turns}, power={self.power}, chance={self.chance})"
+
+
+def _spell_effects():
+    """spell_id -> SpellEffect по "battle_effect" заклинаний и гибридов."""
+    effects = {}
+    for spell in SPELLS_BY_ID.values():
+        params = spell.battle_effect
+        if not params:
+            continue
+        kind = params["type"]
+        if kind != LIFESTEAL:
+            if kind not in EFFECT_TYPES:
+                raise ValueError(f"❌ Неизвестный эффект '{kind}' у заклинания {spell.id}")
+            kind = EFFECT_TYPES.index(kind)
+        effects[spell.id] = SpellEffect(
+            kind, params.get("turns", 1), params.get("power", 0.0), params.get("chance", 1.0)
+        )
+    return effects
+
+
+SPELL_EFFECTS = _spell_effects()
+
+
+class EffectTable:
+    """
+    Активные эффекты одного боя - параллельные списки kind, cell, turns, magnitude.
+
+    magnitude - урон за раунд для горения и сила (доля) для остальных видов.
+    Первые active эффектов действуют в текущем раунде, остальные наложены в
+    нём и начнут действовать со следующего.
+    """
+
+    __slots__ = ("kind", "cell", "turns", "magnitude", "active",
+                 "skip_mask", "skip_kind", "weaken", "miss", "slow", "vulnerable")
+
+    def __init__(self, cells):
+        self.kind, self.cell, self.turns, self.magnitude = [], [], [], []
+        self.active = 0
+        # Сводка на текущий раунд
+        self.skip_mask = 0  # бит = ячейка мага, пропускающего атаку
+        self.skip_kind = [-1] * cells  # из-за какого эффекта
+        self.weaken = [0.0] * cells  # снижение исходящего урона
+        self.miss = [0.0] * cells  # шанс промаха
+        self.slow = [0.0] * cells  # шанс пропустить атаку
+        self.vulnerable = [0.0] * cells  # рост получаемого урона
+
+    def __len__(self):
+        return len(self.kind)
+
+    def clear(self):
+        del self.kind[:], self.cell[:], self.turns[:], self.magnitude[:]
+        self.active = 0
+        self._summarize()
+
+    def add(self, kind, cell, turns, magnitude):
+        """Наложить эффект (действует со следующего раунда)."""
+        self.kind.append(kind)
+        self.cell.append(cell)
+        self.turns.append(turns)
+        self.magnitude.append(magnitude)
+
+    def end_round(self, hp, recorder=None):
+        """
+        Конец раунда: урон горения, истечение эффектов, сводка на следующий раунд.
+
+        Возвращает маску ячеек магов, погибших от горения.
+        """
+        kind, cell, turns, magnitude = self.kind, self.cell, self.turns, self.magnitude
+        killed = 0
+        for i in range(self.active):
+            if kind[i] == BURN and hp[cell[i]] > 0:
+                target = cell[i]
+                hp[target] -= magnitude[i]
+                died = hp[target] <= 0
+                if died:
+                    killed |= 1 << target
+                if recorder is not None:
+                    recorder.status("burn", target, magnitude[i], died)
+            turns[i] -= 1
+
+        # Истёкшие эффекты и эффекты погибших удаляются одной пересборкой списков
+        keep = [i for i in range(len(kind)) if turns[i] > 0 and hp[cell[i]] > 0]
+        if len(keep) != len(kind):
+            self.kind = [kind[i] for i in keep]
+            self.cell = [cell[i] for i in keep]
+            self.turns = [turns[i] for i in keep]
+            self.magnitude = [magnitude[i] for i in keep]
+        self.active = len(keep)
+        self._summarize()
+        return killed
+
+    def _summarize(self):
+        weaken, miss, slow, vulnerable = self.weaken, self.miss, self.slow, self.vulnerable
+        for values in (weaken, miss, slow, vulnerable):
+            values[:] = [0.0] * len(values)
+        skip_mask = 0
+        for kind, cell, magnitude in zip(self.kind, self.cell, self.magnitude):
+            if kind in SKIP_KINDS:
+                skip_mask |= 1 << cell
+                self.skip_kind[cell] = kind
+            elif kind == BLIND:
+                weaken[cell] = max(weaken[cell], magnitude)
+            elif kind == ACCURACY:
+                miss[cell] = max(miss[cell], magnitude)
+            elif kind == SLOW:
+                slow[cell] = max(slow[cell], magnitude)
+            elif kind == DEFENSE_DOWN:
+                vulnerable[cell] = max(vulnerable[cell], magnitude)
+        self.skip_mask = skip_mask
@@ -0,0 +1,273 @@
+# battle/engine.py
+"""
+Бой "Линия Сражения" 5 на 5 - авторитетная серверная реализация.
+
+Правила совпадают с web/battle_test_5v5.js:
+- раунд состоит из 6 фаз: A атакует 1 магом, затем B, A, B, A, B - по 2 мага;
+- атакующие берутся из списка живых магов стороны по порядку, со смещением
+  0, 0, 2, 4, 6, 8 (циклически по числу живых);
+- маг бьёт цель напротив, а если она мертва - ищет живую цель влево по линии
+  противника, с переходом с начала линии на конец (find_target);
+- бой заканчивается после фазы, в которой погиб последний маг стороны;
+- заклинание мага может накладывать эффект на цель или лечить мага
+  (battle.effects); эффекты обрабатываются в конце раунда.
+
+Состояние хранится в плоских списках: hp и damage на 2 * LINE_SIZE ячеек
+(сначала сторона A, затем B) и битовые маски живых магов по сторонам.
+Фаза не создаёт объектов: атакующие и цели берутся из таблиц по маскам
+(battle.targeting), а один Battle можно переиспользовать для серии боёв
+через reset(). Запись хода боя (battle.replay) подключается через recorder
+и без него ничего не стоит.
+"""
+
+import random
+
+from battle.effects import BURN, LIFESTEAL, SLOW, SPELL_EFFECTS, EffectTable
+from battle.targeting import targeting_tables
+
+LINE_SIZE = 5
+SIDE_A, SIDE_B = 0, 1
+
+# Фазы раунда: (атакующая сторона, смещение в списке живых, число атакующих)
+PHASES = (
+    (SIDE_A, 0, 1),
+    (SIDE_B, 0, 2),
+    (SIDE_A, 2, 2),
+    (SIDE_B, 4, 2),
+    (SIDE_A, 6, 2),
+    (SIDE_B, 8, 2),
+)
+
+# Предел раундов: бой магов без урона иначе не закончится
+MAX_ROUNDS = 100
+
+_SIDE_MASK = (1 << LINE_SIZE) - 1
+
+_TABLES = targeting_tables(LINE_SIZE)
+_TARGET = _TABLES.target
+# Атакующие каждой фазы по маске атакующей стороны
+_PHASE_ATTACKERS = tuple(_TABLES.phase_attackers(offset, count) for _, offset, count in PHASES)
+
+
+def find_target(alive_mask, slot):
+    """
+    Ячейка цели для мага из ячейки slot (как findTarget5v5) или -1.
+
+    Сначала цель напротив, затем влево по линии: slot-1, ..., 0, LINE_SIZE-1, ...
+    """
+    return _TARGET[alive_mask * LINE_SIZE + slot]
+
+
+def lineup_arrays(wizards):
+    """
+    Списки (hp, damage) длины LINE_SIZE по линии магов.
+
+    Маг - словарь с ключами hp и damage (как в battle_test_5v5.js);
+    None или отсутствующий маг - пустая ячейка.
+    """
+    hp, damage = [0] * LINE_SIZE, [0] * LINE_SIZE
+    for slot, wizard in enumerate(list(wizards or ())[:LINE_SIZE]):
+        if wizard:
+            hp[slot] = int(wizard.get("hp", 0))
+            damage[slot] = int(wizard.get("damage", 0))
+    return hp, damage
+
+
+def lineup_spells(wizards):
+    """Список заклинаний (ключ spell мага) длины LINE_SIZE; None - без заклинания."""
+    spells = [None] * LINE_SIZE
+    for slot, wizard in enumerate(list(wizards or ())[:LINE_SIZE]):
+        if wizard:
+            spells[slot] = wizard.get("spell")
+    return spells
+
+
+class BattleResult:
+    """Итог боя: winner (SIDE_A, SIDE_B или None - ничья), число раундов и HP всех ячеек."""
+
+    __slots__ = ("winner", "rounds", "hp")
+
+    def __init__(self, winner, rounds, hp):
+        self.winner = winner
+        self.rounds = rounds
+        self.hp = hp  # кортеж 2 * LINE_SIZE значений, мёртвые - 0
+
+    def __repr__(self):
+        return f"BattleResult(winner={self.winner}, rounds={self.rounds}, hp={self.hp})"
+
+
+class Battle:
+    """
+    Состояние одного боя. Сторона A - инициатор (ходит первой).
+
+    seed задаёт генератор случайных чисел боя (rng) для вероятностных эффектов:
+    по сиду и линиям бой воспроизводится полностью. Базовые правила случайности
+    не используют.
+
+    spells - заклинания 2 * LINE_SIZE ячеек (id или None). Если ни одно из них
+    не даёт эффекта, бой идёт по базовым правилам без таблицы эффектов.
+    """
+
+    __slots__ = ("hp", "damage", "alive", "round", "phase", "seed", "rng", "recorder",
+                 "max_hp", "hit_effects", "effects")
+
+    def __init__(self, hp_a, damage_a, hp_b, damage_b, seed=None, recorder=None, spells=None):
+        self.hp = [0] * (2 * LINE_SIZE)
+        self.damage = [0] * (2 * LINE_SIZE)
+        self.alive = [0, 0]
+        self.rng = random.Random()
+        # recorder.attack(ячейка атакующего, ячейка цели, урон, погибла ли цель),
+        # recorder.status(событие эффекта, ячейка, значение, погиб ли маг) и recorder.round_end()
+        self.recorder = recorder
+        self.max_hp = [0] * (2 * LINE_SIZE)
+        self.hit_effects = None  # SpellEffect удара по ячейкам
+        self.effects = None  # EffectTable, если в бою есть эффекты
+        self.reset(hp_a, damage_a, hp_b, damage_b, seed, spells)
+
+    def reset(self, hp_a, damage_a, hp_b, damage_b, seed=None, spells=None):
+        """Начать новый бой на тех же списках состояния."""
+        hp, damage = self.hp, self.damage
+        hp[:LINE_SIZE] = hp_a
+        hp[LINE_SIZE:] = hp_b
+        damage[:LINE_SIZE] = damage_a
+        damage[LINE_SIZE:] = damage_b
+        self.max_hp[:] = hp
+        hit_effects = [SPELL_EFFECTS.get(spell) for spell in spells] if spells else None
+        if hit_effects and any(hit_effects):
+            self.hit_effects = hit_effects
+            if self.effects is None:
+                self.effects = EffectTable(2 * LINE_SIZE)
+            else:
+                self.effects.clear()
+        else:
+            self.hit_effects = None
+            self.effects = None
+        for side in (SIDE_A, SIDE_B):
+            mask, base = 0, side * LINE_SIZE
+            for slot in range(LINE_SIZE):
+                if hp[base + slot] > 0:
+                    mask |= 1 << slot
+            self.alive[side] = mask
+        self.round = 1
+        self.phase = 0
+        self.seed = seed
+        self.rng.seed(seed)
+
+    @property
+    def is_over(self):
+        return not (self.alive[SIDE_A] and self.alive[SIDE_B])
+
+    def step(self):
+        """Выполнить одну фазу."""
+        side = PHASES[self.phase][0]
+        attackers = _PHASE_ATTACKERS[self.phase][self.alive[side]]
+        if attackers and self.effects is not None:
+            self._attack_with_effects(side, attackers)
+        elif attackers:
+            hp, damage, alive = self.hp, self.damage, self.alive
+            defender = 1 - side
+            attacker_base = side * LINE_SIZE
+            defender_base = defender * LINE_SIZE
+            for slot in attackers:
+                target = _TARGET[alive[defender] * LINE_SIZE + slot]
+                if target < 0:
+                    break
+                cell = defender_base + target
+                hp[cell] -= damage[attacker_base + slot]
+                if hp[cell] <= 0:
+                    alive[defender] &= ~(1 << target)
+                if self.recorder is not None:
+                    self.recorder.attack(attacker_base + slot, cell, damage[attacker_base + slot], hp[cell] <= 0)
+
+        self.phase += 1
+        if self.phase == len(PHASES):
+            self.phase = 0
+            self.round += 1
+            if self.effects is not None and not self.is_over:
+                killed = self.effects.end_round(self.hp, self.recorder)
+                if killed:
+                    self.alive[SIDE_A] &= ~killed & _SIDE_MASK
+                    self.alive[SIDE_B] &= ~(killed >> LINE_SIZE)
+            if self.recorder is not None:
+                self.recorder.round_end()
+
+    def _attack_with_effects(self, side, attackers):
+        """Атаки фазы с учётом сводки эффектов раунда и эффектов заклинаний."""
+        hp, damage, alive, rng, recorder = self.hp, self.damage, self.alive, self.rng, self.recorder
+        effects, hit_effects = self.effects, self.hit_effects
+        defender = 1 - side
+        attacker_base = side * LINE_SIZE
+        defender_base = defender * LINE_SIZE
+        for slot in attackers:
+            target = _TARGET[alive[defender] * LINE_SIZE + slot]
+            if target < 0:
+                break
+            attacker = attacker_base + slot
+            cell = defender_base + target
+            if effects.skip_mask >> attacker & 1:
+                if recorder is not None:
+                    recorder.status("skip", attacker, effects.skip_kind[attacker], False)
+                continue
+            if effects.slow[attacker] and rng.random() < effects.slow[attacker]:
+                if recorder is not None:
+                    recorder.status("skip", attacker, SLOW, False)
+                continue
+            if effects.miss[attacker] and rng.random() < effects.miss[attacker]:
+                if recorder is not None:
+                    recorder.status("miss", attacker, cell, False)
+                continue
+
+            dealt = damage[attacker]
+            if effects.weaken[attacker] or effects.vulnerable[cell]:
+                dealt = round(dealt * (1 - effects.weaken[attacker]) * (1 + effects.vulnerable[cell]))
+            hp[cell] -= dealt
+            died = hp[cell] <= 0
+            if died:
+                alive[defender] &= ~(1 << target)
+            if recorder is not None:
+                recorder.attack(attacker, cell, dealt, died)
+
+            spell = hit_effects[attacker]
+            if spell is None or dealt <= 0:
+                continue
+            if spell.kind == LIFESTEAL:
+                heal = min(round(dealt * spell.power), self.max_hp[attacker] - hp[attacker])
+                if heal > 0:
+                    hp[attacker] += heal
+                    if recorder is not None:
+                        recorder.status("heal", attacker, heal, False)
+            elif not died and (spell.chance >= 1 or rng.random() < spell.chance):
+                magnitude = max(1, round(dealt * spell.power)) if spell.kind == BURN else spell.power
+                effects.add(spell.kind, cell, spell.turns, magnitude)
+                if recorder is not None:
+                    recorder.status("effect", cell, spell.kind, False)
+
+    def run(self, max_rounds=MAX_ROUNDS):
+        """Провести бой до конца (или до max_rounds раундов - тогда ничья)."""
+        while not self.is_over:
+            if self.round > max_rounds:
+                return self.result(draw=True)
+            self.step()
+        return self.result()
+
+    def result(self, draw=False):
+        """Итог боя в текущем состоянии."""
+        if draw or (not self.alive[SIDE_A] and not self.alive[SIDE_B]):
+            winner = None
+        elif not self.alive[SIDE_A]:
+            winner = SIDE_B
+        elif not self.alive[SIDE_B]:
+            winner = SIDE_A
+        else:
+            winner = None
+        # Раунд, в котором закончился бой (счётчик уже переключён, если это была 6-я фаза)
+        rounds = self.round if self.phase else self.round - 1
+        return BattleResult(winner, rounds, tuple(max(value, 0) for value in self.hp))
+
+
+def run_battle(wizards_a, wizards_b, seed=None, max_rounds=MAX_ROUNDS):
+    """Провести бой линий магов (словари hp/damage/spell); сторона A - инициатор."""
+    hp_a, damage_a = lineup_arrays(wizards_a)
+    hp_b, damage_b = lineup_arrays(wizards_b)
+    spells = lineup_spells(wizards_a) + lineup_spells(wizards_b)
+    return Battle(hp_a, damage_a, hp_b, damage_b, seed, spells=spells).run(max_rounds)
@@ -0,0 +1,337 @@
+# battle/replay.py
+"""
+Компактная запись боя вместо текстового лога.
+
+Запись хранит только то, из чего бой восстанавливается: сид, обе линии
+(hp, damage, имена магов и заклинания) и поток событий. Событие атаки - два
+varint: код (ячейка атакующего * LINE_SIZE + ячейка цели в линии противника)
+* 2 + флаг гибели цели и урон; конец раунда - отдельный код ROUND_END.
+События эффектов (battle.effects) идут кодами после ROUND_END:
+(событие * 2 * LINE_SIZE + ячейка) * 2 + флаг гибели и значение. Типичная
+атака занимает 2 байта; в Firebase поток лежит строкой base64.
+
+Текст боя собирается только при просмотре, на языке игрока (render_replay).
+Если поток событий у старой записи удалён, он восстанавливается повторной
+симуляцией по сиду и линиям - бой детерминирован.
+"""
+
+import base64
+import random
+import re
+import time
+
+from battle.effects import EFFECT_TYPES
+from battle.engine import LINE_SIZE, MAX_ROUNDS, SIDE_A, SIDE_B, Battle, lineup_arrays, lineup_spells
+
+# Версия 2 - события эффектов (записи версии 1 читаются как есть)
+REPLAY_VERSION = 2
+
+# Узел записей боёв игроков: battle_logs/{user_id}/{ключ записи}
+REPLAYS_PATH = "battle_logs"
+# Сколько записей хранится у игрока и у скольких последних сохраняется поток событий
+MAX_REPLAYS = 50
+FULL_REPLAYS = 10
+
+# Код конца раунда (коды атак занимают 0 .. 2 * (2 * LINE_SIZE) * LINE_SIZE - 1)
+ROUND_END = 2 * 2 * LINE_SIZE * LINE_SIZE
+
+# События эффектов и их значения: наложен эффект (вид), горение (урон),
+# лечение (HP), пропуск атаки (вид эффекта), промах (ячейка цели)
+STATUS_EVENTS = ("effect", "burn", "heal", "skip", "miss")
+_STATUS_BASE = ROUND_END + 1
+
+# Ключи записей идут от новых к старым: так query_by_key отдаёт свежие первыми
+_KEY_BASE = 10 ** 13
+_KEY_PATTERN = re.compile(r"\d{13}_[0-9a-f]+")
+
+
+# --- Поток событий ---
+
+def _write_varint(out, value):
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, pos):
+    value, shift = 0, 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+class ReplayRecorder:
+    """Запись событий боя в байтовый поток (подключается как Battle.recorder)."""
+
+    __slots__ = ("events",)
+
+    def __init__(self):
+        self.events = bytearray()
+
+    def attack(self, attacker_cell, target_cell, damage, died):
+        code = (attacker_cell * LINE_SIZE + target_cell % LINE_SIZE) * 2 + bool(died)
+        _write_varint(self.events, code)
+        _write_varint(self.events, max(int(damage), 0))
+
+    def status(self, event, cell, value, died):
+        code = (STATUS_EVENTS.index(event) * 2 * LINE_SIZE + cell) * 2 + bool(died)
+        _write_varint(self.events, _STATUS_BASE + code)
+        _write_varint(self.events, max(int(value), 0))
+
+    def round_end(self):
+        _write_varint(self.events, ROUND_END)
+
+
+def decode_events(events):
+    """
+    События потока: ("attack", ячейка атакующего, ячейка цели, урон, погибла ли цель),
+    ("round_end",) или событие эффекта (имя из STATUS_EVENTS, ячейка, значение,
+    погиб ли маг). Ячейки - 0..2*LINE_SIZE-1, сначала сторона A.
+    """
+    data = base64.urlsafe_b64decode(events) if isinstance(events, str) else bytes(events)
+    pos = 0
+    while pos < len(data):
+        code, pos = _read_varint(data, pos)
+        if code == ROUND_END:
+            yield ("round_end",)
+            continue
+        if code >= _STATUS_BASE:
+            value, pos = _read_varint(data, pos)
+            code, died = divmod(code - _STATUS_BASE, 2)
+            event, cell = divmod(code, 2 * LINE_SIZE)
+            yield (STATUS_EVENTS[event], cell, value, bool(died))
+            continue
+        damage, pos = _read_varint(data, pos)
+        code, died = divmod(code, 2)
+        attacker_cell, target_slot = divmod(code, LINE_SIZE)
+        defender = SIDE_B if attacker_cell < LINE_SIZE else SIDE_A
+        yield ("attack", attacker_cell, defender * LINE_SIZE + target_slot, damage, bool(died))
+
+
+# --- Запись боя ---
+
+def _lineup_record(wizards):
+    hp, damage = lineup_arrays(wizards)
+    names = [(wizard or {}).get("name") or "" for wizard in list(wizards or ())[:LINE_SIZE]]
+    record = {"hp": hp, "damage": damage, "names": names + [""] * (LINE_SIZE - len(names))}
+    spells = lineup_spells(wizards)
+    if any(spells):
+        # "" вместо None: None в Firebase удалил бы элемент списка
+        record["spells"] = [spell or "" for spell in spells]
+    return record
+
+
+def _simulate(replay, recorder=None):
+    a, b = replay["lineups"]
+    spells = None
+    if a.get("spells") or b.get("spells"):
+        spells = [spell or None for lineup in (a, b) for spell in (lineup.get("spells") or [None] * LINE_SIZE)]
+    battle = Battle(a["hp"], a["damage"], b["hp"], b["damage"], replay.get("seed"), recorder, spells)
+    return battle.run(replay.get("max_rounds", MAX_ROUNDS))
+
+
+def record_battle(wizards_a, wizards_b, players=None, seed=None, max_rounds=MAX_ROUNDS, now=None):
+    """
+    Провести бой с записью. wizards_a/wizards_b - линии магов (словари hp, damage, name, spell),
+    players - [{id, name}, {id, name}] сторон A и B.
+
+    Возвращает (BattleResult, запись для хранения).
+    """
+    seed = random.randrange(2 ** 31) if seed is None else seed
+    replay = {
+        "v": REPLAY_VERSION,
+        "seed": seed,
+        "created_at": int(time.time() * 1000) if now is None else now,
+        "players": players or [{}, {}],
+        "lineups": [_lineup_record(wizards_a), _lineup_record(wizards_b)],
+    }
+    if max_rounds != MAX_ROUNDS:
+        replay["max_rounds"] = max_rounds
+    recorder = ReplayRecorder()
+    result = _simulate(replay, recorder)
+    replay.update({
+        # Ничья хранится как -1: None в Firebase удалил бы поле
+        "winner": -1 if result.winner is None else result.winner,
+        "rounds": result.rounds,
+        "events": base64.urlsafe_b64encode(bytes(recorder.events)).decode("ascii"),
+    })
+    return result, replay
+
+
+def replay_events(replay):
+    """Поток событий записи; для усечённой записи восстанавливается симуляцией."""
+    if replay.get("events"):
+        return replay["events"]
+    recorder = ReplayRecorder()
+    _simulate(replay, recorder)
+    return bytes(recorder.events)
+
+
+def replay_key(created_at, seed):
+    """Ключ записи: новые записи сортируются раньше старых, сид разводит одновременные бои."""
+    return f"{_KEY_BASE - created_at:013d}_{seed:x}"
+
+
+def is_replay_key(key):
+    """Похожа ли строка на ключ записи (проверка ввода игрока перед чтением пути)."""
+    return bool(_KEY_PATTERN.fullmatch(key or ""))
+
+
+# --- Текст на языке игрока ---
+
+REPLAY_TEXTS = {
+    "ru": {
+        "start": "⚔️ Бой начался! {player} атакует первым.",
+        "attack": "{attacker} ({attacker_player}) атакует {target} ({target_player}) на {damage} урона. ({target} HP: {hp})",
+        "death": "💀 {target} ({target_player}) погибает!",
+        "round_end": "--- Конец раунда {round} ---",
+        "winner": "🏆 Победитель: {player}!",
+        "draw": "🤝 Ничья!",
+        "wizard": "Маг {slot}",
+        "side": "Игрок {side}",
+        "summary_win": "🏆 Победа над {opponent} за {rounds} р.",
+        "summary_loss": "💀 Поражение от {opponent} за {rounds} р.",
+        "summary_draw": "🤝 Ничья с {opponent}",
+        "effect": "✨ {target} ({target_player}): {effect}",
+        "burn": "🔥 {target} ({target_player}) горит: {damage} урона. ({target} HP: {hp})",
+        "heal": "💚 {target} ({target_player}) восстанавливает {amount} HP. ({target} HP: {hp})",
+        "skip": "⏸️ {target} ({target_player}) пропускает атаку: {effect}.",
+        "miss": "💨 {attacker} ({attacker_player}) промахивается по {target} ({target_player}).",
+        "effects": {
+            "burn": "горение 🔥",
+            "freeze": "заморозка ❄️",
+            "stun": "оглушение 💫",
+            "knockback": "отброшен 🌪️",
+            "slow": "замедление 🐌",
+            "blind": "ослепление 🌫️",
+            "accuracy": "снижение меткости 🎯",
+            "defense_down": "снижение защиты 🛡️",
+        },
+    },
+    "en": {
+        "start": "⚔️ The battle begins! {player} attacks first.",
+        "attack": "{attacker} ({attacker_player}) hits {target} ({target_player}) for {damage} damage. ({target} HP: {hp})",
+        "death": "💀 {target} ({target_player}) falls!",
+        "round_end": "--- End of round {round} ---",
+        "winner": "🏆 Winner: {player}!",
+        "draw": "🤝 Draw!",
+        "wizard": "Wizard {slot}",
+        "side": "Player {side}",
+        "summary_win": "🏆 Won against {opponent} in {rounds} rounds",
+        "summary_loss": "💀 Lost to {opponent} in {rounds} rounds",
+        "summary_draw": "🤝 Draw with {opponent}",
+        "effect": "✨ {target} ({target_player}): {effect}",
+        "burn": "🔥 {target} ({target_player}) burns for {damage} damage. ({target} HP: {hp})",
+        "heal": "💚 {target} ({target_player}) restores {amount} HP. ({target} HP: {hp})",
+        "skip": "⏸️ {target} ({target_player}) skips the attack: {effect}.",
+        "miss": "💨 {attacker} ({attacker_player}) misses {target} ({target_player}).",
+        "effects": {
+            "burn": "burning 🔥",
+            "freeze": "frozen ❄️",
+            "stun": "stunned 💫",
+            "knockback": "knocked back 🌪️",
+            "slow": "slowed 🐌",
+            "blind": "blinded 🌫️",
+            "accuracy": "accuracy down 🎯",
+            "defense_down": "defense down 🛡️",
+        },
+    },
+}
+DEFAULT_LANGUAGE = "ru"
+
+
+def texts_for(language):
+    """Шаблоны для языка Telegram (language_code вида 'en' или 'en-US'); по умолчанию русский."""
+    return REPLAY_TEXTS.get((language or DEFAULT_LANGUAGE)[:2].lower(), REPLAY_TEXTS[DEFAULT_LANGUAGE])
+
+
+def _player_name(replay, side, texts):
+    players = replay.get("players") or [{}, {}]
+    return (players[side] or {}).get("name") or texts["side"].format(side="AB"[side])
+
+
+def render_replay(replay, language=None):
+    """Строки текстового лога боя на языке игрока."""
+    texts = texts_for(language)
+    players = [_player_name(replay, side, texts) for side in (SIDE_A, SIDE_B)]
+    names, hp = [], []
+    for lineup in replay["lineups"]:
+        for slot in range(LINE_SIZE):
+            lineup_names = lineup.get("names") or []
+            name = lineup_names[slot] if slot < len(lineup_names) else ""
+            names.append(name or texts["wizard"].format(slot=slot + 1))
+        hp.extend(lineup["hp"])
+
+    def who(cell):
+        return {"target": names[cell], "target_player": players[cell // LINE_SIZE]}
+
+    def effect_name(kind):
+        return texts["effects"].get(EFFECT_TYPES[kind], EFFECT_TYPES[kind]) if kind < len(EFFECT_TYPES) else "?"
+
+    lines = [texts["start"].format(player=players[SIDE_A])]
+    round_number = 1
+    for event in decode_events(replay_events(replay)):
+        if event[0] == "round_end":
+            lines.append(texts["round_end"].format(round=round_number))
+            round_number += 1
+            continue
+        if event[0] != "attack":
+            name, cell, value, died = event
+            if name == "effect":
+                lines.append(texts["effect"].format(effect=effect_name(value), **who(cell)))
+            elif name == "skip":
+                lines.append(texts["skip"].format(effect=effect_name(value), **who(cell)))
+            elif name == "miss":
+                lines.append(texts["miss"].format(
+                    attacker=names[cell], attacker_player=players[cell // LINE_SIZE],
+                    target=names[value], target_player=players[value // LINE_SIZE],
+                ))
+            elif name == "burn":
+                hp[cell] -= value
+                lines.append(texts["burn"].format(damage=value, hp=max(hp[cell], 0), **who(cell)))
+                if died:
+                    lines.append(texts["death"].format(**who(cell)))
+            elif name == "heal":
+                hp[cell] += value
+                lines.append(texts["heal"].format(amount=value, hp=hp[cell], **who(cell)))
+            continue
+        _, attacker_cell, target_cell, damage, died = event
+        hp[target_cell] -= damage
+        attacker_side, target_side = attacker_cell // LINE_SIZE, target_cell // LINE_SIZE
+        lines.append(texts["attack"].format(
+            attacker=names[attacker_cell], attacker_player=players[attacker_side],
+            target=names[target_cell], target_player=players[target_side],
+            damage=damage, hp=max(hp[target_cell], 0),
+        ))
+        if died:
+            lines.append(texts["death"].format(target=names[target_cell], target_player=players[target_side]))
+
+    winner = replay.get("winner", -1)
+    lines.append(texts["draw"] if winner not in (SIDE_A, SIDE_B) else texts["winner"].format(player=players[winner]))
+    return lines
+
+
+def render_page(replay, language=None, page=0, page_size=30):
+    """Страница текстового лога: (текст, число страниц)."""
+    lines = render_replay(replay, language)
+    pages = max(1, -(-len(lines) // page_size))
+    page = min(max(page, 0), pages - 1)
+    return "\n".join(lines[page * page_size:(page + 1) * page_size]), pages
+
+
+def render_summary(replay, user_id, language=None):
+    """Строка списка боёв с точки зрения игрока user_id."""
+    texts = texts_for(language)
+    players = replay.get("players") or [{}, {}]
+    side = SIDE_B if str((players[SIDE_B] or {}).get("id")) == str(user_id) else SIDE_A
+    opponent = _player_name(replay, 1 - side, texts)
+    winner = replay.get("winner", -1)
+    if winner not in (SIDE_A, SIDE_B):
+        return texts["summary_draw"].format(opponent=opponent)
+    key = "summary_win" if winner == side else "summary_loss"
+    return texts[key].format(opponent=opponent, rounds=replay.get("rounds", 0))
@@ -0,0 +1,78 @@
+# battle/targeting.py
+"""
+Таблицы выбора целей и атакующих по битовым маскам живых магов.
+
+Для линии из line_size ячеек масок всего 2 ** line_size, поэтому всё, что
+бой вычисляет циклами по линии, считается заранее:
+- target[mask * line_size + slot] - ячейка цели для мага из ячейки slot
+  (напротив, затем влево по линии с переходом с начала на конец, как
+  findTarget5v5) или -1;
+- nth_alive[mask * line_size + n] - ячейка n-го живого мага;
+- next_alive[mask * line_size + slot] - следующий живой маг после slot
+  (циклически вправо): вторая атака пары фазы;
+- alive_count[mask] и first_alive[mask].
+
+Одна атака - одна выборка из кортежа. Таблицы строятся для любой длины
+линии (targeting_tables): для сетки 30 ячеек battle/battle_grid.js - это
+линии по 5 ячеек (маги, существа, эффекты каждой стороны), а для линии из
+15 ячеек стороны - 2 ** 15 * 15 значений.
+"""
+
+from functools import lru_cache
+
+# Больше 2 ** 16 * 16 значений в кортеже держать в памяти не стоит
+MAX_LINE_SIZE = 16
+
+
+class TargetingTables:
+    """Таблицы одной длины линии (строятся один раз, см. targeting_tables)."""
+
+    __slots__ = ("line_size", "alive_count", "first_alive", "nth_alive", "next_alive", "target")
+
+    def __init__(self, line_size):
+        if not 1 <= line_size <= MAX_LINE_SIZE:
+            raise ValueError(f"❌ Длина линии должна быть от 1 до {MAX_LINE_SIZE}: {line_size}")
+        self.line_size = line_size
+        masks = range(1 << line_size)
+        slots = range(line_size)
+        alive = [[slot for slot in slots if mask >> slot & 1] for mask in masks]
+
+        self.alive_count = tuple(len(slots_alive) for slots_alive in alive)
+        self.first_alive = tuple(slots_alive[0] if slots_alive else -1 for slots_alive in alive)
+        self.nth_alive = tuple(
+            slots_alive[n] if n < len(slots_alive) else -1
+            for slots_alive in alive for n in slots
+        )
+        self.next_alive = tuple(
+            next((other for other in slots_alive if other > slot), slots_alive[0]) if slots_alive else -1
+            for slots_alive in alive for slot in slots
+        )
+        self.target = tuple(
+            next((target for target in ((slot - step) % line_size for step in slots) if mask >> target & 1), -1)
+            for mask in masks for slot in slots
+        )
+
+    def phase_attackers(self, offset, count):
+        """
+        Атакующие фазы по маске атакующей стороны: кортеж ячеек для каждой маски.
+
+        Атакующие - count живых магов подряд, начиная с offset-го (циклически
+        по числу живых); пустая маска - пустой кортеж.
+        """
+        line_size = self.line_size
+        table = []
+        for mask, alive_count in enumerate(self.alive_count):
+            if not alive_count:
+                table.append(())
+                continue
+            slots = [self.nth_alive[mask * line_size + offset % alive_count]]
+            for _ in range(count - 1):
+                slots.append(self.next_alive[mask * line_size + slots[-1]])
+            table.append(tuple(slots))
+        return tuple(table)
+
+
+@lru_cache(maxsize=None)
+def targeting_tables(line_size):
+    """Таблицы для длины линии line_size (кэшируются)."""
+    return TargetingTables(line_size)
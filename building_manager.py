@@ -3,24 +3,40 @@
 
 from buildings_config import get_building_data, get_building_time, get_max_level
 from database import UserDatabase
+from services.user_context import UserContext
+from services import timers
 import asyncio
 
 class BuildingManager:
     """Класс для управления зданиями игрока."""
+
+    # Поля пользователя, нужные для проверок постройки/улучшения
+    VALIDATION_FIELDS = ("buildings", "construction")
+
+    @staticmethod
+    async def _commit(ctx):
+        """Зафиксировать batch контекста: изменения команды и отложенные при загрузке."""
+        try:
+            await ctx.commit()
+            return True
+        except Exception as e:
+            print(f"❌ Ошибка при сохранении изменений: {e}")
+            return False
     
     @staticmethod
-    async def can_build(user_id, building_id):
+    async def can_build(user_id, building_id, ctx=None):
         """
         Проверить, может ли игрок построить здание.
         
         Args:
             user_id (str): ID пользователя.
             building_id (str): ID здания.
+            ctx (UserContext, optional): Контекст апдейта с уже загруженным пользователем.
             
         Returns:
             tuple: (bool, str) - (Можно ли строить, Сообщение об ошибке/успехе)
         """
-        user_data = await UserDatabase.get_user(user_id)
+        user_data = await UserContext.resolve(ctx, user_id, BuildingManager.VALIDATION_FIELDS)
         if not user_data:
             return False, "Пользователь не найден."
             
@@ -51,7 +67,7 @@ class BuildingManager:
         return True, "Можно строить."
 
     @staticmethod
-    async def start_construction(user_id, building_id, cell_index=None):
+    async def start_construction(user_id, building_id, cell_index=None, ctx=None):
         """
         Начать постройку здания.
 
@@ -59,11 +75,15 @@ class BuildingManager:
             user_id (str): ID пользователя.
             building_id (str): ID здания.
             cell_index (int, optional): Индекс ячейки в сетке (для визуального расположения).
+            ctx (UserContext, optional): Контекст апдейта с уже загруженным пользователем.
 
         Returns:
             tuple: (bool, str) - (Успешно ли начата постройка, Сообщение)
         """
-        can_build, message = await BuildingManager.can_build(user_id, building_id)
+        if ctx is None:
+            ctx = UserContext(user_id, fields=BuildingManager.VALIDATION_FIELDS)
+
+        can_build, message = await BuildingManager.can_build(user_id, building_id, ctx)
         if not can_build:
             return False, message
 
@@ -75,14 +95,15 @@ class BuildingManager:
             "active": True, # Даже для мгновенной постройки сначала активируем
             "building_id": building_id,
             "target_level": 1, # Для новой постройки целевой уровень 1
-            "time_left": build_time, # Это будет 0
+            **timers.start_timer(build_time), # started_at / finish_at
             "cell_index": cell_index,
             "type": "build" # Тип операции: build или upgrade
         }
 
         # Если время 0, сразу завершаем постройку
         if build_time <= 0:
-             success = await UserDatabase.finish_construction(user_id, building_id, 1, cell_index)
+             success = await UserDatabase.finish_construction(user_id, building_id, 1, cell_index, batch=ctx.batch)
+             success = success and await BuildingManager._commit(ctx)
              if success:
                  # Начисляем кристаллы за мгновенную постройку (пример, можно убрать или изменить)
                  # user_data = await UserDatabase.get_user(user_id)
@@ -93,14 +114,15 @@ class BuildingManager:
              else:
                  return False, "Ошибка при мгновенной постройке."
 
-        success = await UserDatabase.start_construction(user_id, construction_data)
+        success = await UserDatabase.start_construction(user_id, construction_data, batch=ctx.batch)
+        success = success and await BuildingManager._commit(ctx)
         if success:
-            return True, f"Начата постройка '{building_data['name']}'. Время: {build_time} секунд."
+            return True, f"Начата постройка '{building_data['name']}'. Время: {timers.format_duration(build_time)}."
         else:
             return False, "Ошибка при начале постройки."
 
     @staticmethod
-    async def can_upgrade(user_id, building_id, target_level):
+    async def can_upgrade(user_id, building_id, target_level, ctx=None):
         """
         Проверить, может ли игрок улучшить здание.
         
@@ -108,11 +130,12 @@ class BuildingManager:
             user_id (str): ID пользователя.
             building_id (str): ID здания.
             target_level (int): Целевой уровень для улучшения.
+            ctx (UserContext, optional): Контекст апдейта с уже загруженным пользователем.
             
         Returns:
             tuple: (bool, str) - (Можно ли улучшать, Сообщение об ошибке/успехе)
         """
-        user_data = await UserDatabase.get_user(user_id)
+        user_data = await UserContext.resolve(ctx, user_id, BuildingManager.VALIDATION_FIELDS)
         if not user_data:
             return False, "Пользователь не найден."
             
@@ -137,7 +160,7 @@ class BuildingManager:
         return True, "Можно улучшать."
 
     @staticmethod
-    async def start_upgrade(user_id, building_id, target_level):
+    async def start_upgrade(user_id, building_id, target_level, ctx=None):
         """
         Начать улучшение здания.
 
@@ -145,11 +168,15 @@ class BuildingManager:
             user_id (str): ID пользователя.
             building_id (str): ID здания.
             target_level (int): Целевой уровень для улучшения.
+            ctx (UserContext, optional): Контекст апдейта с уже загруженным пользователем.
 
         Returns:
             tuple: (bool, str) - (Успешно ли начато улучшение, Сообщение)
         """
-        can_upgrade, message = await BuildingManager.can_upgrade(user_id, building_id, target_level)
+        if ctx is None:
+            ctx = UserContext(user_id, fields=BuildingManager.VALIDATION_FIELDS)
+
+        can_upgrade, message = await BuildingManager.can_upgrade(user_id, building_id, target_level, ctx)
         if not can_upgrade:
             return False, message
 
@@ -161,36 +188,39 @@ class BuildingManager:
             "active": True,
             "building_id": building_id,
             "target_level": target_level,
-            "time_left": upgrade_time, # Это будет 0
+            **timers.start_timer(upgrade_time), # started_at / finish_at
             "type": "upgrade" # Тип операции: build или upgrade
         }
 
         # Если время 0, сразу завершаем улучшение
         if upgrade_time <= 0:
-             success = await UserDatabase.finish_construction(user_id, building_id, target_level)
+             success = await UserDatabase.finish_construction(user_id, building_id, target_level, batch=ctx.batch)
+             success = success and await BuildingManager._commit(ctx)
              if success:
                  return True, f"✅ '{building_data['name']}' улучшен до уровня {target_level} мгновенно!"
              else:
                  return False, "Ошибка при мгновенном улучшении."
 
-        success = await UserDatabase.start_construction(user_id, construction_data)
+        success = await UserDatabase.start_construction(user_id, construction_data, batch=ctx.batch)
+        success = success and await BuildingManager._commit(ctx)
         if success:
-            return True, f"Начато улучшение '{building_data['name']}' до уровня {target_level}. Время: {upgrade_time} секунд."
+            return True, f"Начато улучшение '{building_data['name']}' до уровня {target_level}. Время: {timers.format_duration(upgrade_time)}."
         else:
             return False, "Ошибка при начале улучшения."
 
     @staticmethod
-    async def get_user_buildings_info(user_id):
+    async def get_user_buildings_info(user_id, ctx=None):
         """
         Получить информацию о зданиях пользователя.
         
         Args:
             user_id (str): ID пользователя.
+            ctx (UserContext, optional): Контекст апдейта с уже загруженным пользователем.
             
         Returns:
             dict: Информация о зданиях.
         """
-        user_data = await UserDatabase.get_user(user_id)
+        user_data = await UserContext.resolve(ctx, user_id, BuildingManager.VALIDATION_FIELDS)
         if not user_data:
             return {}
             
@@ -1,6 +1,10 @@
 # buildings_config.py
 """Конфигурация зданий для Academy of Elements."""
 
+from types import MappingProxyType
+
+from config_records import ConfigRecord, freeze
+
 # Описание типов зданий и их параметров
 BUILDINGS_DATA = {
     "library": {
@@ -166,6 +170,105 @@ for i in range(2, 16): # Уровни 2-15
     
 BUILDINGS_DATA["arcane_lab"]["costs"]["upgrade_times"] = arcane_upgrade_times[1:] # Без базового уровня
 
+# --- Компиляция ---
+# После расчёта формул словари зданий проверяются и заменяются неизменяемыми
+# записями Building: BUILDINGS_DATA - building_id -> Building.
+
+class Building(ConfigRecord):
+    """Здание: параметры из BUILDINGS_DATA (costs и effects - неизменяемые словари)."""
+
+    __slots__ = ("id", "name", "description", "emoji", "is_unique", "is_starting",
+                 "can_build", "max_level", "costs", "effects")
+    REQUIRED = ("id", "name", "max_level", "costs")
+
+
+def _compile_buildings():
+    """Проверить конфигурацию зданий и построить записи (один раз при импорте)."""
+    buildings = {}
+    for building_id, data in BUILDINGS_DATA.items():
+        where = f"BUILDINGS_DATA[{building_id}]"
+        building = Building.from_dict(data, where)
+        if building.id != building_id:
+            raise ValueError(f"❌ {where}: id '{building.id}' не совпадает с ключом")
+        if not isinstance(building.max_level, int) or building.max_level < 1:
+            raise ValueError(f"❌ {where}: max_level должен быть целым >= 1")
+        if len(building.costs.get("upgrade_times", ())) > building.max_level:
+            raise ValueError(f"❌ {where}: upgrade_times длиннее max_level")
+        buildings[building_id] = building
+    return MappingProxyType(buildings)
+
+
+BUILDINGS_DATA = _compile_buildings()
+
+# Длительности в конфигурации заданы в днях
+DAY_SECONDS = 24 * 60 * 60
+
+# --- Таблицы прогрессии ---
+# Строятся один раз при импорте. Индекс в каждой таблице - уровень здания
+# (0 - не построено), поэтому любой запрос по уровню - одно обращение к списку.
+
+def _level_times(building):
+    """Время (дни) перехода на каждый уровень: [0, постройка, улучшение до 2, ...]."""
+    upgrade_times = building.costs.get("upgrade_times", ())
+    # upgrade_times начинается либо с уровня 1 (длина max_level),
+    # либо с уровня 2 (длина max_level - 1, "без базового уровня")
+    offset = building.max_level - len(upgrade_times)
+    times = [0, building.costs.get("build_time", 0)]
+    for level in range(2, building.max_level + 1):
+        index = level - 1 - offset
+        times.append(upgrade_times[index] if 0 <= index < len(upgrade_times) else 0)
+    return times
+
+def _level_effects(building):
+    """Значения эффектов здания на каждом уровне (накопленные, а не приросты)."""
+    effects = building.effects or {}
+    per_level_bonus = effects.get("research_speed_bonus", {}).get("per_level")
+    table = []
+    research_bonus = 0
+    for level in range(building.max_level + 1):
+        values = {}
+        if "health_bonus_per_level" in effects:
+            values["health_bonus"] = effects["health_bonus_per_level"] * level
+        if "spell_power_levels" in effects:
+            values["spell_power_bonus"] = max(
+                [bonus for threshold, bonus in effects["spell_power_levels"].items() if threshold <= level],
+                default=0
+            )
+        if "level_10_bonus" in effects:
+            values[effects["level_10_bonus"]] = level >= 10
+        if "aom_base_production" in effects:
+            values["aom_per_day"] = (
+                effects["aom_base_production"] * effects["aom_production_multiplier"] ** (level - 1)
+                if level else 0.0
+            )
+        if per_level_bonus is not None:
+            if 1 <= level <= len(per_level_bonus):
+                research_bonus += per_level_bonus[level - 1]
+            values["research_speed_bonus"] = research_bonus
+        if "blessings_unlocked" in effects:
+            values["blessings_unlocked"] = list(effects["blessings_unlocked"][:level])
+        if effects.get("spells_used") == "equal_to_level":
+            values["spells_used"] = level
+        table.append(values)
+    return table
+
+def _prefix_sums(values):
+    sums, total = [], 0
+    for value in values:
+        total += value
+        sums.append(total)
+    return sums
+
+# building_id -> [время перехода на уровень N] (дни)
+LEVEL_TIMES = {building_id: _level_times(data) for building_id, data in BUILDINGS_DATA.items()}
+# building_id -> [суммарное время от начала постройки до уровня N] (дни)
+CUMULATIVE_TIMES = {building_id: _prefix_sums(times) for building_id, times in LEVEL_TIMES.items()}
+# building_id -> [эффекты на уровне N]
+LEVEL_EFFECTS = {building_id: _level_effects(data) for building_id, data in BUILDINGS_DATA.items()}
+# Таблицы общие для всех вызывающих, поэтому, как и записи зданий, неизменяемы
+LEVEL_TIMES, CUMULATIVE_TIMES, LEVEL_EFFECTS = map(freeze, (LEVEL_TIMES, CUMULATIVE_TIMES, LEVEL_EFFECTS))
+_NO_EFFECTS = MappingProxyType({})
+
 # Функция для получения данных о здании
 def get_building_data(building_id):
     """Получить конфигурацию здания по его ID."""
@@ -175,20 +278,45 @@ def get_building_data(building_id):
 def get_building_time(building_id, level=None):
     """
     Получить время постройки или улучшения здания.
-    ВСЕГДА возвращает 0 секунд для мгновенного строительства.
     
     Args:
         building_id (str): ID здания.
-        level (int, optional): Уровень для улучшения. 
+        level (int, optional): Целевой уровень улучшения. Без него - время постройки.
         
     Returns:
-        float: Время в секундах (всегда 0).
+        float: Время в секундах (0 - мгновенно).
+    """
+    times = LEVEL_TIMES.get(building_id)
+    level = 1 if level is None else level
+    if not times or not 1 <= level < len(times):
+        return 0.0
+    return float(times[level] * DAY_SECONDS)
+
+def cumulative_time(building_id, level):
+    """
+    Суммарное время (секунды) постройки здания и всех улучшений до уровня level.
+
+    Уровень за пределами таблицы ограничивается максимальным.
+    """
+    times = CUMULATIVE_TIMES.get(building_id)
+    if not times:
+        return 0.0
+    return float(times[max(0, min(level, len(times) - 1))] * DAY_SECONDS)
+
+def effect_at(building_id, level):
+    """
+    Эффекты здания на уровне level, например {"aom_per_day": 120.0}
+    или {"health_bonus": 30, "spell_power_bonus": 10, ...}.
+
+    Возвращается неизменяемое представление общей таблицы.
     """
-    # Игнорируем building_id и level, возвращаем 0 секунд для мгновенного завершения
-    return 0.0 # 0 секунд
+    effects = LEVEL_EFFECTS.get(building_id)
+    if not effects:
+        return _NO_EFFECTS
+    return effects[max(0, min(level, len(effects) - 1))]
 
 # Функция для получения максимального уровня здания
 def get_max_level(building_id):
     """Получить максимальный уровень здания."""
     building = get_building_data(building_id)
-    return building["max_level"] if building else 0
\ No newline at end of file
+    return building.max_level if building else 0
\ No newline at end of file
@@ -0,0 +1,91 @@
+# config_records.py
+"""
+Неизменяемые записи игровой конфигурации.
+
+spells_config.py и buildings_config.py описывают данные обычными словарями,
+а при импорте компилируют их в записи ConfigRecord: поля в __slots__,
+вложенные словари - MappingProxyType, списки - кортежи. Записи нельзя
+изменить, поэтому модуль, получивший конфигурацию, не испортит её другим.
+
+Записи читаются и атрибутами (spell.name), и как словари (spell["name"],
+spell.get("effects", {})) - старый код, работавший со словарями
+конфигурации, продолжает работать без изменений.
+"""
+
+from collections.abc import Mapping
+from types import MappingProxyType
+
+
+def freeze(value):
+    """Неизменяемая копия значения: dict -> MappingProxyType, list -> tuple, set -> frozenset."""
+    if isinstance(value, Mapping):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(value)
+    return value
+
+
+class ConfigRecord(Mapping):
+    """
+    Базовый класс записи конфигурации.
+
+    Подкласс перечисляет поля в __slots__, обязательные - в REQUIRED.
+    Поле, которого нет в исходном словаре, равно None и при чтении записи как
+    словаря считается отсутствующим.
+    """
+
+    __slots__ = ()
+    REQUIRED = ()
+
+    def __init__(self, **values):
+        for field in self.__slots__:
+            object.__setattr__(self, field, freeze(values.pop(field, None)))
+        if values:
+            raise TypeError(f"{type(self).__name__}: неизвестные поля {sorted(values)}")
+
+    @classmethod
+    def from_dict(cls, data, where, **extra):
+        """
+        Запись из словаря конфигурации с проверкой полей; where - где запись
+        в конфигурации (для сообщения об ошибке). extra - вычисленные поля.
+        """
+        if not isinstance(data, Mapping):
+            raise ValueError(f"❌ {where}: ожидался словарь, получено {type(data).__name__}")
+        unknown = set(data) - set(cls.__slots__)
+        if unknown:
+            raise ValueError(f"❌ {where}: неизвестные поля {sorted(unknown)}")
+        missing = [field for field in cls.REQUIRED if data.get(field) is None]
+        if missing:
+            raise ValueError(f"❌ {where}: нет обязательных полей {missing}")
+        return cls(**data, **extra)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} неизменяема")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} неизменяема")
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    # --- Чтение как словаря ---
+
+    def __getitem__(self, key):
+        value = getattr(self, key, None) if key in self.__slots__ else None
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        return (field for field in self.__slots__ if getattr(self, field) is not None)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"{type(self).__name__}(id={getattr(self, 'id', None)!r})"
@@ -1,47 +1,436 @@
 # database.py
-import firebase_admin
-from firebase_admin import credentials, db
 import os
+import copy
+import asyncio
+import functools
+import heapq
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 # Импортируем конфигурацию зданий
 from buildings_config import BUILDINGS_DATA
+from battle.replay import FULL_REPLAYS, MAX_REPLAYS, REPLAYS_PATH, replay_key
+from services.rating import DEFAULT_RATING, RATINGS_PATH, ResultBuffer, elo_update
+from services.leaderboard import LEADERBOARD_PATH, LEADERBOARD_SIZE, TOP_SIZE, Leaderboard
+from services.user_cache import UserCache
+from services import user_codec
+from services.user_codec import IDLE_CONSTRUCTION, IDLE_RESEARCH
+from services.write_behind import WriteBehindBuffer
+from services import daily, economy, timers
+from services.timers import TimerScheduler
+from services.migrations import CURRENT_SCHEMA_VERSION, upgrade_user, wizard_seq
+from storage import create_backend
+from storage.paths import set_path, split_path
 
 load_dotenv()
 
-FIREBASE_CREDENTIALS_PATH = os.getenv("FIREBASE_CREDENTIALS_PATH")
+# Хранилище выбирается через STORAGE_BACKEND: firebase (по умолчанию), memory или sqlite
+storage = create_backend()
 
-if not FIREBASE_CREDENTIALS_PATH:
-    raise Exception("❌ FIREBASE_CREDENTIALS_PATH не найден в .env")
+# --- Пул потоков для блокирующих хранилищ ---
+# firebase_admin.db делает блокирующие HTTPS-запросы, поэтому все вызовы
+# выполняются в ограниченном пуле потоков, а не прямо в event loop.
+# По умолчанию 10 потоков - столько же соединений держит пул requests/urllib3,
+# больше потоков только приведёт к открытию лишних соединений.
+FIREBASE_MAX_WORKERS = int(os.getenv("FIREBASE_MAX_WORKERS", "10"))
+
+_executor = ThreadPoolExecutor(
+    max_workers=FIREBASE_MAX_WORKERS,
+    thread_name_prefix="storage"
+)
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Выполнить вызов хранилища, не останавливая event loop.
+
+    Блокирующие хранилища (Firebase, SQLite) работают в пуле потоков,
+    хранилище в памяти вызывается напрямую.
+    """
+    if not storage.blocking:
+        return func(*args, **kwargs)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+def shutdown_executor():
+    """Остановить пул потоков и закрыть хранилище (вызывается при завершении приложения)."""
+    stop_cache_listener()
+    _executor.shutdown(wait=True)
+    storage.close()
+
+# --- Кэш документов пользователей ---
+# Кэшируются целые документы: get_user с любыми fields при промахе читает и кладёт
+# в кэш весь документ, поэтому команды игрока (/profile, /wizards, /spells,
+# /buildings, /build...) после первой обслуживаются из памяти. Все мутаторы
+# UserDatabase пишут изменения в кэш (write-through).
+# USER_CACHE_SIZE=0 или USER_CACHE_TTL=0 отключают кэш.
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+
+user_cache = UserCache(max_size=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+_cache_listener = None
+
+def start_cache_listener():
+    """
+    Подписаться на изменения users/ и инвалидировать затронутые документы в кэше.
+
+    Нужен, если пользователей меняют другие процессы или веб-приложение напрямую.
+    Первое событие listen() содержит всё дерево users/, поэтому включается
+    явно через USER_CACHE_LISTEN=1.
+    """
+    global _cache_listener
+    if _cache_listener is not None or not user_cache.enabled:
+        return
+
+    def on_event(event):
+        parts = [part for part in (event.path or "").split("/") if part]
+        if parts:
+            user_cache.invalidate(parts[0])
+        elif event.data is None or not isinstance(event.data, dict):
+            user_cache.clear()
+        elif event.event_type == "patch":
+            for user_id in event.data:
+                user_cache.invalidate(str(user_id).split("/")[0])
+        # Начальный put корня ("/") - это снимок всего дерева, кэш он не меняет
+
+    try:
+        _cache_listener = storage.listen('users', on_event)
+        print("👂 Подписка на изменения users/ для кэша запущена")
+    except Exception as e:
+        print(f"❌ Ошибка подписки на изменения users/: {e}")
+
+def stop_cache_listener():
+    """Остановить подписку на изменения users/."""
+    global _cache_listener
+    if _cache_listener is not None:
+        _cache_listener.close()
+        _cache_listener = None
+
+# --- Компактный формат документа (services/user_codec.py) ---
+# Чтение понимает оба формата всегда; USER_CODEC=0 возвращает запись в старом формате.
+USER_CODEC = os.getenv("USER_CODEC", "1") == "1"
+
+# --- Пакетная запись ---
+class WriteBatch:
+    """
+    Набор изменений path -> value, фиксируемый одним multi-path update() от корня базы.
+
+    Мутаторы UserDatabase принимают необязательный batch: изменения
+    нескольких вызовов накапливаются и уходят в Firebase одним запросом,
+    который применяется атомарно - либо все пути, либо ни одного.
+    """
+
+    def __init__(self):
+        self._updates = {}
+
+    def set(self, path, value):
+        """Добавить запись значения по абсолютному пути (None удаляет узел)."""
+        path = "/".join(split_path(path))
+        # Firebase не принимает в одном update() пути, вложенные друг в друга,
+        # поэтому записи внутри уже добавленного узла сливаются в его значение
+        for existing in self._updates:
+            if path.startswith(existing + "/"):
+                existing_value = self._updates[existing]
+                if not isinstance(existing_value, (dict, list)):
+                    existing_value = {}
+                self._updates[existing] = set_path(existing_value, path[len(existing) + 1:], value)
+                return self
+        prefix = path + "/"
+        for nested in [p for p in self._updates if p.startswith(prefix)]:
+            del self._updates[nested]
+        self._updates[path] = value
+        return self
+
+    def update(self, path, data):
+        """Добавить update(): каждый ключ data записывается как отдельный путь."""
+        for key, value in data.items():
+            self.set(f"{path}/{key}", value)
+        return self
+
+    def set_user(self, user_id, path, value):
+        """Запись по пути внутри документа пользователя."""
+        return self.set(f"users/{user_id}/{path}" if path else f"users/{user_id}", value)
+
+    def update_user(self, user_id, path, data):
+        """update() по пути внутри документа пользователя."""
+        return self.update(f"users/{user_id}/{path}" if path else f"users/{user_id}", data)
+
+    @property
+    def updates(self):
+        return dict(self._updates)
+
+    def __len__(self):
+        return len(self._updates)
+
+    def __bool__(self):
+        # Пустой batch - всё равно batch: мутаторы выбирают его через `batch or own_batch`
+        return True
+
+    async def commit(self, defer=False):
+        """
+        Отправить все изменения одним запросом и обновить кэш пользователей.
+
+        В режиме write-behind изменения проходят через общий буфер: defer=True
+        оставляет их в буфере, иначе буфер отправляется сразу вместе с ними.
+        """
+        if not self._updates:
+            return
+        if write_behind.enabled:
+            _write_through(self._updates)
+            await write_behind.submit(self, flush=not defer)
+            self._updates = {}
+            return
+        updates, self._updates = self._updates, {}
+        await write_updates(updates)
+
+
+def _write_through(updates):
+    """Применить изменения к документам пользователей в кэше."""
+    for path, value in updates.items():
+        parts = split_path(path)
+        if parts[0] == "users" and len(parts) >= 2:
+            user_cache.apply_set(parts[1], "/".join(parts[2:]), value)
+
+
+async def write_updates(updates):
+    """Записать изменения в хранилище одним multi-path update() и обновить кэш."""
+    stored = user_codec.encode_updates(updates) if USER_CODEC else updates
+    await run_blocking(storage.update, '', stored)
+    _write_through(updates)
+
+
+async def _write_pending(updates):
+    """
+    Запись буфера write-behind. Кэш уже обновлён при commit, поэтому при
+    ошибке документы затронутых пользователей из кэша удаляются: следующее
+    чтение возьмёт сохранённый документ и наложит изменения, ждущие повтора.
+    """
+    try:
+        await write_updates(updates)
+    except Exception:
+        for path in updates:
+            parts = split_path(path)
+            if parts[0] == "users" and len(parts) >= 2:
+                user_cache.invalidate(parts[1])
+        raise
+
+
+async def _commit_own(own_batch, defer=False):
+    """
+    Зафиксировать собственный batch мутатора (внешний batch фиксирует вызывающий код).
+
+    defer=True разрешает отложить запись в буфере write-behind.
+    """
+    if own_batch is not None:
+        await own_batch.commit(defer=defer)
+
+
+# --- Отложенная запись (write-behind) ---
+# Частые мелкие изменения (update_user, update_spell, update_building, update_research)
+# сливаются в один multi-path update(). Включается WRITE_BEHIND_DELAY > 0 (секунды).
+WRITE_BEHIND_DELAY = float(os.getenv("WRITE_BEHIND_DELAY", "0"))
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "500"))
+
+write_behind = WriteBehindBuffer(
+    writer=_write_pending,
+    batch_factory=WriteBatch,
+    delay=WRITE_BEHIND_DELAY,
+    max_pending=WRITE_BEHIND_MAX_PENDING
+)
+
+async def flush_pending_writes():
+    """Принудительно отправить отложенные изменения (при завершении работы и в конце запроса)."""
+    try:
+        await rating_results.flush()
+    except Exception as e:
+        print(f"❌ Ошибка при записи рейтингов: {e}")
+    try:
+        await write_behind.flush()
+    except Exception as e:
+        print(f"❌ Ошибка при отправке отложенных изменений: {e}")
+
+
+# --- Таймеры построек и исследований ---
+# Истёкшие таймеры завершаются при чтении пользователя; планировщик (запускается
+# в app.py) завершает таймеры загруженных пользователей точно в срок.
+timer_scheduler = TimerScheduler()
+
+
+def _apply_user_updates(user_id, user_data, updates):
+    """Наложить записанные изменения на уже прочитанный документ пользователя."""
+    prefix = f"users/{user_id}/"
+    for path, value in updates.items():
+        if not path.startswith(prefix):
+            continue
+        path = path[len(prefix):]
+        user_data = set_path(user_data, path, copy.deepcopy(value))
+    return user_data
+
+
+def project_fields(user_data, fields):
+    """Оставить в документе пользователя только указанные поля верхнего уровня."""
+    return {field: user_data[field] for field in fields if user_data.get(field) is not None}
 
-# Инициализация Firebase Admin SDK
-try:
-    cred = credentials.Certificate(FIREBASE_CREDENTIALS_PATH)
-    firebase_admin.initialize_app(cred, {
-        'databaseURL': 'https://academy-of-elements-default-rtdb.europe-west1.firebasedatabase.app/'
-    })
-    print("✅ Подключение к Firebase инициализировано")
-except Exception as e:
-    raise Exception(f"❌ Ошибка инициализации Firebase: {e}")
 
 # Функции для работы с пользователями
 class UserDatabase:
     @staticmethod
-    async def get_user(user_id):
-        """Получить пользователя по ID"""
+    async def get_user(user_id, fields=None, batch=None):
+        """
+        Получить пользователя по ID.
+
+        fields - список полей верхнего уровня, которые нужны вызывающему коду:
+        остальные поля в результат не попадают. При промахе кэша документ всё
+        равно читается целиком одним запросом и кладётся в кэш, поэтому
+        следующие команды игрока (с любыми fields) обслуживаются из памяти.
+        batch - batch команды: в него добавляется запись ежедневного сброса, чтобы
+        она ушла одним update() с изменениями команды. Без batch сброс виден
+        только в возвращённых данных и вычисляется заново при следующем чтении.
+        """
         try:
-            ref = db.reference(f'users/{user_id}')
-            user_data = ref.get()
+            user_data = user_cache.get(user_id)
+            if user_data is not None:
+                user_data = write_behind.overlay(user_id, user_data)
+            else:
+                user_data = await run_blocking(storage.get, f'users/{user_id}')
+                if user_data:
+                    await UserDatabase._reencode(user_id, user_data)
+                    user_data = user_codec.decode_document(user_data)
+                    user_data = await UserDatabase._upgrade_schema(user_id, user_data)
+                # Ещё не отправленные изменения видны сразу (read-your-writes)
+                user_data = write_behind.overlay(user_id, user_data)
+                user_cache.put(user_id, user_data)
+            user_data = await UserDatabase._finish_read(user_id, user_data, batch=batch)
+            if user_data is not None and fields is not None:
+                user_data = project_fields(user_data, fields)
             return user_data
         except Exception as e:
             print(f"❌ Ошибка при получении пользователя: {e}")
             return None
 
     @staticmethod
-    async def create_user(user_id, username, faction):
+    async def iter_users(batch_size=500, fields=None, start_after=None):
+        """
+        Постранично обойти всех пользователей: async-генератор пар (user_id, user_data).
+
+        Страницы читаются запросом order_by_key().start_at().limit_to_first(),
+        следующая страница загружается, пока обрабатывается текущая. В памяти
+        одновременно не больше двух страниц, независимо от числа игроков.
+        fields оставляет в документах только нужные поля, start_after - продолжить
+        обход после указанного ID (например, с контрольной точки).
+        """
+        fields = tuple(fields) if fields is not None else None
+
+        async def fetch_page(after):
+            # start_at включительный, поэтому берём на одну запись больше и пропускаем её
+            limit = batch_size + 1 if after is not None else batch_size
+            page = await run_blocking(storage.query_by_key, 'users', start_at=after, limit=limit)
+            if after is not None and page and page[0][0] == str(after):
+                page = page[1:]
+            return page
+
+        next_page = asyncio.create_task(fetch_page(start_after))
+        try:
+            while True:
+                page = await next_page
+                if not page:
+                    return
+                last_key = page[-1][0]
+                # Предзагрузка следующей страницы, пока вызывающий код обрабатывает текущую
+                next_page = asyncio.create_task(fetch_page(last_key)) if len(page) >= batch_size else None
+                for user_id, user_data in page:
+                    if not isinstance(user_data, dict):
+                        continue
+                    user_data = user_codec.decode_document(user_data)
+                    if fields is not None:
+                        user_data = project_fields(user_data, fields)
+                    yield user_id, user_data
+                if next_page is None:
+                    return
+        finally:
+            if next_page is not None and not next_page.done():
+                next_page.cancel()
+
+    @staticmethod
+    async def user_exists(user_id):
+        """Проверить существование пользователя поверхностным чтением (только ключи)."""
+        try:
+            if user_cache.get(user_id) is not None:
+                return True
+            return bool(await run_blocking(storage.get, f'users/{user_id}', shallow=True))
+        except Exception as e:
+            print(f"❌ Ошибка при проверке пользователя: {e}")
+            return False
+
+    @staticmethod
+    async def _finish_read(user_id, user_data, batch=None):
+        """Ленивые переходы по времени для прочитанного документа: таймеры и ежедневный сброс."""
+        user_data = await UserDatabase._complete_timers(user_id, user_data)
+        user_data, updates = daily.apply_reset(user_data)
+        if updates and batch is not None:
+            batch.update_user(user_id, "", updates)
+        return user_data
+
+    @staticmethod
+    async def _complete_timers(user_id, user_data):
+        """
+        Завершить истёкшие таймеры прочитанного документа и запланировать идущие.
+
+        Завершение пишется одним batch и сразу накладывается на user_data,
+        поэтому вызывающий код видит уже построенное здание или изученное заклинание.
+        """
+        if not user_data:
+            return user_data
+        due = timers.due_timers(user_data)
+        if due:
+            batch = WriteBatch()
+            for field in due:
+                timer = user_data[field]
+                if field == "construction":
+                    await UserDatabase.finish_construction(
+                        user_id, timer.get("building_id"), timer.get("target_level"),
+                        timer.get("cell_index"), batch=batch, completed_at=timer["finish_at"]
+                    )
+                else:
+                    await UserDatabase.finish_research(user_id, timer, batch=batch)
+            updates = batch.updates
+            await batch.commit()
+            user_data = _apply_user_updates(user_id, user_data, updates)
+        for field, finish_at in timers.pending_timers(user_data):
+            timer_scheduler.schedule(user_id, field, finish_at)
+        return user_data
+
+    @staticmethod
+    async def complete_timers(user_id):
+        """Завершить истёкшие таймеры пользователя (документ читается из кэша или хранилища)."""
+        return await UserDatabase.get_user(user_id, fields=timers.TIMER_FIELDS) is not None
+
+    @staticmethod
+    async def _reencode(user_id, stored):
+        """Лениво перевести сохранённый документ в компактный формат (пишутся только изменённые поля)."""
+        if not USER_CODEC or not user_codec.needs_encoding(stored):
+            return
+        updates = user_codec.reencode_updates(stored)
+        if updates:
+            await run_blocking(storage.update, f'users/{user_id}', updates)
+
+    @staticmethod
+    async def _upgrade_schema(user_id, user_data):
+        """Лениво привести документ к текущей версии схемы и записать только изменённые пути."""
+        user_data, updates = upgrade_user(user_data)
+        if updates:
+            batch = WriteBatch()
+            for path, value in updates.items():
+                batch.set_user(user_id, path, value)
+            await batch.commit()
+        return user_data
+
+    @staticmethod
+    async def create_user(user_id, username, faction, batch=None):
         """Создать нового пользователя с начальными данными"""
         try:
-            ref = db.reference(f'users/{user_id}')
+            own_batch = WriteBatch() if batch is None else None
+            writes = batch or own_batch
             
             # Определяем начальное заклинание в зависимости от фракции
             initial_spell_data = {
@@ -81,7 +470,8 @@ class UserDatabase:
             user_data = {
                 'username': username,
                 'faction': faction,
-                'last_energy_reset': None,
+                # Энергия на сегодня (сбрасывается лениво по last_energy_reset)
+                **daily.reset_updates(),
                 'created_at': {".sv": "timestamp"}, # Серверное время Firebase
                 
                 # --- СИСТЕМА ЗДАНИЙ ---
@@ -92,14 +482,7 @@ class UserDatabase:
                 'buildings': starting_buildings,
                 
                 # Активная постройка/улучшение
-                'construction': {
-                    "active": False,
-                    "building_id": None,
-                    "target_level": None,
-                    "time_left": 0,
-                    "cell_index": None,
-                    "type": None # "build" или "upgrade"
-                },
+                'construction': dict(IDLE_CONSTRUCTION),
                 
                 # --- СИСТЕМА АРМИИ ---
                 'spells': {
@@ -108,22 +491,21 @@ class UserDatabase:
                     "wind": {},
                     "earth": {}
                 },
-                'research': {
-                    "active": False,
-                    "spell": None,
-                    "target_level": None,
-                    "time_left": 0,
-                    "faction_bonus": False
-                },
-                'wizards': [
-                    {
+                'research': dict(IDLE_RESEARCH),
+                # Маги и доступные заклинания хранятся как словари с ключами,
+                # чтобы добавление не требовало перезаписи всего списка
+                'wizards': {
+                    "wizard_1": {
                         "id": "wizard_1",
                         "name": "Начальный маг",
                         "faction": faction,
                         "spells": [initial_spell_id]
                     }
-                ],
-                'available_spells': [initial_spell_id]
+                },
+                'wizard_seq': 1, # Счётчик для ID магов (увеличивается транзакцией)
+                'rating': DEFAULT_RATING, # Рейтинг PvP-арены (копия в ratings/ пишется после первого боя)
+                'available_spells': {initial_spell_id: True},
+                'schema_version': CURRENT_SCHEMA_VERSION
             }
             
             # Инициализируем начальное заклинание для фракции пользователя
@@ -135,154 +517,512 @@ class UserDatabase:
                 }
             }
             
-            ref.set(user_data)
+            # Весь документ уходит одной записью вместе с остальными изменениями batch
+            writes.set_user(user_id, "", user_data)
+            await _commit_own(own_batch)
             return user_data
         except Exception as e:
             print(f"❌ Ошибка при создании пользователя: {e}")
             return None
 
     @staticmethod
-    async def update_user(user_id, data):
+    async def update_user(user_id, data, batch=None):
         """Обновить данные пользователя"""
         try:
-            ref = db.reference(f'users/{user_id}')
-            ref.update(data)
+            own_batch = WriteBatch() if batch is None else None
+            (batch or own_batch).update_user(user_id, "", data)
+            await _commit_own(own_batch, defer=True)
             return True
         except Exception as e:
             print(f"❌ Ошибка при обновлении пользователя: {e}")
             return False
 
     @staticmethod
-    async def add_spell_to_user(user_id, faction, spell_id, spell_data):
+    async def add_spell_to_user(user_id, faction, spell_id, spell_data, batch=None):
         """Добавить новое заклинание пользователю"""
         try:
-            ref = db.reference(f'users/{user_id}/spells/{faction}/{spell_id}')
-            ref.set(spell_data)
+            own_batch = WriteBatch() if batch is None else None
+            (batch or own_batch).set_user(user_id, f"spells/{faction}/{spell_id}", spell_data)
+            await _commit_own(own_batch)
             return True
         except Exception as e:
             print(f"❌ Ошибка при добавлении заклинания: {e}")
             return False
 
     @staticmethod
-    async def update_research(user_id, research_data):
+    async def update_research(user_id, research_data, batch=None):
         """Обновить данные о текущем исследовании"""
         try:
-            ref = db.reference(f'users/{user_id}/research')
-            ref.update(research_data)
+            own_batch = WriteBatch() if batch is None else None
+            writes = batch or own_batch
+            writes.update_user(user_id, "research", research_data)
+            if "active" in research_data:
+                # Запуск или сброс исследования - обновляем глобальный индекс таймеров
+                writes.set(timers.index_path(user_id, "research"),
+                           timers.index_entry(user_id, "research", research_data))
+            await _commit_own(own_batch, defer=True)
+            if timers.is_running(research_data):
+                timer_scheduler.schedule(user_id, "research", research_data["finish_at"])
             return True
         except Exception as e:
             print(f"❌ Ошибка при обновлении исследования: {e}")
             return False
 
     @staticmethod
-    async def add_wizard(user_id, wizard_data):
-        """Добавить нового мага пользователю"""
+    async def _update_energy(user_id, update_func):
+        """
+        Атомарно изменить энергию транзакцией по узлу energy.
+
+        update_func(энергия) -> новая энергия или None, чтобы ничего не менять.
+        Возвращает новую энергию или None, если update_func отказала.
+        Ежедневный сброс должен быть уже записан: транзакция видит только
+        сохранённое значение.
+        """
+        if write_behind.pending_for_user(user_id):
+            # Отложенная запись энергии не должна лечь поверх транзакции
+            await write_behind.flush()
+        outcome = {}
+
+        def apply(current):
+            # Firebase может повторить функцию при конфликте - берём последний результат
+            outcome["result"] = update_func(daily.DAILY_ENERGY if current is None else current)
+            return current if outcome["result"] is None else outcome["result"]
+
+        await run_blocking(storage.transaction, f'users/{user_id}/energy', apply)
+        if outcome.get("result") is not None:
+            user_cache.apply_set(user_id, "energy", outcome["result"])
+        return outcome.get("result")
+
+    @staticmethod
+    async def spend_energy(user_id, amount):
+        """
+        Потратить amount энергии транзакцией: параллельные траты не теряются.
+        Возвращает остаток или None, если энергии не хватает или при ошибке.
+        """
         try:
-            ref = db.reference(f'users/{user_id}/wizards')
-            wizards_snapshot = ref.get()
-            wizards_list = wizards_snapshot if isinstance(wizards_snapshot, list) else []
-            wizards_list.append(wizard_data)
-            ref.set(wizards_list)
-            return True
+            return await UserDatabase._update_energy(user_id, lambda energy: daily.spend(energy, amount))
+        except Exception as e:
+            print(f"❌ Ошибка при трате энергии: {e}")
+            return None
+
+    @staticmethod
+    async def refund_energy(user_id, amount):
+        """Вернуть amount энергии (не больше дневного запаса). Возвращает энергию или None при ошибке."""
+        try:
+            return await UserDatabase._update_energy(user_id, lambda energy: daily.refund(energy, amount))
+        except Exception as e:
+            print(f"❌ Ошибка при возврате энергии: {e}")
+            return None
+
+    @staticmethod
+    async def next_wizard_number(user_id):
+        """
+        Атомарно получить следующий номер мага (транзакция по счётчику wizard_seq).
+
+        У старого документа без счётчика он начинается с наибольшего номера
+        существующих магов - иначе новый маг перезаписал бы wizard_1.
+        """
+        path = f'users/{user_id}/wizard_seq'
+        number = await run_blocking(
+            storage.transaction, path, lambda current: None if current is None else current + 1
+        )
+        if number is None:
+            wizards = await run_blocking(storage.get, f'users/{user_id}/wizards', shallow=True)
+            seed = wizard_seq(wizards)
+            # max: параллельный вызов мог уже завести счётчик
+            number = await run_blocking(
+                storage.transaction, path, lambda current: max(current or 0, seed) + 1
+            )
+        user_cache.apply_set(user_id, "wizard_seq", number)
+        return number
+
+    @staticmethod
+    async def add_wizard(user_id, wizard_data, batch=None):
+        """
+        Добавить нового мага пользователю.
+
+        ID мага выдаётся транзакцией по счётчику, сам маг записывается
+        отдельным ключом wizards/{id} - без чтения и перезаписи всех магов.
+        Возвращает сохранённые данные мага или None при ошибке.
+        """
+        try:
+            own_batch = WriteBatch() if batch is None else None
+            number = await UserDatabase.next_wizard_number(user_id)
+            wizard = {"name": f"Маг {number}", **wizard_data, "id": f"wizard_{number}"}
+            (batch or own_batch).set_user(user_id, f"wizards/{wizard['id']}", wizard)
+            await _commit_own(own_batch)
+            return wizard
         except Exception as e:
             print(f"❌ Ошибка при добавлении мага: {e}")
-            return False
+            return None
 
     @staticmethod
-    async def add_available_spell(user_id, spell_id):
+    async def add_available_spell(user_id, spell_id, batch=None):
         """Добавить заклинание в список доступных"""
         try:
-            ref = db.reference(f'users/{user_id}/available_spells')
-            spells_snapshot = ref.get()
-            spells_list = spells_snapshot if isinstance(spells_snapshot, list) else []
-            if spell_id not in spells_list:
-                spells_list.append(spell_id)
-                ref.set(spells_list)
+            own_batch = WriteBatch() if batch is None else None
+            # Запись идемпотентна, поэтому проверять наличие заранее не нужно
+            (batch or own_batch).set_user(user_id, f"available_spells/{spell_id}", True)
+            await _commit_own(own_batch)
             return True
         except Exception as e:
             print(f"❌ Ошибка при добавлении доступного заклинания: {e}")
             return False
 
     @staticmethod
-    async def update_spell(user_id, faction, spell_id, spell_updates):
+    async def update_spell(user_id, faction, spell_id, spell_updates, batch=None):
         """Обновить информацию о конкретном заклинании"""
         try:
-            ref = db.reference(f'users/{user_id}/spells/{faction}/{spell_id}')
-            ref.update(spell_updates)
+            own_batch = WriteBatch() if batch is None else None
+            (batch or own_batch).update_user(user_id, f"spells/{faction}/{spell_id}", spell_updates)
+            await _commit_own(own_batch, defer=True)
             return True
         except Exception as e:
             print(f"❌ Ошибка при обновлении заклинания: {e}")
             return False
             
     @staticmethod
-    async def update_building(user_id, building_id, building_updates):
+    async def update_building(user_id, building_id, building_updates, batch=None):
         """Обновить информацию о конкретном здании"""
         try:
-            ref = db.reference(f'users/{user_id}/buildings/{building_id}')
-            ref.update(building_updates)
+            own_batch = WriteBatch() if batch is None else None
+            (batch or own_batch).update_user(user_id, f"buildings/{building_id}", building_updates)
+            await _commit_own(own_batch, defer=True)
             return True
         except Exception as e:
             print(f"❌ Ошибка при обновлении здания: {e}")
             return False
             
     @staticmethod
-    async def set_building_in_grid(user_id, cell_index, building_id):
+    async def set_building_in_grid(user_id, cell_index, building_id, batch=None):
         """Поставить или удалить здание в сетке"""
         try:
-            ref = db.reference(f'users/{user_id}/buildings_grid/{cell_index}')
-            ref.set(building_id) # building_id или None для удаления
+            own_batch = WriteBatch() if batch is None else None
+            # building_id или None для удаления
+            (batch or own_batch).set_user(user_id, f"buildings_grid/{cell_index}", building_id)
+            await _commit_own(own_batch)
             return True
         except Exception as e:
             print(f"❌ Ошибка при обновлении сетки зданий: {e}")
             return False
             
     @staticmethod
-    async def start_construction(user_id, construction_data):
+    async def start_construction(user_id, construction_data, batch=None):
         """Начать постройку или улучшение здания"""
         try:
-            ref = db.reference(f'users/{user_id}/construction')
-            ref.set(construction_data)
+            own_batch = WriteBatch() if batch is None else None
+            writes = batch or own_batch
+            writes.set_user(user_id, "construction", construction_data)
+            writes.set(timers.index_path(user_id, "construction"),
+                       timers.index_entry(user_id, "construction", construction_data))
+            await _commit_own(own_batch)
+            if timers.is_running(construction_data):
+                timer_scheduler.schedule(user_id, "construction", construction_data["finish_at"])
             return True
         except Exception as e:
             print(f"❌ Ошибка при начале строительства: {e}")
             return False
             
     @staticmethod
-    async def finish_construction(user_id, building_id, target_level, cell_index=None):
-        """Завершить постройку или улучшение здания"""
+    async def finish_construction(user_id, building_id, target_level, cell_index=None, batch=None,
+                                  completed_at=None):
+        """
+        Завершить постройку или улучшение здания.
+
+        Уровень здания, ячейка сетки и сброс строительства записываются одним
+        multi-path update(), поэтому город не может остаться в промежуточном состоянии.
+        completed_at - момент завершения (мс), если таймер завершается с опозданием.
+        """
         try:
-            # Обновляем информацию о здании
-            building_ref = db.reference(f'users/{user_id}/buildings/{building_id}')
-            building_data = building_ref.get() or {}
-            
-            # Обновляем уровень здания
-            building_data.update({
+            own_batch = WriteBatch() if batch is None else None
+            writes = batch or own_batch
+
+            # Обновляем информацию о здании (только изменённые поля, без чтения)
+            building_updates = {
                 "level": target_level,
                 "building_id": building_id
-            })
-            
+            }
             if cell_index is not None:
-                building_data["cell_index"] = cell_index
-                
-            building_ref.set(building_data)
+                building_updates["cell_index"] = cell_index
+            writes.update_user(user_id, f"buildings/{building_id}", building_updates)
             
             # Если это новое здание, обновляем сетку
             if cell_index is not None:
-                grid_ref = db.reference(f'users/{user_id}/buildings_grid/{cell_index}')
-                grid_ref.set(building_id)
-            
-            # Очищаем данные о строительстве
-            construction_ref = db.reference(f'users/{user_id}/construction')
-            construction_ref.set({
-                "active": False,
-                "building_id": None,
-                "target_level": None,
-                "time_left": 0,
-                "cell_index": None,
-                "type": None
-            })
+                writes.set_user(user_id, f"buildings_grid/{cell_index}", building_id)
+
+            # Генератор добывает на новом уровне с момента завершения, а не с момента чтения
+            if building_id == economy.GENERATOR_ID:
+                completed_at = completed_at or timers.now_ms()
+                writes.set_user(user_id, f"aom/level_history/{completed_at}", target_level)
             
+            # Очищаем данные о строительстве и запись в индексе таймеров
+            writes.set_user(user_id, "construction", dict(IDLE_CONSTRUCTION))
+            writes.set(timers.index_path(user_id, "construction"), None)
+
+            await _commit_own(own_batch)
             return True
         except Exception as e:
             print(f"❌ Ошибка при завершении строительства: {e}")
-            return False
\ No newline at end of file
+            return False
+
+    @staticmethod
+    async def finish_research(user_id, research, batch=None):
+        """
+        Завершить исследование: новый уровень заклинания и сброс исследования
+        записываются одним multi-path update().
+        """
+        try:
+            own_batch = WriteBatch() if batch is None else None
+            writes = batch or own_batch
+
+            found = timers.find_spell(research.get("spell"))
+            if found and research.get("target_level"):
+                school, tier, spell = found
+                writes.update_user(user_id, f"spells/{school}/{spell['id']}", {
+                    "name": spell["name"],
+                    "level": research["target_level"],
+                    "tier": tier
+                })
+                writes.set_user(user_id, f"available_spells/{spell['id']}", True)
+
+            writes.set_user(user_id, "research", dict(IDLE_RESEARCH))
+            writes.set(timers.index_path(user_id, "research"), None)
+
+            await _commit_own(own_batch)
+            return True
+        except Exception as e:
+            print(f"❌ Ошибка при завершении исследования: {e}")
+            return False
+
+
+    # --- Кристаллы AOM ---
+    @staticmethod
+    async def _update_aom(user_id, update_func):
+        """
+        Атомарно изменить узел aom транзакцией.
+
+        update_func(state, now) -> (новое состояние, результат); возвращает
+        (результат, новое состояние).
+        """
+        now = timers.now_ms()
+        outcome = {}
+
+        def apply(state):
+            # Firebase может повторить функцию при конфликте - берём последний результат
+            new_state, outcome["result"] = update_func(state, now)
+            return new_state
+
+        state = await run_blocking(storage.transaction, f'users/{user_id}/aom', apply)
+        user_cache.apply_set(user_id, "aom", state)
+        return outcome.get("result"), state
+
+    @staticmethod
+    async def collect_aom(user_id):
+        """Собрать добытые кристаллы. Возвращает (собрано, баланс) или (None, None) при ошибке."""
+        try:
+            collected, state = await UserDatabase._update_aom(user_id, economy.collect)
+            return collected, (state or {}).get("balance", 0)
+        except Exception as e:
+            print(f"❌ Ошибка при сборе AOM: {e}")
+            return None, None
+
+    # --- Записи боёв ---
+    @staticmethod
+    async def save_replay(replay, batch=None):
+        """
+        Сохранить запись боя (battle.replay) каждому из игроков.
+
+        У игрока хранится не больше MAX_REPLAYS записей: старые удаляются в том же
+        update(). У записи, выпавшей из FULL_REPLAYS последних, удаляется поток
+        событий - её текст восстанавливается по сиду и линиям.
+        Возвращает ключ записи или None при ошибке.
+        """
+        try:
+            own_batch = WriteBatch() if batch is None else None
+            key = replay_key(replay["created_at"], replay["seed"])
+            user_ids = [str(player["id"]) for player in replay.get("players") or [] if player and player.get("id")]
+            stored_keys = await asyncio.gather(*(
+                run_blocking(storage.get, f'{REPLAYS_PATH}/{user_id}', shallow=True) for user_id in user_ids
+            ))
+            for user_id, keys in zip(user_ids, stored_keys):
+                path = f'{REPLAYS_PATH}/{user_id}'
+                (batch or own_batch).set(f'{path}/{key}', replay)
+                # Ключи идут от новых к старым; новая запись встаёт первой
+                older = sorted(k for k in (keys or {}) if k != key)
+                if len(older) >= FULL_REPLAYS:
+                    (batch or own_batch).set(f'{path}/{older[FULL_REPLAYS - 1]}/events', None)
+                for old_key in older[MAX_REPLAYS - 1:]:
+                    (batch or own_batch).set(f'{path}/{old_key}', None)
+            await _commit_own(own_batch)
+            return key
+        except Exception as e:
+            print(f"❌ Ошибка при сохранении записи боя: {e}")
+            return None
+
+    @staticmethod
+    async def get_replays(user_id, start_at=None, limit=10):
+        """
+        Страница записей боёв игрока, от новых к старым.
+
+        Возвращает ([(ключ, запись), ...], ключ начала следующей страницы или None).
+        """
+        try:
+            page = await run_blocking(
+                storage.query_by_key, f'{REPLAYS_PATH}/{user_id}', start_at=start_at, limit=limit + 1
+            )
+            next_key = page[limit][0] if len(page) > limit else None
+            return page[:limit], next_key
+        except Exception as e:
+            print(f"❌ Ошибка при получении записей боёв: {e}")
+            return [], None
+
+    @staticmethod
+    async def get_replay(user_id, key):
+        """Одна запись боя игрока или None."""
+        try:
+            return await run_blocking(storage.get, f'{REPLAYS_PATH}/{user_id}/{key}')
+        except Exception as e:
+            print(f"❌ Ошибка при получении записи боя: {e}")
+            return None
+
+    # --- Рейтинг арены ---
+    @staticmethod
+    async def get_rating(user_id):
+        """Рейтинг игрока на арене (ratings/{user_id}); у нового игрока - DEFAULT_RATING."""
+        try:
+            rating = await run_blocking(storage.get, f'{RATINGS_PATH}/{user_id}')
+            return DEFAULT_RATING if rating is None else rating
+        except Exception as e:
+            print(f"❌ Ошибка при получении рейтинга: {e}")
+            return DEFAULT_RATING
+
+    @staticmethod
+    async def apply_battle_results(results, batch=None):
+        """
+        Пересчитать рейтинги по результатам боёв [(user_a, user_b, score_a)] по порядку.
+
+        Рейтинги (users/{id}/rating и копия ratings/{id}) и таблица лидеров
+        записываются одним update(). Возвращает [((старый, новый) рейтинг A,
+        (старый, новый) рейтинг B)] по результатам. Ошибка пробрасывается -
+        ResultBuffer повторит пачку.
+        """
+        own_batch = WriteBatch() if batch is None else None
+        user_ids = list(dict.fromkeys(user_id for user_a, user_b, _ in results for user_id in (user_a, user_b)))
+        users = await asyncio.gather(*(
+            UserDatabase.get_user(user_id, fields=("username", "rating")) for user_id in user_ids
+        ))
+        names = {user_id: (user or {}).get("username") or "" for user_id, user in zip(user_ids, users)}
+        ratings = {user_id: (user or {}).get("rating", DEFAULT_RATING) for user_id, user in zip(user_ids, users)}
+
+        changes = []
+        for user_a, user_b, score_a in results:
+            old_a, old_b = ratings[user_a], ratings[user_b]
+            ratings[user_a], ratings[user_b] = elo_update(old_a, old_b, score_a)
+            changes.append(((old_a, ratings[user_a]), (old_b, ratings[user_b])))
+
+        board = (await UserDatabase.load_leaderboard()).copy()
+        board_changed = False
+        for user_id in user_ids:
+            (batch or own_batch).set_user(user_id, "rating", ratings[user_id])
+            (batch or own_batch).set(f'{RATINGS_PATH}/{user_id}', ratings[user_id])
+            board_changed |= board.update(user_id, names[user_id], ratings[user_id])
+        if board_changed:
+            (batch or own_batch).set(LEADERBOARD_PATH, board.to_record({".sv": "timestamp"}))
+        await _commit_own(own_batch)
+        _set_leaderboard(board)
+        if board.needs_rebuild():
+            try:
+                await UserDatabase.rebuild_leaderboard()
+            except Exception as e:
+                # Рейтинги уже записаны - пачку не повторяем, таблица пересоберётся при следующем бое
+                print(f"❌ Ошибка при пересборке таблицы лидеров: {e}")
+        return changes
+
+    # --- Таблица лидеров ---
+    @staticmethod
+    async def load_leaderboard():
+        """Таблица лидеров для обновления (читается один раз; нет или устарела - пересобирается)."""
+        if _leaderboard is not None and not _leaderboard.needs_rebuild():
+            return _leaderboard
+        record = await run_blocking(storage.get, LEADERBOARD_PATH)
+        board = Leaderboard.from_record(record)
+        if record is None or board.needs_rebuild():
+            return await UserDatabase.rebuild_leaderboard()
+        return _set_leaderboard(board)
+
+    @staticmethod
+    async def rebuild_leaderboard(batch_size=1000):
+        """
+        Пересобрать таблицу лидеров полным проходом по ratings/.
+
+        Узел читается страницами, в памяти - куча из LEADERBOARD_SIZE лучших;
+        имена читаются только у них. Нужна, если таблицы ещё нет или после
+        выбываний в ней осталось меньше TOP_SIZE игроков.
+        """
+        top, count, after = [], 0, None
+        while True:
+            # start_at включительный, поэтому со второй страницы берём на одну запись больше
+            limit = batch_size + 1 if after is not None else batch_size
+            page = await run_blocking(storage.query_by_key, RATINGS_PATH, start_at=after, limit=limit)
+            if after is not None and page and page[0][0] == after:
+                page = page[1:]
+            for user_id, rating in page:
+                count += 1
+                item = (rating, user_id)
+                if len(top) < LEADERBOARD_SIZE:
+                    heapq.heappush(top, item)
+                elif item > top[0]:
+                    heapq.heapreplace(top, item)
+            if len(page) < batch_size:
+                break
+            after = page[-1][0]
+
+        # Имена читаются отдельными узлами: документы этих игроков целиком не нужны
+        # (и не должны вытеснять из кэша документы активных игроков)
+        names = await asyncio.gather(*(
+            run_blocking(storage.get, f'users/{user_id}/username') for _, user_id in top
+        ))
+        board = Leaderboard(
+            [
+                {"id": user_id, "name": name or "", "rating": rating}
+                for (rating, user_id), name in zip(top, names)
+            ],
+            complete=count <= LEADERBOARD_SIZE,
+        )
+        await write_updates({LEADERBOARD_PATH: board.to_record({".sv": "timestamp"})})
+        print(f"🏆 Таблица лидеров пересобрана: {len(board)} из {count} игроков")
+        return _set_leaderboard(board)
+
+    @staticmethod
+    async def get_leaderboard(limit=TOP_SIZE):
+        """Верхние limit игроков таблицы лидеров ([{id, name, rating}]) - одно чтение узла."""
+        try:
+            record = await run_blocking(storage.get, LEADERBOARD_PATH)
+            return Leaderboard.from_record(record).top(limit)
+        except Exception as e:
+            print(f"❌ Ошибка при получении таблицы лидеров: {e}")
+            return []
+
+
+# --- Результаты боёв арены ---
+# Рейтинги пересчитываются пачками: результаты за RATING_FLUSH_DELAY секунд
+# (или RATING_MAX_PENDING боёв) записываются одним multi-path update().
+RATING_FLUSH_DELAY = float(os.getenv("RATING_FLUSH_DELAY", "1"))
+RATING_MAX_PENDING = int(os.getenv("RATING_MAX_PENDING", "200"))
+
+rating_results = ResultBuffer(
+    apply=UserDatabase.apply_battle_results,
+    delay=RATING_FLUSH_DELAY,
+    max_pending=RATING_MAX_PENDING
+)
+
+# Таблица лидеров, которую обновляет apply_battle_results (загружается при первом бое)
+_leaderboard = None
+
+def _set_leaderboard(board):
+    global _leaderboard
+    _leaderboard = board
+    return board
+
+
+timer_scheduler.on_due = UserDatabase.complete_timers
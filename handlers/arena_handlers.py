@@ -0,0 +1,124 @@
+# handlers/arena_handlers.py
+import asyncio
+from aiogram import types
+from database import UserDatabase
+from services import daily
+from services.user_context import UserContext
+from battle import replay as battle_replay
+from services.battle_service import BattleServiceBusy
+from services.matchmaking import MATCH_TIMEOUT, matchmaker
+from services.leaderboard import TOP_SIZE
+
+# Энергия читается вместе с полями боя: ежедневный сброс записывается до траты
+ARENA_FIELDS = ("buildings", "wizards") + daily.DAILY_FIELDS
+
+async def cmd_arena(message: types.Message):
+    """
+    Бой на PvP-арене: встать в очередь и сразиться с соперником близкого рейтинга.
+
+    Бой стоит daily.ARENA_ENERGY_COST энергии. Она списывается транзакцией
+    до постановки в очередь и возвращается, если бой не состоялся.
+    """
+    try:
+        user_id = str(message.from_user.id)
+        ctx = await UserContext.load(user_id, fields=ARENA_FIELDS)
+        user_data = ctx.user_data
+        if not user_data:
+            await message.answer("❌ Ты ещё не зарегистрирован. Напиши /start")
+            return
+        if "pvp_arena" not in (user_data.get("buildings") or {}):
+            await message.answer("⚔️ Для боёв нужна PvP Арена. Построй её: /build pvp_arena")
+            return
+        if not user_data.get("wizards"):
+            await message.answer("❌ У тебя нет магов для боя. Найми мага: /hire_wizard")
+            return
+        if user_id in matchmaker:
+            await message.answer("🔎 Ты уже ищешь соперника. Отменить поиск: /arena_leave")
+            return
+
+        # Ежедневный сброс (если он был при загрузке) записывается до транзакции траты
+        await ctx.commit()
+        energy_left = await UserDatabase.spend_energy(user_id, daily.ARENA_ENERGY_COST)
+        if energy_left is None:
+            await message.answer("⚡ Энергия на сегодня закончилась. Она восстановится завтра.")
+            return
+
+        fought = False
+        try:
+            rating = await UserDatabase.get_rating(user_id)
+            await message.answer(f"🔎 Ищу соперника (рейтинг {rating})...")
+            # Между проверкой и join нет await: второй /arena не встанет в ту же очередь
+            if user_id in matchmaker:
+                await message.answer("🔎 Ты уже ищешь соперника. Отменить поиск: /arena_leave")
+                return
+            try:
+                match = await matchmaker.join(user_id, rating, timeout=MATCH_TIMEOUT)
+            except asyncio.TimeoutError:
+                await message.answer("⏳ Соперник не найден. Попробуй позже: /arena")
+                return
+            if match is None:
+                return  # поиск отменён через /arena_leave
+
+            _, opponent_rating = match.opponent(user_id)
+            # shield: бой общий для обоих игроков, отмена одного обработчика не должна его отменять
+            outcome = await asyncio.shield(match.result)
+            fought = True
+        finally:
+            if not fought:
+                await UserDatabase.refund_energy(user_id, daily.ARENA_ENERGY_COST)
+
+        replay = outcome["replay"]
+        text = battle_replay.render_summary(replay, user_id, message.from_user.language_code)
+        text += f"\nСоперник: рейтинг {opponent_rating}"
+        if user_id in outcome.get("ratings", {}):
+            old_rating, new_rating = outcome["ratings"][user_id]
+            text += f"\n📈 Рейтинг: {old_rating} → {new_rating} ({new_rating - old_rating:+d})"
+        if outcome.get("replay_key"):
+            text += f"\n📜 Запись боя: /replay {outcome['replay_key']}"
+        text += f"\n⚡ Энергия: {energy_left}/{daily.DAILY_ENERGY}"
+        await message.answer(text)
+
+    except asyncio.CancelledError:
+        raise
+    except BattleServiceBusy:
+        await message.answer("⏳ Арена перегружена, попробуй через минуту.")
+    except Exception as e:
+        print(f"❌ Ошибка в /arena: {e}")
+        await message.answer("❌ Ошибка при бое на арене.")
+
+async def cmd_arena_leave(message: types.Message):
+    """Отменить поиск соперника."""
+    try:
+        if matchmaker.leave(str(message.from_user.id)):
+            await message.answer("✅ Поиск соперника отменён.")
+        else:
+            await message.answer("ℹ️ Ты не в очереди арены.")
+    except Exception as e:
+        print(f"❌ Ошибка в /arena_leave: {e}")
+        await message.answer("❌ Ошибка при отмене поиска.")
+
+async def cmd_arena_unavailable(message: types.Message):
+    """/arena и /arena_leave в облачной функции: очередь арены там не работает (см. services.matchmaking)."""
+    await message.answer("⚔️ Арена недоступна в этой версии бота.")
+
+async def cmd_top(message: types.Message):
+    """Таблица лидеров арены (готовый документ leaderboard/)."""
+    try:
+        user_id = str(message.from_user.id)
+        top, rating = await asyncio.gather(UserDatabase.get_leaderboard(TOP_SIZE), UserDatabase.get_rating(user_id))
+        if not top:
+            await message.answer("🏆 Таблица лидеров пока пуста. Сразись на арене: /arena")
+            return
+
+        lines = ["🏆 Лучшие игроки арены:\n"]
+        medals = {1: "🥇", 2: "🥈", 3: "🥉"}
+        for place, entry in enumerate(top, 1):
+            marker = " ← ты" if entry["id"] == user_id else ""
+            lines.append(f"{medals.get(place, f'{place}.')} {entry['name'] or 'Игрок'} - {entry['rating']}{marker}")
+        lines.append(f"\nТвой рейтинг: {rating}")
+        # Без Markdown: в именах игроков бывают _ и *
+        await message.answer("\n".join(lines))
+
+    except Exception as e:
+        print(f"❌ Ошибка в /top: {e}")
+        await message.answer("❌ Ошибка при получении таблицы лидеров.")
@@ -0,0 +1,59 @@
+# handlers/battle_handlers.py
+from aiogram import types
+from database import UserDatabase
+from battle import replay as battle_replay
+
+# Записей на странице /battles и строк лога на странице /replay
+BATTLES_PAGE_SIZE = 10
+REPLAY_PAGE_LINES = 30
+
+async def cmd_battles(message: types.Message):
+    """Список последних боёв: /battles [ключ начала страницы]."""
+    try:
+        user_id = str(message.from_user.id)
+        language = message.from_user.language_code
+        args = message.text.split()[1:]
+        start_at = args[0] if args and battle_replay.is_replay_key(args[0]) else None
+
+        page, next_key = await UserDatabase.get_replays(user_id, start_at=start_at, limit=BATTLES_PAGE_SIZE)
+        if not page:
+            await message.answer("⚔️ Записей боёв пока нет.")
+            return
+
+        lines = ["⚔️ Последние бои:\n"]
+        for key, replay in page:
+            lines.append(f"{battle_replay.render_summary(replay, user_id, language)}\n/replay {key}")
+        if next_key:
+            lines.append(f"\nДальше: /battles {next_key}")
+        await message.answer("\n".join(lines))
+
+    except Exception as e:
+        print(f"❌ Ошибка в /battles: {e}")
+        await message.answer("❌ Ошибка при получении списка боёв.")
+
+async def cmd_replay(message: types.Message):
+    """Текст боя на языке игрока: /replay <ключ> [страница]."""
+    try:
+        user_id = str(message.from_user.id)
+        args = message.text.split()[1:]
+        if not args or not battle_replay.is_replay_key(args[0]):
+            await message.answer("❌ Укажи запись боя: `/replay <ключ>` (ключи в /battles)", parse_mode="Markdown")
+            return
+        page = int(args[1]) - 1 if len(args) > 1 and args[1].isdigit() else 0
+
+        replay = await UserDatabase.get_replay(user_id, args[0])
+        if not replay:
+            await message.answer("❌ Запись боя не найдена.")
+            return
+
+        text, pages = battle_replay.render_page(
+            replay, message.from_user.language_code, page=page, page_size=REPLAY_PAGE_LINES
+        )
+        page = min(max(page, 0), pages - 1)
+        if page + 1 < pages:
+            text += f"\n\n📄 {page + 1}/{pages}. Дальше: /replay {args[0]} {page + 2}"
+        await message.answer(text)
+
+    except Exception as e:
+        print(f"❌ Ошибка в /replay: {e}")
+        await message.answer("❌ Ошибка при показе записи боя.")
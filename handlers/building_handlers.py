@@ -2,13 +2,21 @@
 from aiogram import types
 from database import UserDatabase
 from building_manager import BuildingManager
+from services.user_context import UserContext
+from services import economy, timers
 from buildings_config import BUILDINGS_DATA
 
+# Поля документа пользователя, которые читает каждая команда
+BUILDINGS_FIELDS = ("buildings", "construction")
+BUILD_FIELDS = ("buildings", "buildings_grid", "construction")
+UPGRADE_FIELDS = ("buildings", "construction")
+COLLECT_FIELDS = ("faction", "aom")
+
 async def cmd_buildings(message: types.Message):
     """Показать информацию о зданиях игрока"""
     try:
         user_id = str(message.from_user.id)
-        user_data = await UserDatabase.get_user(user_id)
+        user_data = await UserDatabase.get_user(user_id, fields=BUILDINGS_FIELDS)
         if not user_data:
             await message.answer("❌ Ты ещё не зарегистрирован. Напиши /start")
             return
@@ -44,7 +52,7 @@ async def cmd_buildings(message: types.Message):
         if construction.get("active", False):
             building_id = construction.get("building_id")
             target_level = construction.get("target_level")
-            time_left = construction.get("time_left", 0)
+            time_left = timers.format_duration(timers.seconds_left(construction))
             construction_type = construction.get("type", "build")
             
             # Получаем название здания
@@ -58,7 +66,7 @@ async def cmd_buildings(message: types.Message):
             target_text = f"до уровня {target_level}" if construction_type == "upgrade" else ""
             
             response_text += f"⏳ **Активная постройка:**\n"
-            response_text += f"{building_emoji} {building_name} ({type_text} {target_text}, {time_left} дней осталось)\n"
+            response_text += f"{building_emoji} {building_name} ({type_text} {target_text}, осталось {time_left})\n"
         else:
             response_text += "⏳ Нет активных построек\n"
 
@@ -74,7 +82,9 @@ async def cmd_build(message: types.Message):
     """Начать постройку здания. Используется из Telegram."""
     try:
         user_id = str(message.from_user.id)
-        user_data = await UserDatabase.get_user(user_id)
+        # Пользователь загружается один раз и переиспользуется BuildingManager
+        ctx = await UserContext.load(user_id, fields=BUILD_FIELDS)
+        user_data = ctx.user_data
         if not user_data:
             await message.answer("❌ Ты ещё не зарегистрирован. Напиши /start")
             return
@@ -118,7 +128,7 @@ async def cmd_build(message: types.Message):
                 return
 
         # Начинаем постройку через BuildingManager
-        success, msg = await BuildingManager.start_construction(user_id, building_id, cell_index)
+        success, msg = await BuildingManager.start_construction(user_id, building_id, cell_index, ctx=ctx)
         await message.answer(msg)
 
     except Exception as e:
@@ -131,8 +141,9 @@ async def cmd_upgrade(message: types.Message):
     """Начать улучшение здания"""
     try:
         user_id = str(message.from_user.id)
-        user_data = await UserDatabase.get_user(user_id)
-        if not user_data:
+        # Пользователь загружается один раз и переиспользуется BuildingManager
+        ctx = await UserContext.load(user_id, fields=UPGRADE_FIELDS)
+        if not ctx.user_data:
             await message.answer("❌ Ты ещё не зарегистрирован. Напиши /start")
             return
 
@@ -160,11 +171,47 @@ async def cmd_upgrade(message: types.Message):
             return
 
         # Начинаем улучшение через BuildingManager
-        success, msg = await BuildingManager.start_upgrade(user_id, building_id, target_level)
+        success, msg = await BuildingManager.start_upgrade(user_id, building_id, target_level, ctx=ctx)
         await message.answer(msg)
 
     except Exception as e:
         print(f"❌ Ошибка в /upgrade: {e}")
         import traceback
         traceback.print_exc()
-        await message.answer("❌ Ошибка при начале улучшения.")
\ No newline at end of file
+        await message.answer("❌ Ошибка при начале улучшения.")
+
+async def cmd_collect(message: types.Message):
+    """Собрать кристаллы AOM, добытые генератором."""
+    try:
+        user_id = str(message.from_user.id)
+        user_data = await UserDatabase.get_user(user_id, fields=COLLECT_FIELDS)
+        if not user_data:
+            await message.answer("❌ Ты ещё не зарегистрирован. Напиши /start")
+            return
+
+        level = economy.level_at(user_data.get("aom"), timers.now_ms())
+        if not level:
+            await message.answer(
+                "💎 У тебя ещё нет Генератора АОМ.\n"
+                "Построй его: `/build aom_generator`",
+                parse_mode="Markdown"
+            )
+            return
+
+        collected, balance = await UserDatabase.collect_aom(user_id)
+        if collected is None:
+            await message.answer("❌ Ошибка при сборе кристаллов.")
+            return
+
+        await message.answer(
+            f"💎 **Собрано:** {int(collected)} AOM\n"
+            f"Баланс: {int(balance)} AOM\n"
+            f"Добыча: {economy.production_per_day(level):.0f} AOM/день (уровень {level})",
+            parse_mode="Markdown"
+        )
+
+    except Exception as e:
+        print(f"❌ Ошибка в /collect: {e}")
+        import traceback
+        traceback.print_exc()
+        await message.answer("❌ Ошибка при сборе кристаллов.")
@@ -3,13 +3,19 @@ from aiogram import types
 from aiogram.filters import Command
 from database import UserDatabase
 
+# Поля документа пользователя, которые читают команды этого модуля
+# (существование проверяется поверхностным чтением - только ключи документа)
+START_FIELDS = ("faction",)
+
 async def cmd_start(message: types.Message):
     print(f"✅ /start получен от {message.from_user.id}")
     try:
         # Проверяем, есть ли игрок в базе (Firebase)
-        user_data = await UserDatabase.get_user(str(message.from_user.id))
-        print(f"🔍 Результат запроса к Firebase: {user_data}")
-        if user_data:
+        user_id = str(message.from_user.id)
+        exists = await UserDatabase.user_exists(user_id)
+        print(f"🔍 Результат запроса к Firebase: {exists}")
+        if exists:
+            user_data = await UserDatabase.get_user(user_id, fields=START_FIELDS) or {}
             # Игрок найден
             current_faction = user_data.get("faction", "Неизвестно")
             await message.answer(
@@ -41,9 +47,8 @@ async def select_faction(message: types.Message):
         print(f"🔧 Выбор фракции: {faction} для пользователя {user_id}")
 
         # Проверяем, есть ли игрок в базе
-        user_data = await UserDatabase.get_user(user_id)
-
-        if user_data:
+        if await UserDatabase.user_exists(user_id):
+            user_data = await UserDatabase.get_user(user_id, fields=START_FIELDS) or {}
             current_faction = user_data.get("faction", "Неизвестно")
             await message.answer(
                 f"⚠️ Ты уже играешь за **{current_faction.title()}**.\n"
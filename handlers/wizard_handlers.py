@@ -1,12 +1,38 @@
 # handlers/wizard_handlers.py
 from aiogram import types
-from database import UserDatabase
+from database import UserDatabase, IDLE_RESEARCH
+from services import daily, economy, timers
 from buildings_config import BUILDINGS_DATA
+from spells_config import SPELL_INDEX
+
+# Поля документа пользователя, которые читает каждая команда
+PROFILE_FIELDS = ("faction", "created_at", "wizards", "spells", "research", "construction", "aom", "energy")
+WIZARDS_FIELDS = ("wizards", "spells")
+SPELLS_FIELDS = ("spells", "available_spells")
+RESEARCH_FIELDS = ("research", "spells")
+CANCEL_RESEARCH_FIELDS = ("research",)
+HIRE_WIZARD_FIELDS = ("faction", "spells", "available_spells")
+
+def _learned_spell(user_spells, spell_id):
+    """
+    Изученное игроком заклинание: (Spell, уровень) или None.
+
+    Школа берётся из индекса конфигурации, поэтому ищется одна запись,
+    а не заклинание во всех школах игрока.
+    """
+    found = SPELL_INDEX.get(spell_id)
+    if found is None:
+        return None
+    school, _, spell = found
+    info = (user_spells or {}).get(school, {}).get(spell_id)
+    if not info:
+        return None
+    return spell, info.get("level", 1)
 
 async def cmd_profile(message: types.Message):
     try:
         user_id = str(message.from_user.id)
-        user_data = await UserDatabase.get_user(user_id)
+        user_data = await UserDatabase.get_user(user_id, fields=PROFILE_FIELDS)
         if not user_data:
              await message.answer("❌ Ты ещё не зарегистрирован. Напиши /start")
              return
@@ -33,21 +59,21 @@ async def cmd_profile(message: types.Message):
 
         # Формируем информацию о магах
         wizards_info = "\n🧙‍♂️ **Маги:**\n"
-        wizards = user_data.get("wizards", [])
+        wizards = user_data.get("wizards", {})
         if wizards:
-            for wizard in wizards:
+            for wizard in wizards.values():
                 wizard_name = wizard.get("name", "Безымянный")
                 wizard_faction = wizard.get("faction", "Неизвестно")
                 wizard_spells_ids = wizard.get("spells", [])
                 
                 # Получаем названия заклинаний
                 spell_names = []
-                available_spells = user_data.get("spells", {}).get(wizard_faction, {})
                 for spell_id in wizard_spells_ids:
-                    spell_info = available_spells.get(spell_id, {})
-                    spell_name = spell_info.get("name", spell_id)
-                    spell_level = spell_info.get("level", 1)
-                    spell_names.append(f"{spell_name} (ур. {spell_level})")
+                    learned = _learned_spell(user_data.get("spells"), spell_id)
+                    if learned:
+                        spell_names.append(f"{learned[0].name} (ур. {learned[1]})")
+                    else:
+                        spell_names.append(f"{spell_id} (ур. 1)")
                 
                 wizards_info += f"  • {wizard_name} ({wizard_faction.title()}): {', '.join(spell_names) if spell_names else 'Нет заклинаний'}\n"
         else:
@@ -59,21 +85,19 @@ async def cmd_profile(message: types.Message):
         if research.get("active", False):
             spell_id = research.get("spell")
             target_level = research.get("target_level")
-            time_left = research.get("time_left", 0)
+            time_left = timers.format_duration(timers.seconds_left(research))
             faction_bonus = research.get("faction_bonus", False)
             
-            # Найдем название заклинания
+            # Название и ступень заклинания - из конфигурации
             spell_name = "Неизвестное заклинание"
             spell_tier = 1
-            for fact, spells_dict in user_data.get("spells", {}).items():
-                if spell_id in spells_dict:
-                    spell_info = spells_dict[spell_id]
-                    spell_name = spell_info.get("name", spell_id)
-                    spell_tier = spell_info.get("tier", 1)
-                    break
+            found = SPELL_INDEX.get(spell_id)
+            if found:
+                _, spell_tier, spell = found
+                spell_name = spell.name
             
             faction_text = "своей фракции" if faction_bonus else "чужой фракции"
-            research_info += f"  • {spell_name} (Ступень {spell_tier}) → Уровень {target_level} ({faction_text}, {time_left} дней осталось)\n"
+            research_info += f"  • {spell_name} (Ступень {spell_tier}) → Уровень {target_level} ({faction_text}, осталось {time_left})\n"
         else:
             research_info += "  Нет активных исследований\n"
             
@@ -83,7 +107,7 @@ async def cmd_profile(message: types.Message):
         if construction.get("active", False):
             building_id = construction.get("building_id")
             target_level = construction.get("target_level")
-            time_left = construction.get("time_left", 0)
+            time_left = timers.format_duration(timers.seconds_left(construction))
             construction_type = construction.get("type", "build")
             
             # Получаем название здания
@@ -95,7 +119,7 @@ async def cmd_profile(message: types.Message):
             type_text = "постройка" if construction_type == "build" else "улучшение"
             target_text = f"до уровня {target_level}" if construction_type == "upgrade" else ""
             
-            construction_info += f"  • {building_name} ({type_text} {target_text}, {time_left} дней осталось)\n"
+            construction_info += f"  • {building_name} ({type_text} {target_text}, осталось {time_left})\n"
         else:
             construction_info += "  Нет активных построек\n"
 
@@ -106,10 +130,20 @@ async def cmd_profile(message: types.Message):
         wizards_count = len(wizards)
         wizards_summary = f"\n🧙‍♂️ **Маги:** {wizards_count}\n"
 
+        # Баланс с учётом ещё не собранной добычи генератора
+        aom_state = user_data.get("aom")
+        now = timers.now_ms()
+        aom_info = f"💎 AOM: {int(economy.balance(aom_state, now))}"
+        generator_level = economy.level_at(aom_state, now)
+        if generator_level:
+            aom_info += f" (+{economy.production_per_day(generator_level):.0f}/день)"
+
         await message.answer(
             f"{emoji} **Профиль игрока**\n\n"
             f"🔹 Фракция: **{faction.title()}**\n"
-            f"📅 Создан: {created_date}"
+            f"📅 Создан: {created_date}\n"
+            f"{aom_info}\n"
+            f"⚡ Энергия: {user_data.get('energy', daily.DAILY_ENERGY)}/{daily.DAILY_ENERGY}"
             f"{wizards_summary}" # Используем краткую информацию о магах
             f"{research_info}"
             f"{construction_info}",
@@ -125,18 +159,18 @@ async def cmd_wizards(message: types.Message):
     """Показать список магов игрока"""
     try:
         user_id = str(message.from_user.id)
-        user_data = await UserDatabase.get_user(user_id)
+        user_data = await UserDatabase.get_user(user_id, fields=WIZARDS_FIELDS)
         if not user_data:
             await message.answer("❌ Ты ещё не зарегистрирован. Напиши /start")
             return
 
-        wizards = user_data.get("wizards", [])
+        wizards = user_data.get("wizards", {})
         if not wizards:
             await message.answer("🧙‍♂️ У тебя пока нет магов. Используй /hire_wizard, чтобы нанять!")
             return
 
         response_text = "🧙‍♂️ **Твои маги:**\n\n"
-        for i, wizard in enumerate(wizards, 1):
+        for i, wizard in enumerate(wizards.values(), 1):
             wizard_name = wizard.get("name", f"Маг {i}")
             wizard_faction = wizard.get("faction", "Неизвестно").title()
             
@@ -147,20 +181,10 @@ async def cmd_wizards(message: types.Message):
             # Получаем информацию о заклинаниях из userData
             all_spells = user_data.get("spells", {})
             for spell_id in wizard_spells_ids:
-                # Ищем заклинание во всех фракциях
-                found_spell = None
-                found_faction = None
-                for faction_key, faction_spells in all_spells.items():
-                    if spell_id in faction_spells:
-                        found_spell = faction_spells[spell_id]
-                        found_faction = faction_key
-                        break
-                
-                if found_spell:
-                    spell_name = found_spell.get("name", spell_id)
-                    spell_level = found_spell.get("level", 1)
-                    spell_tier = found_spell.get("tier", 1)
-                    spell_info_list.append(f"{spell_name} (С{spell_tier} У{spell_level})")
+                learned = _learned_spell(all_spells, spell_id)
+                if learned:
+                    spell, spell_level = learned
+                    spell_info_list.append(f"{spell.name} (С{spell.tier} У{spell_level})")
                 else:
                     spell_info_list.append(f"{spell_id} (Неизвестно)")
             
@@ -180,13 +204,13 @@ async def cmd_spells(message: types.Message):
     """Показать список изученных заклинаний"""
     try:
         user_id = str(message.from_user.id)
-        user_data = await UserDatabase.get_user(user_id)
+        user_data = await UserDatabase.get_user(user_id, fields=SPELLS_FIELDS)
         if not user_data:
             await message.answer("❌ Ты ещё не зарегистрирован. Напиши /start")
             return
 
         all_spells = user_data.get("spells", {})
-        available_spells = user_data.get("available_spells", [])
+        available_spells = user_data.get("available_spells", {})
         
         if not any(all_spells.values()):  # Проверяем, есть ли хотя бы одно заклинание
             await message.answer("📖 У тебя пока нет изученных заклинаний.")
@@ -232,7 +256,7 @@ async def cmd_research(message: types.Message):
     """Показать текущее исследование или начать новое"""
     try:
         user_id = str(message.from_user.id)
-        user_data = await UserDatabase.get_user(user_id)
+        user_data = await UserDatabase.get_user(user_id, fields=RESEARCH_FIELDS)
         if not user_data:
             await message.answer("❌ Ты ещё не зарегистрирован. Напиши /start")
             return
@@ -243,25 +267,23 @@ async def cmd_research(message: types.Message):
             # Есть активное исследование
             spell_id = research.get("spell")
             target_level = research.get("target_level")
-            time_left = research.get("time_left", 0)
+            time_left = timers.format_duration(timers.seconds_left(research))
             faction_bonus = research.get("faction_bonus", False)
             
-            # Найдем название заклинания
+            # Название и ступень заклинания - из конфигурации
             spell_name = "Неизвестное заклинание"
             spell_tier = 1
-            for fact, spells_dict in user_data.get("spells", {}).items():
-                if spell_id in spells_dict:
-                    spell_info = spells_dict[spell_id]
-                    spell_name = spell_info.get("name", spell_id)
-                    spell_tier = spell_info.get("tier", 1)
-                    break
+            found = SPELL_INDEX.get(spell_id)
+            if found:
+                _, spell_tier, spell = found
+                spell_name = spell.name
             
             faction_text = "своей фракции" if faction_bonus else "чужой фракции"
             await message.answer(
                 f"🔬 **Активное исследование:**\n\n"
                 f"Заклинание: **{spell_name}** (Ступень {spell_tier})\n"
                 f"Цель: Уровень {target_level}\n"
-                f"Осталось времени: {time_left} дней\n"
+                f"Осталось времени: {time_left}\n"
                 f"Тип: {faction_text}\n\n"
                 f"Используй /cancel_research для отмены.",
                 parse_mode="Markdown"
@@ -292,7 +314,7 @@ async def cmd_cancel_research(message: types.Message):
     """Отменить текущее исследование"""
     try:
         user_id = str(message.from_user.id)
-        user_data = await UserDatabase.get_user(user_id)
+        user_data = await UserDatabase.get_user(user_id, fields=CANCEL_RESEARCH_FIELDS)
         if not user_data:
             await message.answer("❌ Ты ещё не зарегистрирован. Напиши /start")
             return
@@ -304,13 +326,7 @@ async def cmd_cancel_research(message: types.Message):
             return
 
         # Отменяем исследование
-        await UserDatabase.update_research(user_id, {
-            "active": False,
-            "spell": None,
-            "target_level": None,
-            "time_left": 0,
-            "faction_bonus": False
-        })
+        await UserDatabase.update_research(user_id, dict(IDLE_RESEARCH))
         
         await message.answer("✅ Активное исследование отменено.")
 
@@ -324,23 +340,18 @@ async def cmd_hire_wizard(message: types.Message):
     """Нанять нового мага (временно мгновенно)"""
     try:
         user_id = str(message.from_user.id)
-        user_data = await UserDatabase.get_user(user_id)
+        user_data = await UserDatabase.get_user(user_id, fields=HIRE_WIZARD_FIELDS)
         if not user_data:
             await message.answer("❌ Ты ещё не зарегистрирован. Напиши /start")
             return
 
-        # Получаем текущее количество магов
-        wizards = user_data.get("wizards", [])
-        wizards_count = len(wizards)
-        
-        # Создаем нового мага
-        new_wizard_id = f"wizard_{wizards_count + 1}"
+        # Создаем нового мага (ID и имя выдаёт UserDatabase.add_wizard)
         user_faction = user_data.get("faction", "fire")
         
         # Определяем начальное заклинание для нового мага (берем первое доступное своей фракции)
         initial_spell = None
         user_spells = user_data.get("spells", {}).get(user_faction, {})
-        available_spells = user_data.get("available_spells", [])
+        available_spells = user_data.get("available_spells", {})
         
         # Ищем первое доступное заклинание своей фракции
         for spell_id in user_spells:
@@ -353,16 +364,14 @@ async def cmd_hire_wizard(message: types.Message):
             initial_spell = next(iter(user_spells), None)
         
         wizard_data = {
-            "id": new_wizard_id,
-            "name": f"Маг {wizards_count + 1}",
             "faction": user_faction,
             "spells": [initial_spell] if initial_spell else []
         }
 
         # Добавляем мага
-        success = await UserDatabase.add_wizard(user_id, wizard_data)
+        wizard_data = await UserDatabase.add_wizard(user_id, wizard_data)
         
-        if success:
+        if wizard_data:
             await message.answer(
                 f"✅ Ты успешно нанял нового мага!\n"
                 f"Имя: **{wizard_data['name']}**\n"
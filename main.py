@@ -12,6 +12,7 @@ from aiogram.types import Update
 # --- Импорты из вашего проекта ---
 from dotenv import load_dotenv
 from app import create_app  # Этот импорт может понадобиться для регистрации обработчиков
+from database import flush_pending_writes
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -41,9 +42,11 @@ async def initialize_bot():
     # Нужно импортировать и зарегистрировать все обработчики
     try:
         from handlers.user_handlers import cmd_start, select_faction
-        from handlers.building_handlers import cmd_buildings, cmd_build, cmd_upgrade
+        from handlers.building_handlers import cmd_buildings, cmd_build, cmd_upgrade, cmd_collect
         from handlers.wizard_handlers import cmd_profile, cmd_wizards, cmd_spells, cmd_research, cmd_cancel_research, cmd_hire_wizard
         from handlers.city_handler import open_city
+        from handlers.battle_handlers import cmd_battles, cmd_replay
+        from handlers.arena_handlers import cmd_arena_unavailable, cmd_top
         
         from aiogram.filters import Command
         
@@ -55,6 +58,7 @@ async def initialize_bot():
         dp.message.register(cmd_buildings, Command("buildings"))
         dp.message.register(cmd_build, Command("build"))
         dp.message.register(cmd_upgrade, Command("upgrade"))
+        dp.message.register(cmd_collect, Command("collect"))
 
         # Wizard handlers
         dp.message.register(cmd_profile, Command("profile"))
@@ -66,6 +70,14 @@ async def initialize_bot():
 
         # City handler
         dp.message.register(open_city, Command("city"))
+
+        # Battle handlers
+        dp.message.register(cmd_battles, Command("battles"))
+        dp.message.register(cmd_replay, Command("replay"))
+        # Очередь арены живёт в памяти процесса, а функция обрабатывает одно
+        # обновление за вызов - соперники не встретятся (арена работает в app.py)
+        dp.message.register(cmd_arena_unavailable, Command("arena", "arena_leave"))
+        dp.message.register(cmd_top, Command("top"))
         
         logger.info("✅ Обработчики зарегистрированы")
     except Exception as e:
@@ -163,3 +175,6 @@ async def handler(event, context):
             'body': 'Internal Server Error',
             'headers': {'Content-Type': 'text/plain'}
         }
+    finally:
+        # После возврата функция может быть заморожена - отложенные записи отправляем сейчас
+        await flush_pending_writes()
@@ -0,0 +1,181 @@
+# migrate_users.py
+"""
+Массовая миграция документов пользователей до текущей версии схемы.
+
+Пример:
+    python migrate_users.py --page-size 500 --concurrency 8 --checkpoint migrate.checkpoint
+    python migrate_users.py --daily-reset --concurrency 2   # заранее записать ежедневный сброс
+
+Пользователи читаются постранично (UserDatabase.iter_users), изменения
+пишутся пакетами multi-path update() с ограниченным числом одновременных
+запросов. После каждой страницы сохраняется контрольная точка, поэтому
+прерванная миграция продолжается с места остановки.
+
+--daily-reset вместо миграции схемы записывает ежедневный сброс энергии
+тем, у кого он ещё не записан за текущие UTC-сутки. Обычно это не нужно -
+сброс применяется лениво при чтении; режим нужен для заполнения полей
+у старых документов или отчётов по всей базе в часы низкой нагрузки.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+from database import UserDatabase, WriteBatch, flush_pending_writes
+from services import daily
+from services.migrations import CURRENT_SCHEMA_VERSION, upgrade_user
+
+
+def schema_updates(user_data):
+    """Изменения миграции документа до текущей версии схемы."""
+    return upgrade_user(user_data)[1]
+
+
+def daily_reset_updates(user_data):
+    """Изменения ежедневного сброса (пусто, если сброс за сегодня уже записан)."""
+    return daily.apply_reset(user_data)[1]
+
+
+class BulkMigrator:
+    """
+    Потоковая миграция всех пользователей с пакетной записью и контрольными точками.
+
+    transform(user_data) возвращает изменения документа {путь: значение};
+    по умолчанию - миграция до текущей версии схемы.
+    """
+
+    def __init__(self, page_size=500, users_per_commit=100, concurrency=8,
+                 checkpoint_path=None, dry_run=False, report_every=5.0, transform=schema_updates):
+        self.transform = transform
+        self.page_size = page_size
+        self.users_per_commit = users_per_commit
+        self.concurrency = concurrency
+        self.checkpoint_path = checkpoint_path
+        self.dry_run = dry_run
+        self.report_every = report_every
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.scanned = 0
+        self.migrated = 0
+        self.failed_commits = 0
+        self._started = 0.0
+        self._last_report = 0.0
+
+    # --- Контрольная точка ---
+    def load_checkpoint(self):
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return None
+        with open(self.checkpoint_path, encoding="utf-8") as f:
+            return json.load(f).get("last_user_id")
+
+    def save_checkpoint(self, last_user_id):
+        if not self.checkpoint_path or self.dry_run:
+            return
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "last_user_id": last_user_id,
+                "schema_version": CURRENT_SCHEMA_VERSION,
+                "scanned": self.scanned,
+                "migrated": self.migrated,
+            }, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    # --- Запись ---
+    async def _commit(self, batch):
+        async with self._semaphore:
+            try:
+                await batch.commit()
+            except Exception as e:
+                self.failed_commits += 1
+                print(f"❌ Ошибка записи пакета миграции: {e}")
+                raise
+
+    async def _migrate_page(self, page):
+        """Мигрировать страницу: пакеты по users_per_commit пользователей пишутся параллельно."""
+        batches, batch, users_in_batch = [], WriteBatch(), 0
+        for user_id, user_data in page:
+            updates = self.transform(user_data)
+            if not updates:
+                continue
+            for path, value in updates.items():
+                batch.set_user(user_id, path, value)
+            users_in_batch += 1
+            self.migrated += 1
+            if users_in_batch >= self.users_per_commit:
+                batches.append(batch)
+                batch, users_in_batch = WriteBatch(), 0
+        if users_in_batch:
+            batches.append(batch)
+        if not self.dry_run and batches:
+            await asyncio.gather(*(self._commit(b) for b in batches))
+
+    def report(self, force=False):
+        now = time.perf_counter()
+        if not force and now - self._last_report < self.report_every:
+            return
+        self._last_report = now
+        elapsed = max(now - self._started, 1e-9)
+        print(
+            f"📊 Просмотрено: {self.scanned}, мигрировано: {self.migrated}, "
+            f"{self.scanned / elapsed:.0f} польз./с, {self.migrated / elapsed:.0f} миграций/с"
+        )
+
+    async def run(self):
+        """Запустить миграцию (с контрольной точки, если она есть)."""
+        self._started = self._last_report = time.perf_counter()
+        start_after = self.load_checkpoint()
+        if start_after is not None:
+            print(f"↩️ Продолжаем миграцию после пользователя {start_after}")
+
+        page = []
+        async for user_id, user_data in UserDatabase.iter_users(self.page_size, start_after=start_after):
+            self.scanned += 1
+            page.append((user_id, user_data))
+            if len(page) >= self.page_size:
+                await self._migrate_page(page)
+                self.save_checkpoint(page[-1][0])
+                page = []
+                self.report()
+        if page:
+            await self._migrate_page(page)
+            self.save_checkpoint(page[-1][0])
+        await flush_pending_writes()
+        self.report(force=True)
+        if self.transform is schema_updates:
+            print(f"✅ Миграция до версии {CURRENT_SCHEMA_VERSION} завершена")
+        else:
+            print("✅ Обработка пользователей завершена")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Миграция пользователей до текущей версии схемы")
+    parser.add_argument("--page-size", type=int, default=500, help="Пользователей на страницу чтения")
+    parser.add_argument("--users-per-commit", type=int, default=100, help="Пользователей в одном update()")
+    parser.add_argument("--concurrency", type=int, default=8, help="Одновременных запросов записи")
+    parser.add_argument("--checkpoint", default=None, help="Файл контрольной точки")
+    parser.add_argument("--dry-run", action="store_true", help="Только посчитать, ничего не записывать")
+    parser.add_argument("--daily-reset", action="store_true", help="Записать ежедневный сброс энергии")
+    args = parser.parse_args()
+
+    transform, checkpoint = schema_updates, "migrate_users.checkpoint"
+    if args.daily_reset:
+        # Своя контрольная точка на каждые сутки: завтра обход начнётся заново
+        today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        transform, checkpoint = daily_reset_updates, f"daily_reset_{today}.checkpoint"
+
+    migrator = BulkMigrator(
+        transform=transform,
+        page_size=args.page_size,
+        users_per_commit=args.users_per_commit,
+        concurrency=args.concurrency,
+        checkpoint_path=args.checkpoint or checkpoint,
+        dry_run=args.dry_run,
+    )
+    asyncio.run(migrator.run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+# services/battle_service.py
+"""
+Выполнение боёв в пуле процессов.
+
+Симуляция боя нагружает процессор: прямо в обработчике aiogram или роуте
+FastAPI она останавливала бы event loop для всех игроков. Бои ставятся в
+ограниченную очередь (asyncio.Queue), из неё их забирают диспетчеры - по
+одному на процесс ProcessPoolExecutor, - поэтому в пуле не больше одного
+боя на процесс, а остальные ждут в очереди, где их видно в метриках.
+
+- Backpressure: если очередь полна дольше submit_timeout, run_battle
+  бросает BattleServiceBusy - вызывающий код отвечает "попробуй позже".
+- Таймаут: если результат не получен за timeout, бросается
+  asyncio.TimeoutError. Бой, ещё не начатый к этому моменту, не запускается;
+  уже начатый доиграет в процессе, а результат отбросится.
+
+Сервис запускается лениво при первом бое (нужен работающий event loop),
+в app.py - явно в lifespan.
+"""
+
+import asyncio
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from battle.replay import record_battle
+
+BATTLE_WORKERS = int(os.getenv("BATTLE_WORKERS", "0")) or os.cpu_count() or 1
+BATTLE_QUEUE_SIZE = int(os.getenv("BATTLE_QUEUE_SIZE", "1000"))
+BATTLE_TIMEOUT = float(os.getenv("BATTLE_TIMEOUT", "10"))
+BATTLE_SUBMIT_TIMEOUT = float(os.getenv("BATTLE_SUBMIT_TIMEOUT", "1"))
+
+
+class BattleServiceBusy(Exception):
+    """Очередь боёв переполнена - бой не принят."""
+
+
+class BattleService:
+    """Очередь боёв перед пулом процессов с таймаутами и метриками."""
+
+    # Сколько последних боёв учитывается в перцентилях задержки
+    LATENCY_WINDOW = 1000
+
+    def __init__(self, workers=BATTLE_WORKERS, queue_size=BATTLE_QUEUE_SIZE,
+                 timeout=BATTLE_TIMEOUT, submit_timeout=BATTLE_SUBMIT_TIMEOUT):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.submit_timeout = submit_timeout
+        self._queue = None
+        self._executor = None
+        self._dispatchers = []
+        self._busy = 0
+        self._latencies = deque(maxlen=self.LATENCY_WINDOW)  # от постановки в очередь до результата, с
+        self._waits = deque(maxlen=self.LATENCY_WINDOW)  # ожидание в очереди, с
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.expired = 0
+
+    @property
+    def running(self):
+        return bool(self._dispatchers)
+
+    def start(self):
+        """Создать пул процессов и диспетчеров (нужен работающий event loop)."""
+        if self.running:
+            return
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Остановить диспетчеров, отменить бои в очереди и закрыть пул."""
+        for task in self._dispatchers:
+            task.cancel()
+        await asyncio.gather(*self._dispatchers, return_exceptions=True)
+        self._dispatchers = []
+        while self._queue is not None and not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            future.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def run_battle(self, wizards_a, wizards_b, players=None, seed=None, timeout=None):
+        """
+        Провести бой в пуле процессов (как battle.replay.record_battle).
+
+        Возвращает (BattleResult, запись боя). Бросает BattleServiceBusy при
+        переполненной очереди и asyncio.TimeoutError, если бой не уложился в timeout.
+        """
+        if not self.running:
+            self.start()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        enqueued = loop.time()
+        try:
+            await asyncio.wait_for(
+                self._queue.put(((wizards_a, wizards_b, players, seed), future, enqueued)),
+                self.submit_timeout,
+            )
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise BattleServiceBusy(f"Очередь боёв переполнена ({self._queue.qsize()})") from None
+
+        try:
+            # shield: таймаут вызывающего не должен отменять future, пока его держит диспетчер
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout if timeout is None else timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            future.cancel()
+            raise
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            args, future, enqueued = await self._queue.get()
+            try:
+                if future.done():
+                    # Вызывающий уже не ждёт (таймаут или отмена) - бой не запускаем
+                    self.expired += 1
+                    continue
+                self._waits.append(loop.time() - enqueued)
+                self._busy += 1
+                executor = self._executor
+                try:
+                    result = await loop.run_in_executor(executor, record_battle, *args)
+                except BrokenProcessPool as e:
+                    # Процесс пула упал - пересоздаём пул (один раз на все диспетчеры), бой неудачен
+                    if self._executor is executor:
+                        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                    self._fail(future, e)
+                    continue
+                except Exception as e:
+                    self._fail(future, e)
+                    continue
+                finally:
+                    self._busy -= 1
+                self.completed += 1
+                self._latencies.append(loop.time() - enqueued)
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                self._queue.task_done()
+
+    def _fail(self, future, error):
+        self.failed += 1
+        print(f"❌ Ошибка при проведении боя: {error}")
+        if not future.done():
+            future.set_exception(error)
+
+    def stats(self):
+        """Метрики сервиса: глубина очереди, занятые процессы, счётчики и задержки (мс)."""
+        latencies = sorted(self._latencies)
+
+        def percentile(values, share):
+            if not values:
+                return None
+            return round(values[min(len(values) - 1, int(len(values) * share))] * 1000, 2)
+
+        return {
+            "running": self.running,
+            "workers": self.workers,
+            "busy": self._busy,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "queue_size": self.queue_size,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "expired": self.expired,
+            "latency_p50_ms": percentile(latencies, 0.5),
+            "latency_p95_ms": percentile(latencies, 0.95),
+            "latency_max_ms": round(latencies[-1] * 1000, 2) if latencies else None,
+            "queue_wait_avg_ms": round(sum(self._waits) / len(self._waits) * 1000, 2) if self._waits else None,
+        }
+
+
+battle_service = BattleService()
+
+
+async def run_battle(wizards_a, wizards_b, players=None, seed=None, timeout=None):
+    """Провести бой через общий сервис: await run_battle(линия A, линия B)."""
+    return await battle_service.run_battle(wizards_a, wizards_b, players, seed, timeout)
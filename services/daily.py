@@ -0,0 +1,82 @@
+# services/daily.py
+"""
+Ежедневный сброс энергии и дневных лимитов.
+
+Полуночной задачи нет: сброс вычисляется при чтении документа по
+last_energy_reset (начало UTC-суток последнего сброса, мс). Если с тех пор
+наступили новые сутки, читающий код видит уже сброшенные значения, а запись
+сброса добавляется в batch команды и уходит одним update() вместе с её
+собственными изменениями (см. UserDatabase.get_user(batch=...)).
+"""
+
+import time
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+# Энергия на сутки
+DAILY_ENERGY = 10
+
+# Поле -> значение после ежедневного сброса
+DAILY_RESETS = {
+    "energy": DAILY_ENERGY,
+}
+
+# Поля, которые нужны для вычисления сброса
+DAILY_FIELDS = tuple(DAILY_RESETS) + ("last_energy_reset",)
+
+# Энергия за бой на арене
+ARENA_ENERGY_COST = 1
+
+
+def utc_day_start(timestamp_ms):
+    """Начало UTC-суток, в которые попадает timestamp_ms (эпоха Unix выровнена по UTC)."""
+    return timestamp_ms - timestamp_ms % DAY_MS
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def needs_reset(user_data, now=None):
+    """Наступили ли новые UTC-сутки после последнего сброса."""
+    now = now_ms() if now is None else now
+    last_reset = (user_data or {}).get("last_energy_reset")
+    if not isinstance(last_reset, (int, float)):
+        return True
+    return utc_day_start(last_reset) < utc_day_start(now)
+
+
+def reset_updates(now=None):
+    """Изменения документа для сброса в сутках now: {поле: значение}."""
+    now = now_ms() if now is None else now
+    return {**DAILY_RESETS, "last_energy_reset": utc_day_start(now)}
+
+
+def energy(user_data):
+    """Энергия игрока на сегодня (документ прочитан с DAILY_FIELDS - сброс уже применён)."""
+    return (user_data or {}).get("energy", DAILY_ENERGY)
+
+
+def spend(value, amount):
+    """Энергия после траты amount или None, если её не хватает."""
+    if value < amount:
+        return None
+    return value - amount
+
+
+def refund(value, amount):
+    """Энергия после возврата amount: не больше дневного запаса."""
+    return min(value + amount, DAILY_ENERGY)
+
+
+def apply_reset(user_data, now=None):
+    """
+    Применить сброс к прочитанному документу.
+
+    Возвращает (документ, изменения для записи); если сброс не нужен,
+    изменения пустые и документ возвращается как есть.
+    """
+    if not user_data or not needs_reset(user_data, now):
+        return user_data, {}
+    updates = reset_updates(now)
+    return {**user_data, **updates}, updates
@@ -0,0 +1,83 @@
+# services/economy.py
+"""
+Добыча кристаллов AOM генератором (aom_generator).
+
+Добыча не начисляется по расписанию: узел aom документа хранит баланс на
+момент last_collected_at и историю уровней генератора после этого момента
+(level_history: {отметка времени в мс: уровень}). Накопленное вычисляется
+при чтении в замкнутой форме - скорость постоянна между повышениями уровня,
+поэтому сумма берётся по отрезкам истории. Записывается узел только при
+сборе (/collect), когда история сворачивается до текущего уровня.
+"""
+
+from buildings_config import effect_at
+
+GENERATOR_ID = "aom_generator"
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+def production_per_day(level):
+    """Добыча генератора уровня level в день: 100 * 1.2^(level-1) (из таблицы уровней)."""
+    if not level or level < 1:
+        return 0.0
+    return effect_at(GENERATOR_ID, level).get("aom_per_day", 0.0)
+
+
+def _history(state):
+    return sorted((int(ts), level) for ts, level in ((state or {}).get("level_history") or {}).items())
+
+
+def level_at(state, at):
+    """Уровень генератора в момент at по истории уровней (0 - ещё не построен)."""
+    level = 0
+    for ts, history_level in _history(state):
+        if ts > at:
+            break
+        level = history_level
+    return level
+
+
+def accrued(state, now):
+    """Сколько AOM добыто с last_collected_at до now (с учётом повышений уровня)."""
+    history = _history(state)
+    if not history:
+        return 0.0
+    start = (state or {}).get("last_collected_at") or history[0][0]
+    total, level = 0.0, 0
+    for ts, history_level in history:
+        if ts <= start:
+            level = history_level
+            continue
+        if ts >= now:
+            break
+        total += production_per_day(level) * (ts - start)
+        start, level = ts, history_level
+    total += production_per_day(level) * max(0, now - start)
+    return total / DAY_MS
+
+
+def balance(state, now):
+    """Текущий баланс: собранное + накопленное."""
+    return ((state or {}).get("balance") or 0) + accrued(state, now)
+
+
+def collect(state, now):
+    """
+    Собрать накопленное.
+
+    Возвращает (новое состояние узла aom, собрано). История сворачивается до
+    уровня на момент now (и будущих записей, если они есть).
+    """
+    if not state or not state.get("level_history"):
+        return state, 0.0
+    collected = accrued(state, now)
+    history = {str(now): level_at(state, now)}
+    for ts, level in _history(state):
+        if ts > now:
+            history[str(ts)] = level
+    new_state = {
+        "balance": round((state.get("balance") or 0) + collected, 4),
+        "last_collected_at": now,
+        "level_history": history,
+    }
+    return new_state, collected
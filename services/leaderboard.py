@@ -0,0 +1,77 @@
+# services/leaderboard.py
+"""
+Таблица лидеров арены - готовый документ leaderboard/ для /top и веб-приложения.
+
+Таблица обновляется по каждому изменению рейтинга, без сортировки всех
+игроков. Она всегда хранит точный топ-k игроков с рейтингом (k <= size):
+у любого игрока вне таблицы рейтинг не выше последнего в ней. Поэтому
+изменение рейтинга игрока решается по одной таблице:
+- рейтинг не ниже последнего в таблице - игрок встаёт на своё место
+  (лишний последний выпадает);
+- ниже - игрок покидает таблицу (вне её могут быть игроки выше него).
+Если в таблице остались все игроки с рейтингом (complete), в неё попадает
+любой. Когда после выбываний игроков в таблице меньше, чем показывает /top,
+её пересобирают полным проходом по ratings/ (needs_rebuild).
+"""
+
+from bisect import insort
+
+# Узел таблицы лидеров: {"entries": [{id, name, rating}], "complete", "updated_at"}
+LEADERBOARD_PATH = "leaderboard"
+# Сколько игроков хранится в таблице и сколько показывает /top
+LEADERBOARD_SIZE = 100
+TOP_SIZE = 10
+
+
+def _order(entry):
+    return -entry["rating"], entry["id"]
+
+
+class Leaderboard:
+    """Точный топ игроков по рейтингу (entries - от лучшего к худшему)."""
+
+    def __init__(self, entries=(), complete=False, size=LEADERBOARD_SIZE):
+        self.size = size
+        self.entries = sorted((dict(entry) for entry in entries if entry), key=_order)[:size]
+        self.complete = complete
+
+    @classmethod
+    def from_record(cls, record, size=LEADERBOARD_SIZE):
+        """Таблица из документа leaderboard/ (None - пустая неполная таблица)."""
+        record = record or {}
+        entries = record.get("entries") or []
+        if isinstance(entries, dict):
+            entries = list(entries.values())
+        return cls(entries, bool(record.get("complete")), size)
+
+    def to_record(self, updated_at):
+        return {"entries": list(self.entries), "complete": self.complete, "updated_at": updated_at}
+
+    def copy(self):
+        return Leaderboard(self.entries, self.complete, self.size)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def top(self, count=TOP_SIZE):
+        return self.entries[:count]
+
+    def needs_rebuild(self, count=TOP_SIZE):
+        """Игроков в таблице меньше count, а вне её могут быть игроки с рейтингом."""
+        return not self.complete and len(self.entries) < count
+
+    def update(self, user_id, name, rating):
+        """Учесть новый рейтинг игрока; True, если таблица изменилась."""
+        user_id = str(user_id)
+        # Порог считается до изменения: рейтинг любого игрока вне таблицы не выше него
+        threshold = self.entries[-1]["rating"] if self.entries else None
+        index = next((i for i, entry in enumerate(self.entries) if entry["id"] == user_id), None)
+        if index is not None:
+            del self.entries[index]
+        if not self.complete and (threshold is None or rating < threshold):
+            return index is not None
+        insort(self.entries, {"id": user_id, "name": name or "", "rating": rating}, key=_order)
+        if len(self.entries) > self.size:
+            self.entries.pop()
+            self.complete = False
+        return True
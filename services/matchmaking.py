@@ -0,0 +1,305 @@
+# services/matchmaking.py
+"""
+Подбор соперников для PvP-арены (pvp_arena, бои 1 на 1 с рейтингом).
+
+Игрок встаёт в очередь с рейтингом (join). Ожидающие лежат в RatingIndex,
+и раз в interval секунд фоновый таск разбирает очередь пачкой: начиная с
+дольше всех ждущего, каждому ищется ближайший по рейтингу ожидающий в окне,
+которое расширяется со временем ожидания (window + window_step в секунду,
+не больше max_window). Последние recent соперников игрока пропускаются.
+Поиск - O(log n) по индексу, поэтому проход по очереди не зависит от числа
+игроков в игре, а с ростом очереди соперник находится в более узком окне.
+
+Пара получает общий Match: бой проводит on_match один раз для обоих
+игроков (play_match - бой линий магов в battle_service с сохранением
+записи), каждый ждёт match.result.
+
+Очередь живёт в памяти процесса, поэтому арена работает только в
+долгоживущем боте (app.py). В облачной функции (main.handler) каждый вызов
+обрабатывает одно обновление, а между вызовами процесс замораживается -
+игроки не встретятся в одной очереди; там /arena отключена.
+"""
+
+import asyncio
+import os
+from collections import deque
+
+from battle.engine import LINE_SIZE
+from database import UserDatabase, rating_results
+from services.battle_service import battle_service
+from services.rating import RatingIndex
+
+MATCH_INTERVAL = float(os.getenv("MATCH_INTERVAL", "1"))
+MATCH_WINDOW = float(os.getenv("MATCH_WINDOW", "50"))
+MATCH_WINDOW_STEP = float(os.getenv("MATCH_WINDOW_STEP", "25"))
+MATCH_MAX_WINDOW = float(os.getenv("MATCH_MAX_WINDOW", "400"))
+MATCH_TIMEOUT = float(os.getenv("MATCH_TIMEOUT", "30"))
+RECENT_OPPONENTS = int(os.getenv("RECENT_OPPONENTS", "3"))
+
+# Характеристики мага, у которого их нет (как в web/battle_test_5v5.js)
+WIZARD_BASE_HP = 100
+WIZARD_BASE_DAMAGE = 20
+
+
+def arena_lineup(wizards):
+    """
+    Линия для боя на арене: первые LINE_SIZE магов игрока по порядку найма.
+
+    Заклинание мага в бою - первое из его заклинаний (эффект - по battle_effect).
+    """
+    def hire_order(wizard):
+        number = str(wizard.get("id", "")).rpartition("_")[2]
+        return int(number) if number.isdigit() else 0
+
+    hired = sorted((wizard for wizard in (wizards or {}).values() if wizard), key=hire_order)
+    return [
+        {
+            "name": wizard.get("name") or "",
+            "hp": wizard.get("hp", WIZARD_BASE_HP),
+            "damage": wizard.get("damage", WIZARD_BASE_DAMAGE),
+            "spell": (wizard.get("spells") or [None])[0],
+        }
+        for wizard in hired[:LINE_SIZE]
+    ]
+
+
+class Ticket:
+    """Игрок в очереди."""
+
+    __slots__ = ("user_id", "rating", "joined_at", "future")
+
+    def __init__(self, user_id, rating, joined_at, future):
+        self.user_id = user_id
+        self.rating = rating
+        self.joined_at = joined_at
+        self.future = future
+
+
+class Match:
+    """Найденная пара: players - ((user_id, рейтинг) стороны A, стороны B), result - итог on_match."""
+
+    __slots__ = ("players", "waited", "result")
+
+    def __init__(self, players, waited, result):
+        self.players = players
+        self.waited = waited  # сколько ждал каждый игрок, с
+        self.result = result
+
+    def opponent(self, user_id):
+        """(user_id, рейтинг) соперника игрока user_id."""
+        return self.players[1] if self.players[0][0] == user_id else self.players[0]
+
+
+class Matchmaker:
+    """Очередь подбора соперников по рейтингу с пакетным разбором."""
+
+    # Сколько последних пар учитывается во времени ожидания
+    WAIT_WINDOW = 1000
+
+    def __init__(self, on_match=None, interval=MATCH_INTERVAL, window=MATCH_WINDOW,
+                 window_step=MATCH_WINDOW_STEP, max_window=MATCH_MAX_WINDOW, recent=RECENT_OPPONENTS):
+        self.on_match = on_match  # async on_match(match) -> итог боя
+        self.interval = interval
+        self.window = window
+        self.window_step = window_step
+        self.max_window = max_window
+        self._waiting = RatingIndex()
+        self._tickets = {}  # user_id -> Ticket, в порядке постановки в очередь
+        self._recent = {}  # user_id -> deque последних соперников
+        self._recent_size = recent
+        self._task = None
+        self._inflight = set()
+        self._waits = deque(maxlen=self.WAIT_WINDOW)
+        self.matched = 0
+        self.timeouts = 0
+        self.failures = 0
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Запустить фоновый разбор очереди (нужен работающий event loop)."""
+        if self.running:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Остановить разбор, снять всех с очереди и дождаться начатых боёв."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for user_id in list(self._tickets):
+            self.leave(user_id)
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+    def __len__(self):
+        return len(self._tickets)
+
+    def __contains__(self, user_id):
+        return str(user_id) in self._tickets
+
+    async def join(self, user_id, rating, timeout=MATCH_TIMEOUT):
+        """
+        Встать в очередь и дождаться соперника: Match или None, если игрок
+        снялся с очереди (leave). Если за timeout соперник не нашёлся, игрок
+        снимается с очереди и бросается asyncio.TimeoutError. Повторный join
+        того же игрока ждёт ту же пару.
+        """
+        if not self.running:
+            self.start()
+        user_id = str(user_id)
+        ticket = self._tickets.get(user_id)
+        if ticket is None:
+            loop = asyncio.get_running_loop()
+            ticket = Ticket(user_id, rating, loop.time(), loop.create_future())
+            self._tickets[user_id] = ticket
+            self._waiting.add(user_id, rating)
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(ticket.future), timeout)
+        except asyncio.TimeoutError:
+            # Пара могла найтись в тот же момент
+            if ticket.future.done():
+                return ticket.future.result()
+            if self.leave(user_id):
+                self.timeouts += 1
+            raise
+        except asyncio.CancelledError:
+            self.leave(user_id)
+            raise
+
+    def leave(self, user_id):
+        """Снять игрока с очереди; True, если он в ней был."""
+        user_id = str(user_id)
+        ticket = self._tickets.pop(user_id, None)
+        if ticket is None:
+            return False
+        self._waiting.remove(user_id)
+        if not ticket.future.done():
+            ticket.future.set_result(None)
+        return True
+
+    def window_for(self, waited):
+        """Окно рейтинга для игрока, ждущего waited секунд."""
+        return min(self.max_window, self.window + self.window_step * waited)
+
+    def match_waiting(self, now):
+        """
+        Один проход по очереди: снять с неё найденные пары и вернуть их [(ticket A, ticket B)].
+
+        Первым соперника выбирает дольше всех ждущий игрок, в своём окне;
+        он же становится стороной A (ходит первым).
+        """
+        pairs = []
+        for ticket in list(self._tickets.values()):
+            if ticket.user_id not in self._tickets:
+                continue  # уже в паре этого прохода
+            exclude = {ticket.user_id, *self._recent.get(ticket.user_id, ())}
+            found = self._waiting.nearest(ticket.rating, self.window_for(now - ticket.joined_at), exclude)
+            if found is None:
+                continue
+            opponent = self._tickets.pop(found[0])
+            del self._tickets[ticket.user_id]
+            self._waiting.remove(ticket.user_id)
+            self._waiting.remove(opponent.user_id)
+            self._remember(ticket.user_id, opponent.user_id)
+            self._remember(opponent.user_id, ticket.user_id)
+            pairs.append((ticket, opponent))
+        return pairs
+
+    def _remember(self, user_id, opponent_id):
+        if self._recent_size <= 0:
+            return
+        recent = self._recent.get(user_id)
+        if recent is None:
+            recent = self._recent[user_id] = deque(maxlen=self._recent_size)
+        recent.append(opponent_id)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.interval)
+            now = loop.time()
+            for pair in self.match_waiting(now):
+                match = Match(
+                    tuple((ticket.user_id, ticket.rating) for ticket in pair),
+                    tuple(now - ticket.joined_at for ticket in pair),
+                    loop.create_future(),
+                )
+                self.matched += 1
+                self._waits.extend(match.waited)
+                task = asyncio.create_task(self._play(match))
+                self._inflight.add(task)
+                task.add_done_callback(self._inflight.discard)
+                for ticket in pair:
+                    if not ticket.future.done():
+                        ticket.future.set_result(match)
+
+    async def _play(self, match):
+        try:
+            result = await self.on_match(match) if self.on_match is not None else None
+            match.result.set_result(result)
+        except Exception as e:
+            self.failures += 1
+            print(f"❌ Ошибка при проведении боя на арене {match.players}: {e}")
+            match.result.set_exception(e)
+
+    def stats(self):
+        """Метрики очереди: ожидающие, пары, таймауты и время ожидания (с)."""
+        waits = sorted(self._waits)
+        return {
+            "running": self.running,
+            "waiting": len(self._tickets),
+            "matched": self.matched,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "wait_avg_s": round(sum(waits) / len(waits), 2) if waits else None,
+            "wait_p95_s": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 2) if waits else None,
+        }
+
+
+# Поля игрока, нужные для боя пары
+MATCH_FIELDS = ("username", "wizards")
+
+
+async def play_match(match):
+    """
+    Бой пары на арене: линии магов обоих игроков, бой в пуле процессов,
+    запись боя и изменение рейтингов (пачкой через rating_results).
+
+    Возвращает {"winner": user_id или None, "rounds", "replay_key", "replay",
+    "ratings": {user_id: (старый, новый)}}; ratings пуст, если рейтинги не записались.
+    """
+    user_ids = [user_id for user_id, _ in match.players]
+    users = await asyncio.gather(*(UserDatabase.get_user(user_id, fields=MATCH_FIELDS) for user_id in user_ids))
+    players = [
+        {"id": user_id, "name": (user or {}).get("username") or ""}
+        for user_id, user in zip(user_ids, users)
+    ]
+    lineup_a, lineup_b = (arena_lineup((user or {}).get("wizards")) for user in users)
+    result, replay = await battle_service.run_battle(lineup_a, lineup_b, players=players)
+    key = await UserDatabase.save_replay(replay)
+
+    score_a = 0.5 if result.winner is None else 1 - result.winner
+    try:
+        changes = await rating_results.submit(user_ids[0], user_ids[1], score_a)
+    except Exception as e:
+        # Результат остался в буфере и будет записан при следующей отправке
+        print(f"❌ Ошибка при записи рейтингов арены: {e}")
+        changes = ()
+    return {
+        "winner": None if result.winner is None else user_ids[result.winner],
+        "rounds": result.rounds,
+        "replay_key": key,
+        "replay": replay,
+        "ratings": dict(zip(user_ids, changes)),
+    }
+
+
+matchmaker = Matchmaker(on_match=play_match)
@@ -0,0 +1,130 @@
+# services/migrations.py
+"""Версионированные миграции документа пользователя."""
+
+import copy
+import time
+
+from services.rating import DEFAULT_RATING
+from storage.paths import set_path
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+# Версия -> функция миграции. Функция получает документ предыдущей версии
+# и возвращает изменения {путь внутри документа: значение}; сама она ничего не пишет.
+MIGRATIONS = {}
+
+
+def migration(version):
+    """Зарегистрировать функцию миграции документа до версии version."""
+    def decorator(func):
+        if version in MIGRATIONS:
+            raise ValueError(f"Миграция версии {version} уже зарегистрирована")
+        MIGRATIONS[version] = func
+        return func
+    return decorator
+
+
+def get_schema_version(user_data):
+    """Версия схемы документа (документы до появления версий считаются версией 0)."""
+    return (user_data or {}).get("schema_version") or 0
+
+
+def needs_upgrade(user_data):
+    return get_schema_version(user_data) < CURRENT_SCHEMA_VERSION
+
+
+def upgrade_user(user_data):
+    """
+    Привести документ к текущей версии схемы.
+
+    Возвращает (новый документ, изменения для записи). Если документ уже
+    актуален, изменения пустые и документ возвращается без копирования.
+    """
+    version = get_schema_version(user_data)
+    if version >= CURRENT_SCHEMA_VERSION:
+        return user_data, {}
+    user_data = copy.deepcopy(user_data)
+    updates = {}
+    for target in sorted(v for v in MIGRATIONS if v > version):
+        for path, value in MIGRATIONS[target](user_data).items():
+            user_data = set_path(user_data, path, value)
+            updates[path] = value
+    user_data["schema_version"] = CURRENT_SCHEMA_VERSION
+    updates["schema_version"] = CURRENT_SCHEMA_VERSION
+    return user_data, updates
+
+
+# --- Миграции ---
+
+def _wizard_number(wizard_id):
+    """Номер мага из ID вида 'wizard_3' (0, если ID другого формата)."""
+    suffix = str(wizard_id).rsplit("_", 1)[-1]
+    return int(suffix) if suffix.isdigit() else 0
+
+
+def wizard_seq(wizards):
+    """Начальное значение счётчика wizard_seq: наибольший занятый номер мага."""
+    wizards = wizards or {}
+    return max([len(wizards)] + [_wizard_number(wizard_id) for wizard_id in wizards])
+
+
+@migration(1)
+def keyed_collections(user_data):
+    """wizards и available_spells: списки -> словари с ключами, счётчик wizard_seq."""
+    updates = {}
+    wizards = user_data.get("wizards")
+    if isinstance(wizards, list):
+        wizards_map = {}
+        for index, wizard in enumerate(wizards, 1):
+            if not wizard:
+                continue
+            wizard = dict(wizard)
+            wizard_id = wizard.get("id") or f"wizard_{index}"
+            while wizard_id in wizards_map:
+                wizard_id = f"{wizard_id}_dup"
+            wizard["id"] = wizard_id
+            wizards_map[wizard_id] = wizard
+        updates["wizards"] = wizards_map
+    if user_data.get("wizard_seq") is None:
+        updates["wizard_seq"] = wizard_seq(updates.get("wizards", wizards))
+    available_spells = user_data.get("available_spells")
+    if isinstance(available_spells, list):
+        updates["available_spells"] = {spell_id: True for spell_id in available_spells if spell_id}
+    return updates
+
+
+@migration(2)
+def timestamp_timers(user_data):
+    """construction/research: неубывающий time_left (дни) -> отметки started_at/finish_at."""
+    updates = {}
+    now = int(time.time() * 1000)
+    for field in ("construction", "research"):
+        timer = user_data.get(field)
+        if not isinstance(timer, dict) or "time_left" not in timer:
+            continue
+        updates[f"{field}/time_left"] = None
+        if timer.get("active") and timer.get("finish_at") is None:
+            updates[f"{field}/started_at"] = now
+            updates[f"{field}/finish_at"] = now + int((timer.get("time_left") or 0) * DAY_MS)
+    return updates
+
+
+@migration(3)
+def aom_generator_state(user_data):
+    """Узел aom для уже построенных генераторов: добыча считается с момента миграции."""
+    level = ((user_data.get("buildings") or {}).get("aom_generator") or {}).get("level")
+    if not level or user_data.get("aom"):
+        return {}
+    now = int(time.time() * 1000)
+    return {"aom": {"balance": 0, "last_collected_at": now, "level_history": {str(now): level}}}
+
+
+@migration(4)
+def arena_rating(user_data):
+    """Поле rating (рейтинг PvP-арены) для игроков, созданных до арены."""
+    if user_data.get("rating") is not None:
+        return {}
+    return {"rating": DEFAULT_RATING}
+
+
+CURRENT_SCHEMA_VERSION = max(MIGRATIONS)
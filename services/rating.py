@@ -0,0 +1,189 @@
+# services/rating.py
+"""
+Рейтинг PvP-арены.
+
+Рейтинг игрока хранится в документе (users/{user_id}/rating) и копией в
+отдельном узле ratings/{user_id}: подбор соперника читает одно число, а не
+документ пользователя. RatingIndex - отсортированный по рейтингу набор
+игроков в памяти: поиск ближайшего по рейтингу соперника - бинарный поиск
+и несколько шагов в обе стороны от найденной позиции.
+
+Рейтинг считается по Эло (elo_update). Результаты боёв копятся в
+ResultBuffer и применяются пачкой: один проход пересчитывает рейтинги по
+порядку боёв и записывает их одним multi-path update().
+"""
+
+import asyncio
+from bisect import bisect_left, insort
+
+# Узел рейтингов: ratings/{user_id} = рейтинг
+RATINGS_PATH = "ratings"
+# Рейтинг нового игрока
+DEFAULT_RATING = 1000
+# Коэффициент K: наибольшее изменение рейтинга за бой
+ELO_K = 32
+
+
+def expected_score(rating, opponent_rating):
+    """Ожидаемый результат игрока (0..1) против соперника по Эло."""
+    return 1 / (1 + 10 ** ((opponent_rating - rating) / 400))
+
+
+def elo_update(rating_a, rating_b, score_a, k=ELO_K):
+    """
+    Рейтинги пары после боя: score_a - 1 (победа A), 0.5 (ничья) или 0 (победа B).
+
+    Изменение округляется до целого, сумма рейтингов пары сохраняется.
+    """
+    delta = round(k * (score_a - expected_score(rating_a, rating_b)))
+    return rating_a + delta, rating_b - delta
+
+
+class RatingIndex:
+    """Игроки, упорядоченные по рейтингу: список пар (рейтинг, user_id) и словарь рейтингов."""
+
+    def __init__(self):
+        self._entries = []  # [(rating, user_id)] по возрастанию
+        self._ratings = {}  # user_id -> rating
+
+    def __len__(self):
+        return len(self._ratings)
+
+    def __contains__(self, user_id):
+        return user_id in self._ratings
+
+    def get(self, user_id, default=None):
+        return self._ratings.get(user_id, default)
+
+    def add(self, user_id, rating):
+        """Добавить игрока или обновить его рейтинг."""
+        self.remove(user_id)
+        self._ratings[user_id] = rating
+        insort(self._entries, (rating, user_id))
+
+    def remove(self, user_id):
+        """Убрать игрока; True, если он был в индексе."""
+        rating = self._ratings.pop(user_id, None)
+        if rating is None:
+            return False
+        del self._entries[bisect_left(self._entries, (rating, user_id))]
+        return True
+
+    def nearest(self, rating, window, exclude=()):
+        """
+        Игрок с ближайшим к rating рейтингом, не дальше window: (user_id, рейтинг) или None.
+
+        Игроки из exclude пропускаются; при равном расстоянии выбирается игрок
+        с меньшим рейтингом.
+        """
+        entries = self._entries
+        right = bisect_left(entries, (rating,))
+        left = right - 1
+        while True:
+            left_gap = rating - entries[left][0] if left >= 0 else None
+            right_gap = entries[right][0] - rating if right < len(entries) else None
+            if left_gap is not None and (right_gap is None or left_gap <= right_gap):
+                if left_gap > window:
+                    return None
+                entry_rating, user_id = entries[left]
+                left -= 1
+            elif right_gap is not None:
+                if right_gap > window:
+                    return None
+                entry_rating, user_id = entries[right]
+                right += 1
+            else:
+                return None
+            if user_id not in exclude:
+                return user_id, entry_rating
+
+
+class ResultBuffer:
+    """
+    Результаты боёв, применяемые пачкой.
+
+    Результаты копятся до истечения окна delay (от первого результата в
+    буфере) или до max_pending и затем уходят в apply одним вызовом. Если
+    запись не удалась, пачка возвращается в начало буфера и повторяется
+    при следующей отправке - порядок боёв сохраняется.
+    """
+
+    def __init__(self, apply, delay=1.0, max_pending=200):
+        self._apply = apply  # async apply([(user_a, user_b, score_a)]) -> [((старый, новый) A, (старый, новый) B)]
+        self.delay = delay
+        self.max_pending = max_pending
+        self._pending = []  # [(результат, future ожидающего или None)]
+        self._timer = None
+        self._lock = asyncio.Lock()
+        self.submitted = 0
+        self.applied = 0
+        self.flushes = 0
+        self.failures = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    async def submit(self, user_a, user_b, score_a):
+        """
+        Добавить результат боя и дождаться его применения.
+
+        Возвращает ((старый, новый) рейтинг A, (старый, новый) рейтинг B).
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(((str(user_a), str(user_b), score_a), future))
+        self.submitted += 1
+        if self.delay <= 0 or len(self._pending) >= self.max_pending:
+            try:
+                await self.flush()
+            except Exception:
+                pass  # ошибка придёт через future
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+        return await asyncio.shield(future)
+
+    async def _flush_later(self):
+        try:
+            await asyncio.sleep(self.delay)
+            self._timer = None
+            await self.flush()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"❌ Ошибка при записи рейтингов: {e}")
+
+    async def flush(self):
+        """Применить все накопленные результаты одной пачкой."""
+        async with self._lock:
+            if self._timer is not None and self._timer is not asyncio.current_task():
+                self._timer.cancel()
+            self._timer = None
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, []
+            try:
+                changes = await self._apply([result for result, _ in pending])
+            except Exception as e:
+                # Пачка повторится перед более новыми результатами; ожидающие получают ошибку
+                self.failures += 1
+                self._pending[:0] = [(result, None) for result, _ in pending]
+                for _, future in pending:
+                    if future is not None and not future.done():
+                        future.set_exception(e)
+                if self._timer is None and self.delay > 0:
+                    self._timer = asyncio.create_task(self._flush_later())
+                raise
+            self.flushes += 1
+            self.applied += len(pending)
+            for (_, future), change in zip(pending, changes):
+                if future is not None and not future.done():
+                    future.set_result(change)
+
+    def stats(self):
+        """Счётчики буфера для мониторинга."""
+        return {
+            "pending": len(self._pending),
+            "submitted": self.submitted,
+            "applied": self.applied,
+            "flushes": self.flushes,
+            "failures": self.failures,
+        }
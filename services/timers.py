@@ -0,0 +1,213 @@
+# services/timers.py
+"""
+Таймеры построек и исследований на отметках времени.
+
+Активный таймер хранит started_at и finish_at (мс от эпохи, как серверное
+время Firebase). Оставшееся время вычисляется при чтении, а завершение
+применяется лениво, когда документ пользователя загружается (см.
+UserDatabase.get_user). Поэтому идущие таймеры не требуют ни опроса, ни
+периодических записей. TimerScheduler дополнительно завершает таймеры
+загруженных пользователей ровно в срок, пока процесс работает.
+
+Для игроков, которые не заходят, идущие таймеры продублированы в глобальном
+индексе timers/{user_id}_{поле} = {user_id, field, finish_at}; sweep_timers.py
+запрашивает из него только истёкшие записи. В правилах Firebase нужен индекс:
+
+    {"rules": {"timers": {".indexOn": ["finish_at"]}}}
+"""
+
+import asyncio
+import heapq
+import time
+
+from spells_config import SPELL_INDEX
+
+# Поля документа с таймерами
+TIMER_FIELDS = ("construction", "research")
+
+# Узел глобального индекса идущих таймеров
+TIMERS_INDEX = "timers"
+
+
+def now_ms():
+    """Текущее время в миллисекундах."""
+    return int(time.time() * 1000)
+
+
+def start_timer(duration_seconds, now=None):
+    """Поля started_at/finish_at для таймера длительностью duration_seconds."""
+    started_at = now_ms() if now is None else now
+    return {
+        "started_at": started_at,
+        "finish_at": started_at + int(duration_seconds * 1000),
+    }
+
+
+def is_running(timer):
+    return bool(timer) and bool(timer.get("active")) and timer.get("finish_at") is not None
+
+
+def seconds_left(timer, now=None):
+    """Сколько секунд осталось до завершения таймера (0, если он не идёт или уже истёк)."""
+    if not is_running(timer):
+        return 0
+    now = now_ms() if now is None else now
+    return max(0, (timer["finish_at"] - now) / 1000)
+
+
+def due_timers(user_data, now=None):
+    """Поля документа, таймеры которых истекли и ждут завершения."""
+    now = now_ms() if now is None else now
+    return [
+        field for field in TIMER_FIELDS
+        if is_running((user_data or {}).get(field)) and user_data[field]["finish_at"] <= now
+    ]
+
+
+def pending_timers(user_data, now=None):
+    """Пары (поле, finish_at) для идущих таймеров, срок которых ещё не наступил."""
+    now = now_ms() if now is None else now
+    return [
+        (field, user_data[field]["finish_at"])
+        for field in TIMER_FIELDS
+        if is_running((user_data or {}).get(field)) and user_data[field]["finish_at"] > now
+    ]
+
+
+def index_path(user_id, field):
+    """Путь записи глобального индекса для таймера field пользователя."""
+    return f"{TIMERS_INDEX}/{user_id}_{field}"
+
+
+def index_entry(user_id, field, timer):
+    """Запись индекса для таймера (None - таймер не идёт, запись удаляется)."""
+    if not is_running(timer):
+        return None
+    return {"user_id": str(user_id), "field": field, "finish_at": timer["finish_at"]}
+
+
+def find_spell(spell_id):
+    """(школа, ступень, данные) заклинания по его ID или None."""
+    return SPELL_INDEX.get(spell_id)
+
+
+def format_duration(seconds):
+    """Человекочитаемая длительность: '2 д 5 ч', '3 ч 10 мин', 'меньше минуты'."""
+    minutes = int(seconds // 60)
+    days, minutes = divmod(minutes, 24 * 60)
+    hours, minutes = divmod(minutes, 60)
+    if days:
+        return f"{days} д {hours} ч" if hours else f"{days} д"
+    if hours:
+        return f"{hours} ч {minutes} мин" if minutes else f"{hours} ч"
+    if minutes:
+        return f"{minutes} мин"
+    return "меньше минуты"
+
+
+class TimerScheduler:
+    """
+    Планировщик завершения таймеров внутри процесса (куча по finish_at).
+
+    Один фоновый таск спит до ближайшего срока и вызывает on_due(user_id).
+    Повторное планирование того же таймера заменяет срок: старые записи
+    кучи просто пропускаются. Пока планировщик не запущен, schedule()
+    ничего не делает - таймеры всё равно завершатся при следующем чтении.
+    """
+
+    # Сон не дольше часа: так сдвиг системных часов не откладывает срабатывание
+    MAX_SLEEP = 3600
+
+    def __init__(self, on_due=None):
+        self.on_due = on_due  # async on_due(user_id)
+        self._heap = []  # (finish_at, (user_id, field))
+        self._deadlines = {}  # (user_id, field) -> finish_at
+        self._wakeup = None
+        self._task = None
+        self._inflight = set()
+        self.fired = 0
+        self.failures = 0
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Запустить фоновый таск (нужен работающий event loop)."""
+        if self.running:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Остановить планировщик и дождаться срабатываний, которые уже начались."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+        self._heap.clear()
+        self._deadlines.clear()
+
+    def schedule(self, user_id, field, finish_at):
+        """Запланировать завершение таймера field пользователя на finish_at (мс)."""
+        if not self.running:
+            return
+        key = (str(user_id), field)
+        if self._deadlines.get(key) == finish_at:
+            return
+        self._deadlines[key] = finish_at
+        heapq.heappush(self._heap, (finish_at, key))
+        if self._heap[0][1] == key:
+            # Новый срок раньше всех остальных - будим таск, чтобы он пересчитал сон
+            self._wakeup.set()
+
+    def cancel(self, user_id, field):
+        self._deadlines.pop((str(user_id), field), None)
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    async def _run(self):
+        while True:
+            while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+                heapq.heappop(self._heap)  # срок заменён или отменён
+
+            delay = None
+            if self._heap:
+                delay = (self._heap[0][0] - now_ms()) / 1000
+            if delay is None or delay > 0:
+                self._wakeup.clear()
+                timeout = self.MAX_SLEEP if delay is None else min(delay, self.MAX_SLEEP)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, key = heapq.heappop(self._heap)
+            del self._deadlines[key]
+            task = asyncio.create_task(self._fire(key[0]))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _fire(self, user_id):
+        try:
+            await self.on_due(user_id)
+            self.fired += 1
+        except Exception as e:
+            self.failures += 1
+            print(f"❌ Ошибка при завершении таймера пользователя {user_id}: {e}")
+
+    def stats(self):
+        """Счётчики планировщика для мониторинга."""
+        return {
+            "running": self.running,
+            "scheduled": len(self._deadlines),
+            "fired": self.fired,
+            "failures": self.failures,
+        }
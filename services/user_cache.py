@@ -0,0 +1,125 @@
+# services/user_cache.py
+"""Кэш документов пользователей (LRU + TTL) с поддержкой write-through."""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from storage.paths import has_server_value, set_path, update_path
+
+
+class UserCache:
+    """
+    Ограниченный LRU-кэш документов пользователей с TTL.
+
+    Все мутаторы UserDatabase пишут в кэш те же изменения, что и в Firebase,
+    поэтому документ в памяти остаётся согласованным со своими записями.
+    Изменения из других процессов учитываются через TTL или инвалидацию
+    (см. database.start_cache_listener).
+    """
+
+    def __init__(self, max_size=1000, ttl=30.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # user_id -> (expires_at, document)
+        self._lock = threading.Lock()  # listen() вызывает колбэки из отдельного потока
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_size > 0 and self.ttl > 0
+
+    def get(self, user_id):
+        """Вернуть копию документа из кэша или None при промахе."""
+        if not self.enabled:
+            return None
+        user_id = str(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, document = entry
+            if expires_at < time.monotonic():
+                del self._entries[user_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return copy.deepcopy(document)
+
+    def put(self, user_id, document):
+        """Положить документ в кэш (пустые документы не кэшируются)."""
+        if not self.enabled or not document:
+            return
+        user_id = str(user_id)
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, copy.deepcopy(document))
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def apply_set(self, user_id, path, value):
+        """Write-through для set(): обновить документ в кэше, если он там есть."""
+        self._apply(user_id, path, value, set_path)
+
+    def apply_update(self, user_id, path, updates):
+        """Write-through для update(): обновить документ в кэше, если он там есть."""
+        self._apply(user_id, path, updates, update_path)
+
+    def _apply(self, user_id, path, value, apply_func):
+        if not self.enabled:
+            return
+        user_id = str(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return
+            if has_server_value(value):
+                # Значение вычисляет сервер - локально его не воспроизвести
+                self._drop(user_id)
+                return
+            expires_at, document = entry
+            try:
+                document = apply_func(document, path, copy.deepcopy(value))
+            except (ValueError, TypeError, AttributeError):
+                # Структура документа не совпала с путём - надёжнее перечитать
+                self._drop(user_id)
+                return
+            if not document:
+                self._drop(user_id)
+                return
+            self._entries[user_id] = (expires_at, document)
+
+    def invalidate(self, user_id):
+        """Удалить документ пользователя из кэша."""
+        with self._lock:
+            self._drop(str(user_id))
+
+    def _drop(self, user_id):
+        if self._entries.pop(user_id, None) is not None:
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Счётчики кэша для мониторинга."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
@@ -0,0 +1,266 @@
+# services/user_codec.py
+"""
+Компактное хранение документа пользователя.
+
+Формат (версия CODEC_VERSION, отметка "_enc" в документе):
+- spells/{школа}/{id}: {name, level, tier}  ->  sp/{школа}: [уровень ступени 1, ..., ступени 5]
+  (0 - не изучено; name и tier берутся из SPELLS_DATA);
+- buildings/{id}: {level, building_id, cell_index}  ->  buildings/{id}: {level}
+  (building_id - это ключ, cell_index находится по buildings_grid);
+- неактивные construction/research не хранятся.
+
+Обработчики и веб-приложение работают с прежней формой документа:
+decode_document() восстанавливает её при чтении, encode_updates() переводит
+пути записи. Декодер понимает и старый формат, и смешанный.
+"""
+
+import copy
+
+from spells_config import SPELL_INDEX, SPELLS_DATA
+from storage.paths import split_path
+
+CODEC_VERSION = 1
+
+# --- Состояния "нет активного процесса" ---
+IDLE_CONSTRUCTION = {
+    "active": False,
+    "building_id": None,
+    "target_level": None,
+    "started_at": None,
+    "finish_at": None,
+    "cell_index": None,
+    "type": None # "build" или "upgrade"
+}
+
+IDLE_RESEARCH = {
+    "active": False,
+    "spell": None,
+    "target_level": None,
+    "started_at": None,
+    "finish_at": None,
+    "faction_bonus": False
+}
+
+TIMER_DEFAULTS = {
+    "construction": IDLE_CONSTRUCTION,
+    "research": IDLE_RESEARCH,
+}
+
+# Поля, которые можно восстановить из конфигурации/сетки и поэтому не храним
+SPELL_DERIVED_KEYS = {"name", "tier"}
+BUILDING_DERIVED_KEYS = {"building_id", "cell_index"}
+
+# Число ступеней - длина упакованного списка уровней школы
+_TIER_COUNT = max(len(tiers) for tiers in SPELLS_DATA.values())
+
+
+def _spell_tier(school, spell_id):
+    found = SPELL_INDEX.get(spell_id)
+    return found[1] if found and found[0] == school else None
+
+
+# --- Чтение ---
+
+def _grid_cells(grid):
+    """Позиции зданий в сетке (Firebase может вернуть разреженный список как словарь)."""
+    if isinstance(grid, list):
+        return {building_id: index for index, building_id in enumerate(grid) if building_id}
+    if isinstance(grid, dict):
+        return {building_id: int(index) for index, building_id in grid.items() if building_id}
+    return {}
+
+
+def decode_document(raw):
+    """Восстановить привычную форму документа из компактной (или смешанной) записи."""
+    if not isinstance(raw, dict):
+        return raw
+    doc = dict(raw)
+    doc.pop("_enc", None)
+
+    packed = doc.pop("sp", None)
+    if packed is not None or "spells" in doc:
+        spells = copy.deepcopy(doc.get("spells") or {})
+        for school, levels in (packed or {}).items():
+            if isinstance(levels, dict):
+                levels = [levels.get(str(i), 0) for i in range(_TIER_COUNT)]
+            school_spells = spells.setdefault(school, {})
+            for tier, spell in SPELLS_DATA.get(school, {}).items():
+                level = (levels[tier - 1] if tier - 1 < len(levels) else 0) or 0
+                # Ненулевой упакованный уровень главнее старой записи того же заклинания;
+                # ноль - ещё не перенесённая старая запись остаётся
+                if level:
+                    school_spells[spell.id] = {"name": spell.name, "level": level, "tier": tier}
+        doc["spells"] = spells
+
+    if isinstance(doc.get("buildings"), dict):
+        cells = _grid_cells(doc.get("buildings_grid"))
+        buildings = {}
+        for building_id, info in doc["buildings"].items():
+            info = dict(info or {})
+            info.setdefault("building_id", building_id)
+            if "cell_index" not in info and building_id in cells:
+                info["cell_index"] = cells[building_id]
+            buildings[building_id] = info
+        doc["buildings"] = buildings
+
+    for field, defaults in TIMER_DEFAULTS.items():
+        doc[field] = {**defaults, **(doc.get(field) or {})}
+    return doc
+
+
+# --- Запись ---
+
+def _is_idle_timer(value):
+    return not value or (isinstance(value, dict) and not value.get("active"))
+
+
+def _pack_school(school, school_spells):
+    """Уровни заклинаний школы по ступеням + заклинания, которые упаковать нельзя."""
+    levels = [0] * _TIER_COUNT
+    leftovers = {}
+    for spell_id, info in (school_spells or {}).items():
+        tier = _spell_tier(school, spell_id)
+        info = info or {}
+        if tier is None or set(info) - SPELL_DERIVED_KEYS - {"level"}:
+            leftovers[spell_id] = info
+        else:
+            levels[tier - 1] = info.get("level", 0) or 0
+    return levels, leftovers
+
+
+def encode_document(doc):
+    """Полная компактная запись документа (для создания пользователя и перекодирования)."""
+    if not isinstance(doc, dict):
+        return doc
+    raw = dict(doc)
+    if "spells" in raw:
+        packed, leftovers = {}, {}
+        for school, school_spells in (raw.pop("spells") or {}).items():
+            if school not in SPELLS_DATA:
+                leftovers[school] = school_spells
+                continue
+            packed[school], school_leftovers = _pack_school(school, school_spells)
+            if school_leftovers:
+                leftovers[school] = school_leftovers
+        raw["sp"] = packed
+        raw["spells"] = leftovers or None
+    if isinstance(raw.get("buildings"), dict):
+        raw["buildings"] = {
+            building_id: {k: v for k, v in (info or {}).items() if k not in BUILDING_DERIVED_KEYS}
+            for building_id, info in raw["buildings"].items()
+        }
+    for field in TIMER_DEFAULTS:
+        if field in raw and _is_idle_timer(raw[field]):
+            raw[field] = None
+    raw["_enc"] = CODEC_VERSION
+    return raw
+
+
+def needs_encoding(raw):
+    """Хранится ли документ (полностью или частично) в старом формате."""
+    if not isinstance(raw, dict):
+        return False
+    if raw.get("_enc") != CODEC_VERSION or raw.get("spells"):
+        return True
+    if any(BUILDING_DERIVED_KEYS & set(info or {}) for info in (raw.get("buildings") or {}).values()):
+        return True
+    return any(field in raw and _is_idle_timer(raw[field]) for field in TIMER_DEFAULTS)
+
+
+def reencode_updates(raw):
+    """Изменения верхнего уровня, переводящие сохранённый документ в компактный формат."""
+    encoded = encode_document(decode_document(raw))
+    updates = {}
+    for field in set(raw) | set(encoded):
+        if encoded.get(field) != raw.get(field):
+            updates[field] = encoded.get(field)
+    return updates
+
+
+def _encode_user_path(parts, value, out):
+    """Перевести одну запись по пути внутри документа пользователя в компактные пути."""
+    if not parts:
+        for key, child in encode_document(value or {}).items():
+            out[key] = child
+        return
+    head = parts[0]
+
+    if head == "spells":
+        if len(parts) == 1:
+            encoded = encode_document({"spells": value or {}})
+            out["sp"] = encoded["sp"] or None
+            out["spells"] = encoded["spells"]
+            return
+        school = parts[1]
+        if school not in SPELLS_DATA:
+            out["/".join(parts)] = value
+            return
+        if len(parts) == 2:
+            levels, leftovers = _pack_school(school, value)
+            out[f"sp/{school}"] = levels
+            out[f"spells/{school}"] = leftovers or None
+            return
+        spell_id = parts[2]
+        tier = _spell_tier(school, spell_id)
+        level_path = f"sp/{school}/{tier - 1}" if tier else None
+        if tier is None:
+            out["/".join(parts)] = value
+        elif len(parts) == 3:
+            info = value or {}
+            if set(info) - SPELL_DERIVED_KEYS - {"level"}:
+                out["/".join(parts)] = value
+            else:
+                out[level_path] = info.get("level", 0) or 0
+        elif parts[3] == "level":
+            out[level_path] = value or 0
+        elif parts[3] not in SPELL_DERIVED_KEYS:
+            out["/".join(parts)] = value
+        return
+
+    if head == "buildings":
+        if len(parts) == 1:
+            out["buildings"] = encode_document({"buildings": value or {}})["buildings"] or None
+        elif len(parts) == 2:
+            info = {k: v for k, v in (value or {}).items() if k not in BUILDING_DERIVED_KEYS}
+            out["/".join(parts)] = info or None
+        elif parts[2] not in BUILDING_DERIVED_KEYS:
+            out["/".join(parts)] = value
+        return
+
+    if head in TIMER_DEFAULTS and len(parts) == 1:
+        out[head] = None if _is_idle_timer(value) else {k: v for k, v in value.items() if v is not None}
+        return
+
+    out["/".join(parts)] = value
+
+
+def encode_updates(updates):
+    """
+    Перевести multi-path изменения (абсолютные пути) в компактный формат.
+
+    Частичное обновление таймера с active=False превращается в удаление узла.
+    """
+    out = {}
+    idle_timers = set()
+    for path, value in updates.items():
+        parts = split_path(path)
+        if len(parts) == 4 and parts[0] == "users" and parts[2] in TIMER_DEFAULTS \
+                and parts[3] == "active" and not value:
+            idle_timers.add(tuple(parts[:3]))
+
+    for path, value in updates.items():
+        parts = split_path(path)
+        if len(parts) < 2 or parts[0] != "users":
+            out[path] = value
+            continue
+        if len(parts) >= 3 and tuple(parts[:3]) in idle_timers:
+            out["/".join(parts[:3])] = None
+            continue
+        user_out = {}
+        _encode_user_path(parts[2:], value, user_out)
+        prefix = f"users/{parts[1]}"
+        for user_path, user_value in user_out.items():
+            out[f"{prefix}/{user_path}"] = user_value
+        if len(parts) == 2:
+            out[f"{prefix}/_enc"] = CODEC_VERSION
+    return out
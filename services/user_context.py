@@ -0,0 +1,52 @@
+# services/user_context.py
+"""Контекст пользователя в рамках одного апдейта (команды бота или API-запроса)."""
+
+from database import UserDatabase, WriteBatch
+
+
+class UserContext:
+    """
+    Снимок документа пользователя, загружаемый один раз на апдейт.
+
+    Обработчик создаёт контекст, а BuildingManager и UserDatabase
+    переиспользуют уже загруженные данные вместо повторного чтения из Firebase.
+    Изменения команды копятся в ctx.batch (туда же при загрузке попадает
+    ежедневный сброс) и фиксируются одним запросом через ctx.commit().
+    """
+
+    def __init__(self, user_id, user_data=None, fields=None):
+        self.user_id = str(user_id)
+        self.fields = fields  # Поля, которые нужны команде (None - весь документ)
+        self._user_data = user_data
+        self._loaded = user_data is not None
+        self.batch = WriteBatch()
+
+    @classmethod
+    async def load(cls, user_id, fields=None):
+        """Создать контекст и сразу загрузить пользователя (в снимке - только нужные поля)."""
+        ctx = cls(user_id, fields=fields)
+        await ctx.get_user()
+        return ctx
+
+    @staticmethod
+    async def resolve(ctx, user_id, fields=None):
+        """Вернуть данные пользователя из контекста или загрузить их (в снимке - только fields), если контекста нет."""
+        if ctx is not None:
+            return await ctx.get_user()
+        return await UserDatabase.get_user(user_id, fields=fields)
+
+    async def get_user(self):
+        """Получить данные пользователя (чтение из Firebase выполняется только один раз)."""
+        if not self._loaded:
+            self._user_data = await UserDatabase.get_user(self.user_id, fields=self.fields, batch=self.batch)
+            self._loaded = True
+        return self._user_data
+
+    async def commit(self):
+        """Зафиксировать изменения команды вместе с отложенными при загрузке."""
+        await self.batch.commit()
+
+    @property
+    def user_data(self):
+        """Загруженный снимок пользователя (None, если пользователь не найден)."""
+        return self._user_data
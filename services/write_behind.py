@@ -0,0 +1,126 @@
+# services/write_behind.py
+"""Отложенная запись (write-behind): частые мелкие изменения сливаются в один multi-path update()."""
+
+import asyncio
+import copy
+import time
+
+from storage.paths import set_path
+
+
+class WriteBehindBuffer:
+    """
+    Буфер изменений path -> value, общий для всех пользователей.
+
+    Изменения копятся до истечения окна delay (отсчитывается от первого
+    изменения в буфере) или до max_pending путей и затем уходят одним запросом.
+    Повторные записи одного пути схлопываются - в хранилище попадает только
+    последнее значение. Если запись не удалась, изменения возвращаются в
+    буфер и отправка повторяется через delay.
+    """
+
+    def __init__(self, writer, batch_factory, delay=0.5, max_pending=500):
+        self._writer = writer                # async writer(updates) - запись в хранилище
+        self._batch_factory = batch_factory  # WriteBatch: слияние вложенных путей
+        self.delay = delay
+        self.max_pending = max_pending
+        self._pending = batch_factory()
+        self._timer = None
+        self._lock = asyncio.Lock()
+        self.submitted = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.failures = 0
+        self.last_flush_ms = 0.0
+
+    @property
+    def enabled(self):
+        return self.delay > 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    async def submit(self, batch, flush=False):
+        """
+        Добавить изменения batch в буфер.
+
+        flush=True сразу отправляет всё накопленное вместе с batch: так
+        структурные операции не обгоняют отложенные записи тех же путей.
+        """
+        updates = batch.updates
+        for path, value in updates.items():
+            self._pending.set(path, copy.deepcopy(value))
+        self.submitted += len(updates)
+
+        if flush or len(self._pending) >= self.max_pending:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        try:
+            await asyncio.sleep(self.delay)
+            self._timer = None
+            await self.flush()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"❌ Ошибка при отправке отложенных изменений: {e}")
+
+    async def flush(self):
+        """Отправить все накопленные изменения одним запросом."""
+        async with self._lock:
+            if self._timer is not None and self._timer is not asyncio.current_task():
+                self._timer.cancel()
+            self._timer = None
+            if not len(self._pending):
+                return
+            updates = self._pending.updates
+            self._pending = self._batch_factory()
+            started = time.perf_counter()
+            try:
+                await self._writer(updates)
+            except Exception:
+                # Возвращаем изменения в буфер под более новыми, чтобы их не потерять
+                self.failures += 1
+                newer = self._pending.updates
+                self._pending = self._batch_factory()
+                for path, value in list(updates.items()) + list(newer.items()):
+                    self._pending.set(path, value)
+                if self._timer is None and self.enabled:
+                    self._timer = asyncio.create_task(self._flush_later())
+                raise
+            self.flushes += 1
+            self.flushed += len(updates)
+            self.last_flush_ms = round((time.perf_counter() - started) * 1000, 2)
+
+    def pending_for_user(self, user_id):
+        """Отложенные изменения пользователя: {путь внутри документа: значение}."""
+        prefix = f"users/{user_id}"
+        result = {}
+        for path, value in self._pending.updates.items():
+            if path == prefix or path.startswith(prefix + "/"):
+                result[path[len(prefix) + 1:]] = value
+        return result
+
+    def overlay(self, user_id, user_data):
+        """Наложить отложенные изменения на прочитанный документ (read-your-writes)."""
+        pending = self.pending_for_user(user_id)
+        if not pending:
+            return user_data
+        for path, value in pending.items():
+            user_data = set_path(user_data if user_data is not None else {}, path, copy.deepcopy(value))
+        return user_data
+
+    def stats(self):
+        """Счётчики буфера для мониторинга."""
+        return {
+            "enabled": self.enabled,
+            "pending": len(self._pending),
+            "submitted": self.submitted,
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "failures": self.failures,
+            "coalesced": self.submitted - self.flushed - len(self._pending),
+            "last_flush_ms": self.last_flush_ms,
+        }
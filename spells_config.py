@@ -1,12 +1,23 @@
 # spells_config.py
 """Конфигурация заклинаний для Academy of Elements."""
 
+from types import MappingProxyType
+
+from config_records import ConfigRecord, freeze
+
 # --- Базовые параметры ---
 # Базовый урон заклинания 1 уровня
 BASE_SPELL_DAMAGE = 20
 # Бонус урона за уровень (в процентах)
 DAMAGE_PER_LEVEL_PERCENT = 20
 
+# --- Эффекты в бою ---
+# "battle_effect" заклинания - параметры эффекта для боевого движка (battle/effects.py):
+# type - вид эффекта, turns - длительность в раундах, power - сила, chance - шанс наложения.
+# power: burn - доля урона удара за раунд, blind - снижение урона, accuracy - шанс промаха,
+# slow - шанс пропустить атаку, defense_down - рост получаемого урона,
+# lifesteal - доля нанесённого урона, которая лечит заклинателя.
+
 # --- Данные о школах магии ---
 SCHOOLS_DATA = {
     "fire": {
@@ -74,7 +85,8 @@ SPELLS_DATA = {
             "base_damage": BASE_SPELL_DAMAGE,
             "effects": {
                 "burn": "Накладывает эффект горения на 3 хода, наносящий урон каждый ход."
-            }
+            },
+            "battle_effect": {"type": "burn", "turns": 3, "power": 0.2}
         }
     },
     "water": {
@@ -113,7 +125,8 @@ SPELLS_DATA = {
             "base_damage": BASE_SPELL_DAMAGE,
             "effects": {
                 "slow": "Замедляет цель на 2 хода, снижая её скорость атаки."
-            }
+            },
+            "battle_effect": {"type": "slow", "turns": 2, "power": 0.5}
         }
     },
     "wind": {
@@ -152,7 +165,8 @@ SPELLS_DATA = {
             "base_damage": BASE_SPELL_DAMAGE,
             "effects": {
                 "stun": "Оглушает цель на 1 ход, полностью лишая возможности действовать."
-            }
+            },
+            "battle_effect": {"type": "stun", "turns": 1, "chance": 0.3}
         }
     },
     "earth": {
@@ -191,7 +205,8 @@ SPELLS_DATA = {
             "base_damage": BASE_SPELL_DAMAGE,
             "effects": {
                 "defense_down": "Снижает защиту всех врагов на 20% на 2 хода."
-            }
+            },
+            "battle_effect": {"type": "defense_down", "turns": 2, "power": 0.2}
         }
     }
 }
@@ -207,7 +222,8 @@ HYBRID_SPELLS_DATA = {
         "base_damage": BASE_SPELL_DAMAGE,
         "effects": {
             "level_5": "Наносит урон по области и снижает точность цели на 15% на 2 хода."
-        }
+        },
+        "battle_effect": {"type": "accuracy", "turns": 2, "power": 0.15}
     },
     frozenset(["fire", "wind"]): {
         "id": "firestorm",
@@ -216,7 +232,8 @@ HYBRID_SPELLS_DATA = {
         "base_damage": BASE_SPELL_DAMAGE,
         "effects": {
             "level_5": "Наносит урон по области и отбрасывает цель назад на 1 клетку."
-        }
+        },
+        "battle_effect": {"type": "knockback", "turns": 1, "chance": 0.3}
     },
     frozenset(["fire", "earth"]): {
         "id": "magma",
@@ -225,7 +242,8 @@ HYBRID_SPELLS_DATA = {
         "base_damage": BASE_SPELL_DAMAGE,
         "effects": {
             "level_5": "Наносит урон и накладывает эффект 'горение' на 4 хода."
-        }
+        },
+        "battle_effect": {"type": "burn", "turns": 4, "power": 0.2}
     },
     frozenset(["water", "wind"]): {
         "id": "ice_storm",
@@ -234,7 +252,8 @@ HYBRID_SPELLS_DATA = {
         "base_damage": BASE_SPELL_DAMAGE,
         "effects": {
             "level_5": "Наносит урон по области и замораживает цель на 1 ход (20% шанс)."
-        }
+        },
+        "battle_effect": {"type": "freeze", "turns": 1, "chance": 0.2}
     },
     frozenset(["water", "earth"]): {
         "id": "geyser",
@@ -243,7 +262,8 @@ HYBRID_SPELLS_DATA = {
         "base_damage": BASE_SPELL_DAMAGE,
         "effects": {
             "level_5": "Наносит урон и лечит заклинателя на 30% от нанесённого урона."
-        }
+        },
+        "battle_effect": {"type": "lifesteal", "power": 0.3}
     },
     frozenset(["wind", "earth"]): {
         "id": "dust_devil",
@@ -252,21 +272,85 @@ HYBRID_SPELLS_DATA = {
         "base_damage": BASE_SPELL_DAMAGE,
         "effects": {
             "level_5": "Наносит урон и ослепляет цель на 2 хода (снижает урон на 25%)."
-        }
+        },
+        "battle_effect": {"type": "blind", "turns": 2, "power": 0.25}
     }
     # ... (остальные 24 комбинации можно добавить аналогично)
 }
 
+# --- Компиляция ---
+# При импорте словари выше проверяются и заменяются неизменяемыми записями
+# Spell, а для поиска строятся индексы - любой запрос заклинания по ID или
+# паре школ - одно обращение к словарю.
+
+class Spell(ConfigRecord):
+    """Заклинание. school и tier - место в SPELLS_DATA (у гибрида - None), schools - школы заклинания."""
+
+    __slots__ = ("id", "name", "description", "base_damage", "effects", "battle_effect",
+                 "school", "tier", "schools")
+    REQUIRED = ("id", "name", "base_damage")
+
+
+def _compile_spells():
+    """Проверить конфигурацию и построить записи и индексы (один раз при импорте)."""
+    spells, hybrids, index, by_id, by_pair = {}, {}, {}, {}, {}
+
+    def register(spell, where):
+        if spell.id in by_id:
+            raise ValueError(f"❌ {where}: ID заклинания '{spell.id}' уже занят")
+        by_id[spell.id] = spell
+
+    for school, tiers in SPELLS_DATA.items():
+        if school not in SCHOOLS_DATA:
+            raise ValueError(f"❌ SPELLS_DATA: неизвестная школа '{school}'")
+        if sorted(tiers) != list(range(1, len(tiers) + 1)):
+            raise ValueError(f"❌ SPELLS_DATA[{school}]: ступени должны идти подряд с 1")
+        spells[school] = {}
+        for tier, data in tiers.items():
+            where = f"SPELLS_DATA[{school}][{tier}]"
+            spell = Spell.from_dict(data, where, school=school, tier=tier, schools=frozenset((school,)))
+            register(spell, where)
+            spells[school][tier] = spell
+            index[spell.id] = (school, tier, spell)
+
+    for pair, data in HYBRID_SPELLS_DATA.items():
+        where = f"HYBRID_SPELLS_DATA[{'+'.join(sorted(pair))}]"
+        if len(pair) != 2 or not pair <= SCHOOLS_DATA.keys():
+            raise ValueError(f"❌ {where}: ключ - пара разных известных школ")
+        spell = Spell.from_dict(data, where, schools=pair)
+        register(spell, where)
+        hybrids[pair] = spell
+        first, second = pair
+        by_pair[first, second] = by_pair[second, first] = spell
+
+    return (
+        MappingProxyType({school: MappingProxyType(tiers) for school, tiers in spells.items()}),
+        MappingProxyType(hybrids),
+        MappingProxyType(index),
+        MappingProxyType(by_id),
+        MappingProxyType(by_pair),
+    )
+
+
+SCHOOLS_DATA = freeze(SCHOOLS_DATA)
+# school -> tier -> Spell и frozenset пары школ -> Spell (гибрид)
+# spell_id -> (school, tier, Spell) для заклинаний школ; spell_id -> Spell для всех, включая гибриды
+SPELLS_DATA, HYBRID_SPELLS_DATA, SPELL_INDEX, SPELLS_BY_ID, _HYBRIDS_BY_PAIR = _compile_spells()
+
 # --- Вспомогательные функции ---
 
 def get_spell_info(faction, tier):
     """Получить информацию о заклинании по школе и ступени."""
     return SPELLS_DATA.get(faction, {}).get(tier, {})
 
+def find_spell(spell_id):
+    """(школа, ступень, Spell) заклинания школы по его ID или None."""
+    return SPELL_INDEX.get(spell_id)
+
 def get_hybrid_spell_info(schools_pair):
     """Получить информацию о гибридном заклинании по паре школ."""
-    # frozenset делает порядок школ незначимым
-    return HYBRID_SPELLS_DATA.get(frozenset(schools_pair), {})
+    # В индексе есть оба порядка школ - порядок незначим без построения frozenset
+    return _HYBRIDS_BY_PAIR.get(tuple(schools_pair), {})
 
 def calculate_damage(base_damage, level):
     """Рассчитывает урон заклинания на заданном уровне."""
@@ -0,0 +1,26 @@
+# storage/__init__.py
+"""Хранилища данных игры. Реализация выбирается переменной окружения STORAGE_BACKEND."""
+
+import os
+
+from storage.base import StorageBackend
+
+
+def create_backend(name=None):
+    """
+    Создать хранилище по имени: firebase (по умолчанию), memory или sqlite.
+
+    Firebase подключается только если выбран, поэтому memory/sqlite
+    работают без учётных данных и сети.
+    """
+    name = (name or os.getenv("STORAGE_BACKEND", "firebase")).lower()
+    if name == "firebase":
+        from storage.firebase_backend import FirebaseBackend
+        return FirebaseBackend()
+    if name == "memory":
+        from storage.memory_backend import MemoryBackend
+        return MemoryBackend()
+    if name == "sqlite":
+        from storage.sqlite_backend import SQLiteBackend
+        return SQLiteBackend(os.getenv("SQLITE_PATH", "academy.sqlite3"))
+    raise ValueError(f"❌ Неизвестное хранилище STORAGE_BACKEND='{name}' (firebase, memory, sqlite)")
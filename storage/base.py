@@ -0,0 +1,55 @@
+# storage/base.py
+"""Интерфейс хранилища, на котором работает UserDatabase."""
+
+
+class StorageBackend:
+    """
+    Хранилище JSON-дерева с путями в стиле Firebase Realtime Database.
+
+    Все методы синхронные. UserDatabase вызывает методы блокирующих
+    хранилищ (blocking = True) в пуле потоков, остальные - напрямую.
+    """
+
+    name = "base"
+    blocking = True
+
+    def get(self, path, shallow=False):
+        """Прочитать узел. shallow=True возвращает только ключи ({key: True})."""
+        raise NotImplementedError
+
+    def set(self, path, value):
+        """Записать узел целиком (None удаляет узел)."""
+        raise NotImplementedError
+
+    def update(self, path, updates):
+        """Атомарно записать несколько путей, заданных относительно path."""
+        raise NotImplementedError
+
+    def transaction(self, path, func):
+        """Атомарно заменить значение узла на func(текущее значение) и вернуть новое значение."""
+        raise NotImplementedError
+
+    def query_by_key(self, path, start_at=None, limit=None):
+        """
+        Дочерние узлы path в порядке ключей, начиная с start_at (включительно).
+        Порядок как у orderByKey в Firebase (см. paths.key_order).
+
+        Возвращает список пар (key, value) длиной не больше limit.
+        """
+        raise NotImplementedError
+
+    def query_by_child(self, path, child, end_at=None, limit=None):
+        """
+        Дочерние узлы path в порядке значения поля child, не больше end_at (включительно).
+
+        Узлы без поля child пропускаются. Возвращает список пар (key, value)
+        длиной не больше limit. В Firebase для child нужен .indexOn в правилах.
+        """
+        raise NotImplementedError
+
+    def listen(self, path, callback):
+        """Подписаться на изменения узла; возвращает объект с методом close()."""
+        raise NotImplementedError(f"Хранилище '{self.name}' не поддерживает подписку на изменения")
+
+    def close(self):
+        """Освободить ресурсы хранилища."""
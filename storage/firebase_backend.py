@@ -0,0 +1,64 @@
+# storage/firebase_backend.py
+"""Хранилище на Firebase Realtime Database (production)."""
+
+import os
+
+import firebase_admin
+from firebase_admin import credentials, db
+
+from storage.base import StorageBackend
+
+DEFAULT_DATABASE_URL = 'https://academy-of-elements-default-rtdb.europe-west1.firebasedatabase.app/'
+
+
+class FirebaseBackend(StorageBackend):
+    """Обёртка над firebase_admin.db; каждый вызов - блокирующий HTTPS-запрос."""
+
+    name = "firebase"
+    blocking = True
+
+    def __init__(self, credentials_path=None, database_url=None):
+        credentials_path = credentials_path or os.getenv("FIREBASE_CREDENTIALS_PATH")
+        if not credentials_path:
+            raise Exception("❌ FIREBASE_CREDENTIALS_PATH не найден в .env")
+
+        # Инициализация Firebase Admin SDK
+        try:
+            cred = credentials.Certificate(credentials_path)
+            firebase_admin.initialize_app(cred, {
+                'databaseURL': database_url or os.getenv("FIREBASE_DATABASE_URL", DEFAULT_DATABASE_URL)
+            })
+            print("✅ Подключение к Firebase инициализировано")
+        except Exception as e:
+            raise Exception(f"❌ Ошибка инициализации Firebase: {e}")
+
+    def get(self, path, shallow=False):
+        return db.reference(path or '/').get(shallow=shallow)
+
+    def set(self, path, value):
+        db.reference(path or '/').set(value)
+
+    def update(self, path, updates):
+        db.reference(path or '/').update(updates)
+
+    def transaction(self, path, func):
+        return db.reference(path or '/').transaction(func)
+
+    def query_by_key(self, path, start_at=None, limit=None):
+        query = db.reference(path or '/').order_by_key()
+        if start_at is not None:
+            query = query.start_at(str(start_at))
+        if limit is not None:
+            query = query.limit_to_first(limit)
+        return list((query.get() or {}).items())
+
+    def query_by_child(self, path, child, end_at=None, limit=None):
+        query = db.reference(path or '/').order_by_child(child)
+        if end_at is not None:
+            query = query.end_at(end_at)
+        if limit is not None:
+            query = query.limit_to_first(limit)
+        return list((query.get() or {}).items())
+
+    def listen(self, path, callback):
+        return db.reference(path or '/').listen(callback)
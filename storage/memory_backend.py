@@ -0,0 +1,89 @@
+# storage/memory_backend.py
+"""Хранилище в памяти процесса - для локального запуска, тестов и бенчмарков."""
+
+import copy
+import heapq
+import threading
+
+from storage.base import StorageBackend
+from storage.paths import get_path, join_path, key_order, prune, resolve_server_values, set_path, split_path
+
+
+class MemoryBackend(StorageBackend):
+    """
+    Дерево словарей в памяти с той же семантикой путей, что и у Firebase:
+    None удаляет узел, пустые узлы не хранятся, {'.sv': 'timestamp'} заменяется временем.
+    """
+
+    name = "memory"
+    blocking = False
+
+    def __init__(self, data=None):
+        self._root = prune(copy.deepcopy(data)) or {}
+        self._lock = threading.RLock()
+
+    def get(self, path, shallow=False):
+        with self._lock:
+            value = get_path(self._root, path)
+            if shallow and isinstance(value, dict):
+                return {key: True for key in value}
+            if shallow and isinstance(value, list):
+                return {str(i): True for i, child in enumerate(value) if child is not None}
+            return copy.deepcopy(value)
+
+    def _write(self, path, value):
+        value = prune(resolve_server_values(copy.deepcopy(value)))
+        self._root = set_path(self._root, path, value) or {}
+        if value is None:
+            self._drop_empty_parents(split_path(path))
+
+    def _drop_empty_parents(self, parts):
+        """Удалить опустевшие родительские узлы (Firebase не хранит пустые узлы)."""
+        for depth in range(len(parts) - 1, 0, -1):
+            parent = get_path(self._root, "/".join(parts[:depth]))
+            if parent is None or (isinstance(parent, dict) and parent) or (
+                isinstance(parent, list) and any(child is not None for child in parent)
+            ):
+                return
+            self._root = set_path(self._root, "/".join(parts[:depth]), None) or {}
+
+    def set(self, path, value):
+        with self._lock:
+            self._write(path, value)
+
+    def update(self, path, updates):
+        with self._lock:
+            for key, value in updates.items():
+                self._write(join_path(path, key), value)
+
+    def query_by_key(self, path, start_at=None, limit=None):
+        with self._lock:
+            node = get_path(self._root, path)
+            if not isinstance(node, dict):
+                return []
+            lower = key_order(start_at) if start_at is not None else None
+            keys = (key for key in node if lower is None or key_order(key) >= lower)
+            keys = (
+                heapq.nsmallest(limit, keys, key=key_order) if limit is not None
+                else sorted(keys, key=key_order)
+            )
+            return [(key, copy.deepcopy(node[key])) for key in keys]
+
+    def query_by_child(self, path, child, end_at=None, limit=None):
+        with self._lock:
+            node = get_path(self._root, path)
+            if not isinstance(node, dict):
+                return []
+            entries = (
+                (value[child], key) for key, value in node.items()
+                if isinstance(value, dict) and value.get(child) is not None
+                and (end_at is None or value[child] <= end_at)
+            )
+            entries = heapq.nsmallest(limit, entries) if limit is not None else sorted(entries)
+            return [(key, copy.deepcopy(node[key])) for _, key in entries]
+
+    def transaction(self, path, func):
+        with self._lock:
+            value = func(copy.deepcopy(get_path(self._root, path)))
+            self._write(path, value)
+            return copy.deepcopy(value)
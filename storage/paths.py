@@ -0,0 +1,134 @@
+# storage/paths.py
+"""Операции с путями в JSON-дереве с семантикой Firebase Realtime Database."""
+
+import re
+import time
+
+# Ключ, который Firebase считает числом: 32-битное целое без ведущих нулей
+_INTEGER_KEY = re.compile(r"-?(0|[1-9][0-9]*)")
+_INT32_MIN, _INT32_MAX = -2 ** 31, 2 ** 31 - 1
+
+
+def split_path(path):
+    """Разбить путь вида 'users/1/buildings/library' на части."""
+    return [part for part in str(path).split("/") if part]
+
+
+def join_path(*parts):
+    """Собрать путь из частей, пропуская пустые."""
+    return "/".join(str(part).strip("/") for part in parts if str(part).strip("/"))
+
+
+def key_order(key):
+    """
+    Ключ сортировки для orderByKey, как в Firebase: сначала ключи-числа
+    по возрастанию значения, затем остальные ключи как строки.
+    """
+    key = str(key)
+    if _INTEGER_KEY.fullmatch(key) and _INT32_MIN <= int(key) <= _INT32_MAX:
+        return (0, int(key), "")
+    return (1, 0, key)
+
+
+def _child(container, key):
+    """Получить дочерний узел словаря или списка по ключу пути."""
+    if isinstance(container, list):
+        if not str(key).isdigit():
+            return None
+        index = int(key)
+        return container[index] if index < len(container) else None
+    if isinstance(container, dict):
+        return container.get(key)
+    return None
+
+
+def _assign(container, key, value):
+    """Записать значение в словарь или список с семантикой Firebase (None удаляет)."""
+    if isinstance(container, list):
+        index = int(key)
+        if index >= len(container):
+            container.extend([None] * (index + 1 - len(container)))
+        container[index] = value
+    elif value is None:
+        container.pop(key, None)
+    else:
+        container[key] = value
+
+
+def get_path(doc, path):
+    """Прочитать значение по пути (None, если узла нет)."""
+    node = doc
+    for part in split_path(path):
+        node = _child(node, part)
+        if node is None:
+            return None
+    return node
+
+
+def set_path(doc, path, value):
+    """
+    Применить set() по пути к документу в памяти.
+
+    Возвращает обновлённый документ (корень может смениться, если путь пустой).
+    """
+    parts = split_path(path)
+    if not parts:
+        return value
+    if not isinstance(doc, (dict, list)):
+        doc = {}
+    node = doc
+    for part in parts[:-1]:
+        child = _child(node, part)
+        if not isinstance(child, (dict, list)):
+            child = {}
+            _assign(node, part, child)
+        node = child
+    _assign(node, parts[-1], value)
+    return doc
+
+
+def update_path(doc, path, updates):
+    """Применить update() по пути (обновляются только переданные ключи)."""
+    for key, value in updates.items():
+        doc = set_path(doc, join_path(path, key), value)
+    return doc
+
+
+def has_server_value(value):
+    """Проверить, содержит ли значение серверные плейсхолдеры Firebase ({'.sv': ...})."""
+    if isinstance(value, dict):
+        return ".sv" in value or any(has_server_value(v) for v in value.values())
+    if isinstance(value, list):
+        return any(has_server_value(v) for v in value)
+    return False
+
+
+def resolve_server_values(value, now_ms=None):
+    """Заменить {'.sv': 'timestamp'} на текущее время в миллисекундах, как это делает сервер."""
+    if isinstance(value, dict):
+        if value.get(".sv") == "timestamp":
+            return int(time.time() * 1000) if now_ms is None else now_ms
+        return {k: resolve_server_values(v, now_ms) for k, v in value.items()}
+    if isinstance(value, list):
+        return [resolve_server_values(v, now_ms) for v in value]
+    return value
+
+
+def prune(value):
+    """
+    Нормализовать значение так, как его хранит Firebase.
+
+    null-поля и пустые словари не хранятся; None внутри списков сохраняется,
+    чтобы индексы ячеек (например, buildings_grid) не сдвигались.
+    """
+    if isinstance(value, dict):
+        result = {}
+        for key, child in value.items():
+            child = prune(child)
+            if child is not None:
+                result[str(key)] = child
+        return result or None
+    if isinstance(value, list):
+        result = [prune(child) for child in value]
+        return result if any(child is not None for child in result) else None
+    return value
@@ -0,0 +1,221 @@
+# storage/sqlite_backend.py
+"""Хранилище на SQLite: документы второго уровня (например, users/{id}) хранятся как JSON."""
+
+import json
+import re
+import sqlite3
+import threading
+
+from storage.base import StorageBackend
+from storage.paths import get_path, join_path, key_order, prune, resolve_server_values, set_path, split_path
+
+
+def _document_order(key):
+    """
+    Ключ сортировки документа 'узел/ключ': по узлу, внутри узла - как orderByKey.
+    Пустой ключ ('users/') идёт раньше всех документов узла - это нижняя граница.
+    """
+    collection, _, child = key.partition("/")
+    return (collection, key_order(child) if child else (-1,))
+
+
+def _compare_documents(left, right):
+    """Функция сравнения для collation firebase_key."""
+    left, right = _document_order(left), _document_order(right)
+    return (left > right) - (left < right)
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    JSON-хранилище в одном файле SQLite.
+
+    Каждый узел второго уровня (users/123, timers/...) - отдельная строка,
+    поэтому чтение и запись пользователя не затрагивают остальных.
+    Запросы к корню или узлу первого уровня собираются из строк с этим префиксом.
+    """
+
+    name = "sqlite"
+    blocking = True
+
+    def __init__(self, path="academy.sqlite3"):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        # Порядок orderByKey для query_by_key; индекс с этой collation нужен,
+        # чтобы страница читалась без сортировки всего узла
+        self._conn.create_collation("firebase_key", _compare_documents)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS documents_by_firebase_key "
+            "ON documents (key COLLATE firebase_key)"
+        )
+        self._lock = threading.RLock()
+        self._child_indexes = set()
+
+    # --- Работа с документами ---
+    def _load(self, key):
+        row = self._conn.execute("SELECT value FROM documents WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _store(self, key, value):
+        value = prune(value)
+        if value is None:
+            self._conn.execute("DELETE FROM documents WHERE key = ?", (key,))
+        else:
+            self._conn.execute(
+                "INSERT INTO documents (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, json.dumps(value, ensure_ascii=False, separators=(",", ":")))
+            )
+
+    def _load_prefix(self, prefix):
+        """Собрать дерево из всех документов, ключ которых начинается с prefix."""
+        tree = {}
+        if prefix:
+            rows = self._conn.execute(
+                "SELECT key, value FROM documents WHERE key >= ? AND key < ? ORDER BY key",
+                (prefix + "/", prefix + "0")  # '0' следует сразу за '/' в ASCII
+            )
+        else:
+            rows = self._conn.execute("SELECT key, value FROM documents ORDER BY key")
+        for key, value in rows:
+            tree = set_path(tree, key, json.loads(value))
+        return get_path(tree, prefix) if prefix else tree or None
+
+    def _read(self, parts):
+        if len(parts) >= 2:
+            return get_path(self._load("/".join(parts[:2])), "/".join(parts[2:]))
+        return self._load_prefix("/".join(parts))
+
+    def _write(self, parts, value):
+        value = resolve_server_values(value)
+        if len(parts) >= 2:
+            key = "/".join(parts[:2])
+            self._store(key, set_path(self._load(key), "/".join(parts[2:]), value))
+            return
+        # Запись в корень или узел первого уровня заменяет все документы под ним
+        prefix = "/".join(parts)
+        if prefix:
+            self._conn.execute(
+                "DELETE FROM documents WHERE key >= ? AND key < ?", (prefix + "/", prefix + "0")
+            )
+        else:
+            self._conn.execute("DELETE FROM documents")
+        for child_key, child in (value or {}).items():
+            self._write(parts + [str(child_key)], child)
+
+    # --- Интерфейс StorageBackend ---
+    def get(self, path, shallow=False):
+        with self._lock:
+            value = self._read(split_path(path))
+        if shallow and isinstance(value, dict):
+            return {key: True for key in value}
+        return value
+
+    def set(self, path, value):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._write(split_path(path), value)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def update(self, path, updates):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for key, value in updates.items():
+                    self._write(split_path(join_path(path, key)), value)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def query_by_key(self, path, start_at=None, limit=None):
+        parts = split_path(path)
+        if len(parts) != 1:
+            # Дочерние узлы внутри документа: сортируем в памяти
+            node = self.get(path)
+            if not isinstance(node, dict):
+                return []
+            lower = key_order(start_at) if start_at is not None else None
+            keys = sorted((key for key in node if lower is None or key_order(key) >= lower), key=key_order)
+            return [(key, node[key]) for key in keys[:limit]]
+        prefix = parts[0] + "/"
+        lower = prefix + str(start_at) if start_at is not None else prefix
+        # Границы по collation ведут поиск по индексу, бинарные - отсекают другие узлы
+        sql = (
+            "SELECT key, value FROM documents "
+            "WHERE key COLLATE firebase_key >= ? AND key COLLATE firebase_key < ? "
+            "AND key >= ? AND key < ? ORDER BY key COLLATE firebase_key"
+        )
+        params = [lower, parts[0] + "0", prefix, parts[0] + "0"]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [(key[len(prefix):], json.loads(value)) for key, value in rows]
+
+    def _ensure_child_index(self, child):
+        """Индекс по выражению json_extract(value, '$.child') - аналог .indexOn в Firebase."""
+        if child in self._child_indexes:
+            return
+        self._conn.execute(
+            f"CREATE INDEX IF NOT EXISTS documents_by_{child} "
+            f"ON documents (json_extract(value, '$.{child}'))"
+        )
+        self._child_indexes.add(child)
+
+    def query_by_child(self, path, child, end_at=None, limit=None):
+        parts = split_path(path)
+        if len(parts) != 1:
+            # Дочерние узлы внутри документа: сортируем в памяти
+            node = self.get(path)
+            if not isinstance(node, dict):
+                return []
+            entries = sorted(
+                (value[child], key) for key, value in node.items()
+                if isinstance(value, dict) and value.get(child) is not None
+                and (end_at is None or value[child] <= end_at)
+            )
+            return [(key, node[key]) for _, key in entries[:limit]]
+        if not re.fullmatch(r"\w+", child):
+            raise ValueError(f"Недопустимое имя поля для запроса: {child}")
+        # Выражение совпадает с индексом дословно, иначе SQLite его не использует
+        expression = f"json_extract(value, '$.{child}')"
+        prefix = parts[0] + "/"
+        sql = f"SELECT key, value FROM documents WHERE key >= ? AND key < ? AND {expression} IS NOT NULL"
+        params = [prefix, parts[0] + "0"]
+        if end_at is not None:
+            sql += f" AND {expression} <= ?"
+            params.append(end_at)
+        sql += f" ORDER BY {expression}, key"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            self._ensure_child_index(child)
+            rows = self._conn.execute(sql, params).fetchall()
+        return [(key[len(prefix):], json.loads(value)) for key, value in rows]
+
+    def transaction(self, path, func):
+        parts = split_path(path)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                value = func(self._read(parts))
+                self._write(parts, value)
+                self._conn.execute("COMMIT")
+                return value
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
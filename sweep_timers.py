@@ -0,0 +1,170 @@
+# sweep_timers.py
+"""
+Завершение истёкших таймеров построек и исследований у всех игроков.
+
+Пример:
+    python sweep_timers.py --page-size 200 --timers-per-commit 50
+    python sweep_timers.py --loop 60       # повторять каждые 60 секунд
+    python sweep_timers.py --reindex       # заполнить индекс timers/ по документам
+
+Вместо обхода users/ запрашивается глобальный индекс timers/ по finish_at
+(order_by_child('finish_at').end_at(now)) страницами, поэтому стоимость
+прохода пропорциональна числу истёкших таймеров, а не числу игроков.
+Завершения пишутся пакетами multi-path update(). Активные игроки обычно
+завершают свои таймеры раньше - при чтении документа (см. UserDatabase.get_user).
+"""
+
+import argparse
+import asyncio
+import time
+
+from database import UserDatabase, WriteBatch, flush_pending_writes, run_blocking, storage
+from services import timers
+from services.migrations import upgrade_user
+
+
+class TimerSweeper:
+    """Постраничное завершение истёкших таймеров по индексу timers/."""
+
+    def __init__(self, page_size=200, timers_per_commit=50, concurrency=8, notify=None):
+        self.page_size = page_size
+        self.timers_per_commit = timers_per_commit
+        self.concurrency = concurrency
+        self.notify = notify  # async notify(user_id, field, timer) после записи завершения
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.scanned = 0
+        self.completed = 0
+        self.stale = 0
+
+    async def _read_timer(self, user_id, field):
+        async with self._semaphore:
+            return await run_blocking(storage.get, f'users/{user_id}/{field}')
+
+    async def _complete(self, entries, now):
+        """Завершить пакет записей индекса одним update(); устаревшие записи исправить."""
+        timers_data = await asyncio.gather(*(
+            self._read_timer(entry["user_id"], entry["field"]) for _, entry in entries
+        ))
+        batch, completed = WriteBatch(), []
+        for (key, entry), timer in zip(entries, timers_data):
+            user_id, field = entry.get("user_id"), entry.get("field")
+            if not user_id or field not in timers.TIMER_FIELDS:
+                batch.set(f"{timers.TIMERS_INDEX}/{key}", None)
+                self.stale += 1
+            elif timers.is_running(timer) and timer["finish_at"] <= now:
+                if field == "construction":
+                    await UserDatabase.finish_construction(
+                        user_id, timer.get("building_id"), timer.get("target_level"),
+                        timer.get("cell_index"), batch=batch, completed_at=timer["finish_at"]
+                    )
+                else:
+                    await UserDatabase.finish_research(user_id, timer, batch=batch)
+                completed.append((user_id, field, timer))
+            else:
+                # Таймер уже завершён, отменён или перенесён - приводим индекс к документу
+                batch.set(timers.index_path(user_id, field), timers.index_entry(user_id, field, timer))
+                self.stale += 1
+        await batch.commit()
+        self.completed += len(completed)
+        if self.notify is not None:
+            for user_id, field, timer in completed:
+                try:
+                    await self.notify(user_id, field, timer)
+                except Exception as e:
+                    print(f"❌ Ошибка уведомления о завершении таймера: {e}")
+
+    async def sweep(self, now=None):
+        """
+        Один проход: завершить все таймеры с finish_at <= now.
+
+        Обработанные записи удаляются из индекса (или переносятся на будущий
+        срок), поэтому каждая следующая страница снова запрашивается с начала.
+        """
+        now = timers.now_ms() if now is None else now
+        started = time.perf_counter()
+        seen = set()
+        while True:
+            page = await run_blocking(
+                storage.query_by_child, timers.TIMERS_INDEX, "finish_at", end_at=now, limit=self.page_size
+            )
+            full_page = len(page) >= self.page_size
+            # Записи, которые не удалось обработать, вернутся в следующей странице -
+            # повторно в этом проходе их не берём
+            page = [(key, entry) for key, entry in page if key not in seen]
+            if not page:
+                break
+            seen.update(key for key, _ in page)
+            self.scanned += len(page)
+            chunks = [page[i:i + self.timers_per_commit] for i in range(0, len(page), self.timers_per_commit)]
+            await asyncio.gather(*(self._complete(chunk, now) for chunk in chunks))
+            if not full_page:
+                break
+        await flush_pending_writes()
+        elapsed = time.perf_counter() - started
+        print(f"⏰ Таймеров завершено: {self.completed}, исправлено записей индекса: {self.stale} ({elapsed:.2f} с)")
+        return self.completed
+
+    async def run_forever(self, interval):
+        """Повторять проход каждые interval секунд."""
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                print(f"❌ Ошибка прохода по таймерам: {e}")
+            await asyncio.sleep(interval)
+
+
+async def reindex(page_size=500):
+    """
+    Заполнить индекс timers/ по документам пользователей (однократно при внедрении).
+
+    iter_users не мигрирует документы, а у старых таймеров вместо finish_at
+    есть только time_left - поэтому документ сначала приводится к текущей
+    схеме, и миграция записывается тем же update(), что и записи индекса.
+    """
+    indexed = upgraded = 0
+    batch = WriteBatch()
+    async for user_id, user_data in UserDatabase.iter_users(page_size):
+        user_data, updates = upgrade_user(user_data)
+        if updates:
+            for path, value in updates.items():
+                batch.set_user(user_id, path, value)
+            upgraded += 1
+        for field in timers.TIMER_FIELDS:
+            entry = timers.index_entry(user_id, field, user_data.get(field))
+            if entry is not None:
+                batch.set(timers.index_path(user_id, field), entry)
+                indexed += 1
+        if len(batch) >= page_size:
+            await batch.commit()
+            batch = WriteBatch()
+    await batch.commit()
+    await flush_pending_writes()
+    print(f"✅ В индекс timers/ добавлено таймеров: {indexed}, документов мигрировано: {upgraded}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Завершение истёкших таймеров по индексу timers/")
+    parser.add_argument("--page-size", type=int, default=200, help="Записей индекса на страницу")
+    parser.add_argument("--timers-per-commit", type=int, default=50, help="Таймеров в одном update()")
+    parser.add_argument("--concurrency", type=int, default=8, help="Одновременных чтений таймеров")
+    parser.add_argument("--loop", type=float, default=0, help="Повторять каждые N секунд")
+    parser.add_argument("--reindex", action="store_true", help="Построить индекс по документам пользователей")
+    args = parser.parse_args()
+
+    if args.reindex:
+        asyncio.run(reindex())
+        return
+    sweeper = TimerSweeper(
+        page_size=args.page_size,
+        timers_per_commit=args.timers_per_commit,
+        concurrency=args.concurrency,
+    )
+    if args.loop > 0:
+        asyncio.run(sweeper.run_forever(args.loop))
+    else:
+        asyncio.run(sweeper.sweep())
+
+
+if __name__ == "__main__":
+    main()